@@ -1,9 +1,10 @@
 # app.py
 import streamlit as st
 import os
-from config import folder_documents, COLORS, IMAGE_LOGO
-from llm_setup import db
-from functions import list_db_sources, filter_document, process_document
+from config import folder_documents, COLORS, IMAGE_LOGO, JOB_POLL_INTERVAL_S
+from llm_setup import get_db
+from functions import list_db_sources, filter_document
+from jobs import get_job_manager, QUEUED, RUNNING, DONE, FAILED
 
 # ============================
 # Page config
@@ -166,6 +167,34 @@ if "content" not in st.session_state:
     st.session_state.content = None
 if "excel_path" not in st.session_state:
     st.session_state.excel_path = None
+if "job_id" not in st.session_state:
+    # The job id is also kept in the URL, so a reloaded page reattaches to its job
+    st.session_state.job_id = st.query_params.get("job")
+
+
+def select_document(source_match, content):
+    """
+    Makes `source_match` the current document. Choosing another document detaches the job and the
+    Excel of the previous one, so their progress and download are not shown for the new selection.
+    """
+    if source_match != st.session_state.source_match:
+        st.session_state.job_id = None
+        st.session_state.excel_path = None
+        st.query_params.pop("job", None)
+    st.session_state.source_match = source_match
+    st.session_state.content = content
+
+
+# A reloaded page has no selection yet: it reattaches to the job of the URL and selects its document
+if st.session_state.source_match is None and st.session_state.job_id:
+    reloaded_job = get_job_manager().get(st.session_state.job_id)
+    if reloaded_job is not None:
+        st.session_state.source_match = reloaded_job.source_match
+        try:
+            with open(os.path.join(folder_documents, reloaded_job.source_match), "r", encoding="utf-8") as f:
+                st.session_state.content = f.read()
+        except OSError:
+            pass
 
 # Search by name with placeholder example
 if option == "Search by name":
@@ -176,17 +205,16 @@ if option == "Search by name":
             st.warning("Please enter a product name.")
         else:
             try:
-                matched, content = filter_document(query, db)
-                st.session_state.source_match = matched
-                st.session_state.content = content
+                matched, content = filter_document(query, get_db())
+                select_document(matched, content)
                 st.success(f"Matching document found: {matched}")
             except Exception as e:
                 st.error(f"No document found: {e}")
 
 # Select from DB with instructive default option
 elif option == "Select from database":
-    # list_db_sources may return set or list, ensure list
-    sources = list(list_db_sources(db))
+    # list_db_sources may return set or list, ensure a sorted list
+    sources = sorted(list_db_sources(get_db()))
     select_options = ["-- Select product from database --"] + sources
     selected = st.selectbox("Select product:", select_options, index=0)
     if selected and selected != select_options[0]:
@@ -194,8 +222,7 @@ elif option == "Select from database":
             doc_path = os.path.join(folder_documents, selected)
             with open(doc_path, "r", encoding="utf-8") as f:
                 content = f.read()
-            st.session_state.source_match = selected
-            st.session_state.content = content
+            select_document(selected, content)
             st.success(f"Selected document: {selected}")
         except Exception as e:
             st.error(f"Error loading file: {e}")
@@ -238,21 +265,68 @@ if st.session_state.source_match and st.session_state.content:
     with generate_col:
         generate = st.button("Generate Excel")  # styled large by CSS above
 
-    # If user clicks generate
+    # If user clicks generate: the document is processed in a background job (see jobs.py),
+    # reusing the running job of the same document instead of starting another one
     if generate:
         st.session_state.excel_path = None
-        with st.spinner("Processing document and generating Excel..."):
-            try:
-                updated_jsons, excel_path = process_document(
-                    st.session_state.source_match, st.session_state.content
-                )
-                if excel_path:
-                    st.session_state.excel_path = excel_path
-                    st.success("✅ Excel successfully generated.")
-                else:
-                    st.warning("⚠️ Excel could not be generated.")
-            except Exception as e:
-                st.error(f"❌ Error during processing: {e}")
+        job = get_job_manager().submit(st.session_state.source_match, st.session_state.content)
+        st.session_state.job_id = job.id
+        st.query_params["job"] = job.id
+
+# ============================
+# Progress of the background job (polled, survives reruns and page reloads)
+# ============================
+def render_job_state(state):
+    label = state["current_step"] or state["status"].capitalize()
+    st.progress(state["progress"], text=f"{state['source_match']}: {label} ({state['elapsed_s']:.0f} s)")
+    if state["stages_total"]:
+        st.caption(f"Extraction stages finished: {state['stages_done']}/{state['stages_total']}")
+    if state["steps"]:
+        st.table([{"Step": s["step"], "Time (s)": s["elapsed_s"]} for s in state["steps"]])
+    if state["partial"]:
+        with st.expander("Partial results"):
+            for table, data in state["partial"].items():
+                st.markdown(f"**{table}**")
+                st.json(data, expanded=False)
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL_S)
+def job_progress(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return
+    state = job.snapshot()
+    if state["status"] in (DONE, FAILED):
+        # Full rerun, so the result is rendered outside the polling fragment
+        st.rerun()
+    render_job_state(state)
+
+
+job = get_job_manager().get(st.session_state.job_id)
+if st.session_state.job_id and job is None:
+    # Unknown or expired job (e.g. the server was restarted)
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+elif job is not None and job.source_match != st.session_state.source_match:
+    # Job of a previously selected document: only the job of the current selection is shown
+    st.session_state.job_id = None
+    st.session_state.excel_path = None
+    st.query_params.pop("job", None)
+elif job is not None:
+    state = job.snapshot()
+    if state["status"] in (QUEUED, RUNNING):
+        job_progress(job.id)
+    elif state["status"] == DONE:
+        render_job_state(state)
+        _, excel_path = state["result"]
+        if excel_path:
+            st.session_state.excel_path = excel_path
+            st.success("✅ Excel successfully generated.")
+        else:
+            st.warning("⚠️ Excel could not be generated.")
+    elif state["status"] == FAILED:
+        render_job_state(state)
+        st.error(f"❌ Error during processing: {state['error']}")
 
 # ============================
 # Download button shown once the excel is available
@@ -0,0 +1,209 @@
+# batch_process.py
+# Headless batch processing of a whole folder of SDS documents
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import folder_documents, output_Excel, MAX_CONCURRENCY
+from register import STAGING_NAME, REGISTER_NAME, LAYOUTS, append_to_register, build_register
+
+REPORT_NAME = "batch_report.jsonl"
+SUMMARY_NAME = "batch_summary.json"
+
+
+def iter_documents(input_dir: str):
+    """
+    Yields the markdown documents of a folder in a stable (sorted) order.
+    Args:
+        input_dir (str): Folder with the SDS documents (.md).
+    Yields:
+        str: File name of each document.
+    """
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith(".md"):
+            yield filename
+
+
+def load_report(report_path: str) -> dict:
+    """
+    Reads a previous batch report to know which documents were already processed.
+    Args:
+        report_path (str): Path of the JSON lines report.
+    Returns:
+        dict: Last report entry of every document, keyed by source name.
+    """
+    entries = {}
+    if not os.path.exists(report_path):
+        return entries
+    with open(report_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Truncated line from an interrupted run
+                continue
+            entries[entry.get("source")] = entry
+    return entries
+
+
+def process_one(source_match: str, input_dir: str, output_dir: str, stage_workers: int,
+                register_staging: str = None) -> dict:
+    """
+    Processes a single document and returns its report entry (never raises).
+    If `register_staging` is given, the document's tables are appended to that register staging file.
+    """
+    started = time.time()
+    entry = {
+        "source": source_match,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        # Imported here so that `--help` and report handling do not initialize the LLM clients;
+        # inside the try, so an import or setup error fails this document instead of the whole batch
+        from functions import process_document
+
+        with open(os.path.join(input_dir, source_match), "r", encoding="utf-8") as f:
+            content = f.read()
+        updated_jsons, excel_path = process_document(source_match, content, max_workers=stage_workers, output_dir=output_dir)
+        if register_staging:
+            append_to_register(register_staging, source_match, updated_jsons, excel_path)
+        entry.update({"status": "ok", "excel_path": excel_path, "error": None})
+    except Exception as e:
+        entry.update({"status": "failed", "excel_path": None, "error": f"{type(e).__name__}: {e}"})
+    entry["elapsed_s"] = round(time.time() - started, 3)
+    return entry
+
+
+def run_batch(input_dir: str = folder_documents, output_dir: str = output_Excel, workers: int = 2,
+              stage_workers: int = MAX_CONCURRENCY, report_path: str = None, retry_failed: bool = True,
+              limit: int = None, register_layout: str = None) -> dict:
+    """
+    Streams every document of a folder through `process_document` with document-level parallelism.
+    Args:
+        input_dir (str): Folder with the SDS documents (.md).
+        output_dir (str): Folder where the Excel files are written.
+        workers (int): Number of documents processed at the same time.
+        stage_workers (int): Concurrent stages inside each document (see `process_document`).
+        report_path (str, optional): JSON lines report. Defaults to `{output_dir}/batch_report.jsonl`.
+        retry_failed (bool): If True, documents that failed in a previous run are processed again.
+        limit (int, optional): Maximum number of documents to process in this run.
+        register_layout (str, optional): If given ("tables" or "products"), every finished document is
+            appended to `{output_dir}/register_rows.jsonl` and the consolidated register
+            `{output_dir}/COSHH_register.xlsx` is rebuilt at the end (see register.py).
+    Returns:
+        dict: Summary of the run (counts, timings and failures), also written to `batch_summary.json`.
+    Notes:
+        - Each finished document is appended to the report immediately, so an interrupted run
+          resumes where it stopped: documents already reported as 'ok' are skipped.
+        - At most `workers` documents are read and held in memory at any time.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if report_path is None:
+        report_path = os.path.join(output_dir, REPORT_NAME)
+
+    register_staging = os.path.join(output_dir, STAGING_NAME) if register_layout else None
+    previous = load_report(report_path)
+    skip_status = {"ok"} if retry_failed else {"ok", "failed"}
+
+    def pending_documents():
+        count = 0
+        for source_match in iter_documents(input_dir):
+            if previous.get(source_match, {}).get("status") in skip_status:
+                continue
+            if limit is not None and count >= limit:
+                return
+            count += 1
+            yield source_match
+
+    started = time.time()
+    results = []
+    skipped = sum(1 for entry in previous.values() if entry.get("status") in skip_status)
+    print(f"Batch started: {input_dir} -> {output_dir} ({skipped} documents already processed)")
+
+    with open(report_path, "a", encoding="utf-8") as report, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        documents = pending_documents()
+        running = set()
+
+        def submit_next():
+            source_match = next(documents, None)
+            if source_match is not None:
+                running.add(executor.submit(
+                    process_one, source_match, input_dir, output_dir, stage_workers, register_staging
+                ))
+
+        for _ in range(max(1, workers)):
+            submit_next()
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.discard(future)
+                entry = future.result()
+                results.append(entry)
+                report.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                report.flush()
+                print(f"[{len(results)}] {entry['status'].upper()} {entry['source']} ({entry['elapsed_s']} s)")
+                submit_next()
+
+    elapsed = [entry["elapsed_s"] for entry in results]
+    failures = [{"source": e["source"], "error": e["error"]} for e in results if e["status"] != "ok"]
+    summary = {
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "processed": len(results),
+        "ok": len(results) - len(failures),
+        "failed": len(failures),
+        "skipped_previous": skipped,
+        "wall_time_s": round(time.time() - started, 3),
+        "mean_document_time_s": round(sum(elapsed) / len(elapsed), 3) if elapsed else 0.0,
+        "max_document_time_s": max(elapsed) if elapsed else 0.0,
+        "failures": failures,
+        "report": report_path,
+    }
+    if register_layout:
+        summary["register"] = build_register(
+            register_staging, os.path.join(output_dir, REGISTER_NAME), layout=register_layout
+        )["path"]
+    with open(os.path.join(output_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    print(f"Batch finished: {summary['ok']} ok, {summary['failed']} failed in {summary['wall_time_s']} s")
+    for failure in failures:
+        print(f" - {failure['source']}: {failure['error']}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a folder of SDS documents and generate the COSHH Excel files.")
+    parser.add_argument("--input", default=folder_documents, help="Folder with the SDS markdown documents.")
+    parser.add_argument("--output", default=output_Excel, help="Folder for the generated Excel files and reports.")
+    parser.add_argument("--workers", type=int, default=2, help="Documents processed in parallel.")
+    parser.add_argument("--stage-workers", type=int, default=MAX_CONCURRENCY, help="Concurrent stages per document.")
+    parser.add_argument("--report", default=None, help="JSON lines report used to resume interrupted runs.")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry documents that failed in a previous run.")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of documents to process.")
+    parser.add_argument("--register", nargs="?", const="tables", choices=LAYOUTS, default=None,
+                        help="Also build the consolidated COSHH register ('tables' or 'products' layout).")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        input_dir=args.input,
+        output_dir=args.output,
+        workers=args.workers,
+        stage_workers=args.stage_workers,
+        report_path=args.report,
+        retry_failed=not args.skip_failed,
+        limit=args.limit,
+        register_layout=args.register,
+    )
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,615 @@
+# benchmark.py
+# Offline benchmark of the pipeline: scripted local chat model and embeddings, synthetic SDS corpus, no API calls
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+from config import (
+    JSON_PATHS, template_path, EXCEL_SHEET_NAME, BENCHMARK_BASELINE_PATH, BENCHMARK_CPU_TOLERANCE,
+    BENCHMARK_CPU_MIN_DELTA_MS,
+)
+from utils import H_STATEMENTS
+
+OPERATIONS = ("process_document", "filter_document[name]", "filter_document[vector]", "list_db_sources",
+              "fill_excel_with_json")
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# ============================
+# Modelos locales (sin API)
+# ============================
+_PROMPT_KEY_RE = re.compile(r"^\s*- (\w+): ", re.MULTILINE)
+_SUBSTANCE_RE = re.compile(r"Substance name:\s*(.+)")
+_SCHEMA_RE = re.compile(r"JSON schema:\n(\{.*\})\n")
+# Provider prompt cache (OpenAI): prefixes of 1024+ tokens, reused in 128-token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+
+
+def scripted_answer(prompt: str) -> str:
+    """
+    Deterministic answer for a pipeline prompt, in the format its parser expects.
+    The same prompt always gets the same answer; fields are marked from a hash of the prompt.
+    """
+    h = _seed(prompt)
+    tag = f"{h:016x}"[:6]
+    if '"chemical_names"' in prompt:
+        names = [name.strip() for name in _SUBSTANCE_RE.findall(prompt)] or ["Unknown substance"]
+        return json.dumps({"chemical_names": list(dict.fromkeys(names))})
+    if "JSON object matching this JSON schema" in prompt:
+        schema = json.loads(_SCHEMA_RE.search(prompt).group(1))
+        return json.dumps({k: {"response": f"Answer {tag} for {k}.", "to_excel": f"summary {tag}"}
+                           for k in schema["required"]})
+    if "Return STRICT JSON with exactly these keys" in prompt:
+        keys = _PROMPT_KEY_RE.findall(prompt)
+        return "```json\n" + json.dumps({k: "X" if _seed(tag + k) % 3 == 0 else "" for k in keys}) + "\n```"
+    if "Respond EXACTLY with lines" in prompt:
+        keys = _PROMPT_KEY_RE.findall(prompt)
+        return "\n".join(f"{k}: X" if _seed(tag + k) % 3 == 0 else f"{k}:" for k in keys)
+    if "Return STRICT JSON" in prompt:
+        return json.dumps({"list": [f"Measure {tag}"], "paragraph": f"Additional measures {tag}."})
+    if "Answer only 'X'" in prompt:
+        return "X" if h % 2 else ""
+    if "EXCEL_SUMMARY" in prompt:
+        return f"Relevant information {tag}.\nEXCEL_SUMMARY: summary {tag}"
+    return f"- selected context {tag}"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Local stand-in for the chat model: answers every pipeline prompt with `scripted_answer`.
+    Args:
+        latency_s (float): Simulated response time of every call.
+        jitter_s (float): Extra random delay (0-jitter_s), seeded by the prompt so runs are repeatable.
+        model_name (str): Reported in llm_output, like the OpenAI models.
+        prompt_cache (bool): Simulate the provider prompt cache (cached tokens are reported, not faster).
+    Notes:
+        - Token usage is estimated (4 characters per token) so telemetry behaves as with the API.
+        - The prompt cache works like OpenAI's: prompts of PROMPT_CACHE_MIN_TOKENS+ tokens reuse the longest
+          prefix already sent, in PROMPT_CACHE_BLOCK_TOKENS steps, reported as prompt_tokens_details.cached_tokens.
+        - Thread-safe; `calls`, `prompt_tokens` and `cached_tokens` count the requests answered.
+    """
+
+    latency_s: float = 0.0
+    jitter_s: float = 0.0
+    model_name: str = "scripted-benchmark"
+    prompt_cache: bool = True
+    _calls: int = PrivateAttr(default=0)
+    _prompt_tokens: int = PrivateAttr(default=0)
+    _cached_tokens: int = PrivateAttr(default=0)
+    _prefixes: set = PrivateAttr(default_factory=set)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-benchmark"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self._prompt_tokens
+
+    @property
+    def cached_tokens(self) -> int:
+        return self._cached_tokens
+
+    def _cache_prompt(self, prompt: str) -> int:
+        """
+        Cached tokens of a prompt; stores its prefixes for the next requests. Call with the lock held.
+        """
+        if not self.prompt_cache or len(prompt) // 4 < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        block = PROMPT_CACHE_BLOCK_TOKENS * 4
+        digest = hashlib.blake2b(digest_size=16)
+        cached = 0
+        for end in range(block, len(prompt) + 1, block):
+            digest.update(prompt[end - block:end].encode("utf-8"))
+            key = digest.copy().hexdigest()
+            if key in self._prefixes:
+                cached = end // 4
+            else:
+                self._prefixes.add(key)
+        return cached if cached >= PROMPT_CACHE_MIN_TOKENS else 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        answer = scripted_answer(prompt)
+        delay = self.latency_s + self.jitter_s * random.Random(_seed(prompt)).random()
+        if delay > 0:
+            time.sleep(delay)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+        with self._lock:
+            self._calls += 1
+            cached_tokens = self._cache_prompt(prompt)
+            self._prompt_tokens += prompt_tokens
+            self._cached_tokens += cached_tokens
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=answer))],
+            llm_output={
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens + completion_tokens,
+                                "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+                "model_name": self.model_name,
+            },
+        )
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local embeddings: signed hashing of the words of the text, L2-normalized.
+    Texts sharing words are close, so the similarity search returns meaningful results.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            h = _seed(word)
+            vector[h % self.dimensions] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+# ============================
+# Plantillas mínimas
+# ============================
+# Cells of the fields of each table template (Notebooks/Create_JSONs.ipynb), keyed like JSON_PATHS.
+# The templates are not part of the repository: without them the benchmark writes these minimal ones
+TEMPLATE_CELL_MAPS = {
+    "hazards": {
+        "hazards": "", "chemical_name": "C13", "hazard_group": "D13", "sds_reference": "E13",
+        "physical_form_and_quantity": "F13", "hazard_statements": "G13", "explosive": "H13", "flammable": "I13",
+        "oxidising": "J13", "gas_under_pressure": "K13", "acute_toxicity": "L13", "corrosive": "M13",
+        "health_hazard": "N13", "serious_health_hazard": "O13", "hazardous_to_the_environment": "P13",
+        "potential_routes_of_exposure": "Q13", "workplace_exposure_limits": "R13", "arising_harm": "S13",
+        "who_might_be_harmed_operators": "", "who_might_be_harmed_bystanders": "",
+        "who_might_be_harmed_maintenance_personnel": "", "severity": ["U13", "U14", "U15"],
+        "likelihood_before_control_measures": ["V13", "V14", "V15"], "risk_before_control_measures": "",
+        "wear_full_face_visor": "X13", "box_goggles_must_be_worn": "Y13", "protective_gloves_must_be_worn": "Z13",
+        "laboratory_coats_must_be_worn": "AA13", "use_local_exhaust_ventillation": "AB13", "no_open_flames": "AC13",
+        "other_control_measures": "AD13", "actions_control_measures_to_be_implemented": "AE13", "assign_to": "AF13",
+        "completion_date": "AG13", "likelihood_after_control_measures": ["AH13", "AH14", "AH15"],
+        "risk_after_control_measures": "",
+    },
+    "waste_disposal_measures": {
+        "waste_disposal_measures": "", "chemical_name": "C24", "hazard_group": "D24",
+        "handling_of_the_product_if_it_becomes_waste": "F24", "do_not_dispose_of_via_drain": "",
+    },
+    "spill_management": {"spill_management": "", "chemical_name": "Q24", "details": "R24"},
+    "fire_procedures": {"fire_procedures": "", "chemical_name": "Q30", "details": "R30"},
+    "first_aid_procedures": {
+        "first_aid_procedures": "", "chemical_name": "C38", "eyes": "D38", "skin": "H38", "if_ingested": "L38",
+        "if_inhaled": "Q38",
+    },
+    "storage": {
+        "chemical_name": "C30", "hazard_group": "D30", "hazard_label_and_store_safely_on_shelf": "E30",
+        "flammables_cupboard": "F30", "corrosives_cupboard": "G30", "poisons_cupboard": "H30",
+        "ventilated_storage": "I30", "gas_cylinder": "J30", "cold_storage": "K30", "dessicated_storage": "L30",
+        "special_storage_describe": "M30",
+    },
+}
+
+
+def write_template_fixtures(directory: str) -> Tuple[Dict[str, str], str]:
+    """
+    Writes minimal table JSON templates (TEMPLATE_CELL_MAPS, with the field name as its question) and an
+    Excel template with an empty EXCEL_SHEET_NAME sheet.
+    Returns:
+        tuple: (JSON template path of each table, like JSON_PATHS; Excel template path).
+    """
+    import openpyxl
+
+    os.makedirs(directory, exist_ok=True)
+    json_paths = {}
+    for table, cells in TEMPLATE_CELL_MAPS.items():
+        sheet = {
+            field: {"content": field.replace("_", " ").capitalize(), "position": position, "response": "",
+                    "to_excel": ""}
+            for field, position in cells.items()
+        }
+        json_paths[table] = os.path.join(directory, os.path.basename(JSON_PATHS[table]))
+        with open(json_paths[table], "w", encoding="utf-8") as f:
+            json.dump({"Sheet_2": sheet}, f, indent=2)
+
+    workbook = openpyxl.Workbook()
+    workbook.active.title = EXCEL_SHEET_NAME
+    excel_path = os.path.join(directory, os.path.basename(template_path))
+    workbook.save(excel_path)
+    return json_paths, excel_path
+
+
+# ============================
+# Corpus sintético
+# ============================
+_PRODUCT_WORDS = ["Acetone", "Ethanol", "Isopropanol", "Toluene", "Xylene", "Methanol", "Hexane", "Citric",
+                  "Sodium Hydroxide", "Hydrochloric Acid", "Ammonia", "Bleach", "Glycol", "Peroxide"]
+_PRODUCT_KINDS = ["Cleaner", "Solvent", "Degreaser", "Solution", "Reagent", "Disinfectant", "Buffer", "Concentrate"]
+_SUBSTANCES = [("Acetone", "67-64-1"), ("Ethanol", "64-17-5"), ("Propan-2-ol", "67-63-0"), ("Toluene", "108-88-3"),
+               ("Xylene", "1330-20-7"), ("Methanol", "67-56-1"), ("n-Hexane", "110-54-3"), ("Citric acid", "77-92-9"),
+               ("Sodium hydroxide", "1310-73-2"), ("Hydrogen chloride", "7647-01-0"), ("Ammonia", "7664-41-7"),
+               ("Sodium hypochlorite", "7681-52-9"), ("Ethylene glycol", "107-21-1"), ("Hydrogen peroxide", "7722-84-1")]
+_SECTION_TEXT = {
+    4: ["Eyes: rinse cautiously with water for several minutes.", "Skin: wash with plenty of soap and water.",
+        "Inhalation: remove person to fresh air and keep comfortable for breathing.",
+        "Ingestion: rinse mouth. Do NOT induce vomiting.", "Get medical advice if you feel unwell."],
+    5: ["Suitable extinguishing media: alcohol-resistant foam, dry powder, carbon dioxide.",
+        "Unsuitable extinguishing media: water jet.", "Firefighters should wear self-contained breathing apparatus.",
+        "Hazardous combustion products: carbon oxides."],
+    6: ["Absorb with inert material such as sand or vermiculite.", "Prevent entry into drains and watercourses.",
+        "Ventilate the area and remove ignition sources.", "Collect in suitable closed containers for disposal."],
+    7: ["Store in a well-ventilated place. Keep container tightly closed.", "Keep cool. Protect from sunlight.",
+        "Store in a flammables cupboard away from oxidising agents.", "Keep away from heat, sparks and open flames.",
+        "Store locked up."],
+    8: ["Wear protective gloves (nitrile rubber).", "Wear safety goggles with side shields.",
+        "Use local exhaust ventilation.", "Wear a laboratory coat.", "TWA 500 ppm, STEL 1000 ppm."],
+    13: ["Dispose of contents to a licensed waste disposal contractor.", "Do not empty into drains.",
+         "Contaminated packaging should be treated as the substance itself."],
+}
+_FILLER = ["This information is based on our present knowledge.", "No additional data is available.",
+           "The product is used for professional purposes only.", "See section 8 for further details.",
+           "Handle in accordance with good industrial hygiene and safety practice."]
+
+
+def make_sds(index: int, rng: random.Random) -> Tuple[str, str]:
+    """
+    Builds one synthetic SDS document in the markdown layout of the corpus.
+    Returns:
+        tuple: (file name, content).
+    """
+    product = f"{rng.choice(_PRODUCT_WORDS)} {rng.choice(_PRODUCT_KINDS)} {index}"
+    substances = rng.sample(_SUBSTANCES, rng.randint(1, 3))
+    h_codes = rng.sample(sorted(H_STATEMENTS), rng.randint(2, 6))
+
+    def paragraph(section: int, sentences: int) -> str:
+        bank = _SECTION_TEXT.get(section, _FILLER)
+        return "\n".join(rng.choice(bank) + " " + rng.choice(_FILLER) for _ in range(sentences))
+
+    body = {
+        1: f"Product name: {product}\nProduct code: SYN-{index:06d}\nSupplier: Synthetic Chemicals Ltd.",
+        2: "\n".join(f"{code} {H_STATEMENTS[code][0]}" for code in h_codes)
+           + "\nP210 Keep away from heat. P280 Wear protective gloves/eye protection.",
+        3: "\n".join(f"Substance name: {name}\nCAS {cas}\nConcentration: {rng.randint(1, 99)} %"
+                     for name, cas in substances),
+    }
+    titles = ["Identification of the substance/mixture", "Hazards identification",
+              "Composition/information on ingredients", "First aid measures", "Firefighting measures",
+              "Accidental release measures", "Handling and storage", "Exposure controls/personal protection",
+              "Physical and chemical properties", "Stability and reactivity", "Toxicological information",
+              "Ecological information", "Disposal considerations", "Transport information",
+              "Regulatory information", "Other information"]
+    sections = ["# Safety data sheet"]
+    for number, title in enumerate(titles, start=1):
+        sections.append(f"## SECTION {number}: {title}")
+        sections.append(body.get(number) or paragraph(number, rng.randint(4, 12)))
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", product).strip("-")
+    return f"SYN-{index:06d}-DS-1-{slug}.md", "\n".join(sections) + "\n"
+
+
+def write_corpus(directory: str, documents: int, seed: int = 0) -> List[str]:
+    """
+    Writes `documents` synthetic SDS files to `directory` and returns their names.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for index in range(1, documents + 1):
+        name, content = make_sds(index, rng)
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(content)
+        names.append(name)
+    return names
+
+
+def build_store(store_dir: str, corpus_dir: str, names: List[str], embeddings: Embeddings):
+    """
+    Vector store of the corpus (one chunk per SDS section), with the NumPy backend.
+    """
+    from numpy_store import NumpyVectorStore
+
+    store = NumpyVectorStore(store_dir, embeddings, dtype="float32")
+    texts, metadatas = [], []
+    for name in names:
+        with open(os.path.join(corpus_dir, name), "r", encoding="utf-8") as f:
+            for chunk in re.split(r"\n(?=## SECTION)", f.read()):
+                texts.append(chunk)
+                metadatas.append({"source": name})
+    store.add_texts(texts, metadatas)
+    return store
+
+
+# ============================
+# Medición
+# ============================
+def percentile(values: List[float], q: float) -> float:
+    """
+    q-th percentile (0-100) with linear interpolation.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class _Operation:
+    """
+    Latencies, CPU time, LLM calls and prompt tokens of one benchmarked operation.
+    """
+
+    def __init__(self, name: str, model: ScriptedChatModel):
+        self.name = name
+        self.model = model
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+        self._wall = self._cpu = 0.0
+        self._calls = 0
+        self._prompt_tokens = self._cached_tokens = 0
+
+    def timed(self, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies.append(elapsed)
+        return result
+
+    @contextlib.contextmanager
+    def phase(self):
+        """
+        Measures a whole phase: wall time, process CPU time (every thread), LLM calls and prompt tokens.
+        """
+        calls, cpu, wall = self.model.calls, time.process_time(), time.perf_counter()
+        prompt_tokens, cached_tokens = self.model.prompt_tokens, self.model.cached_tokens
+        yield
+        self._wall += time.perf_counter() - wall
+        self._cpu += time.process_time() - cpu
+        self._calls += self.model.calls - calls
+        self._prompt_tokens += self.model.prompt_tokens - prompt_tokens
+        self._cached_tokens += self.model.cached_tokens - cached_tokens
+
+    def summary(self) -> dict:
+        count = len(self.latencies)
+        ms = [value * 1000 for value in self.latencies]
+        return {
+            "count": count,
+            "throughput_per_s": round(count / self._wall, 3) if self._wall else 0.0,
+            "mean_ms": round(sum(ms) / count, 3) if count else 0.0,
+            "p50_ms": round(percentile(ms, 50), 3),
+            "p95_ms": round(percentile(ms, 95), 3),
+            "p99_ms": round(percentile(ms, 99), 3),
+            "cpu_ms_per_call": round(self._cpu * 1000 / count, 3) if count else 0.0,
+            "llm_calls_per_call": round(self._calls / count, 3) if count else 0.0,
+            "prompt_tokens_per_call": round(self._prompt_tokens / count, 1) if count else 0.0,
+            "cached_prompt_share": round(self._cached_tokens / self._prompt_tokens, 3) if self._prompt_tokens else 0.0,
+        }
+
+
+def run_benchmark(documents: int = 20, latency_s: float = 0.05, jitter_s: float = 0.02, doc_workers: int = 1,
+                  max_workers: Optional[int] = None, queries: int = 200, seed: int = 0,
+                  fixtures: Optional[bool] = None) -> dict:
+    """
+    Runs every benchmarked operation over a synthetic corpus with the local models.
+    Args:
+        documents (int): Synthetic SDS documents to generate and process.
+        latency_s (float) / jitter_s (float): Simulated LLM response time (see ScriptedChatModel).
+        doc_workers (int): Documents processed at the same time (like batch_process --workers).
+        max_workers (int, optional): Concurrent stages per document (defaults to MAX_CONCURRENCY).
+        queries (int): filter_document / list_db_sources calls of each kind.
+        seed (int): Seed of the corpus and the queries.
+        fixtures (bool, optional): If True, the templates of `write_template_fixtures` replace JSON_PATHS
+                                   and template_path. By default they are used only if those are missing.
+    Returns:
+        dict: {"settings": {...}, "operations": {name: summary}}.
+    Notes:
+        - The shared model, embeddings and database of llm_setup are replaced while the benchmark
+          runs and dropped afterwards; nothing is sent to the API.
+        - CPU time is the process CPU time of each phase divided by its calls: with the simulated
+          latency spent sleeping, it is the CPU cost of the pipeline itself.
+    """
+    import functions
+    import llm_setup
+
+    if fixtures is None:
+        missing = [path for path in list(JSON_PATHS.values()) + [template_path] if not os.path.exists(path)]
+        fixtures = bool(missing)
+        if missing:
+            print(f"Project templates not found ({', '.join(missing)}): using minimal templates")
+
+    model = ScriptedChatModel(latency_s=latency_s, jitter_s=jitter_s, cache=False)
+    embeddings = HashingEmbeddings()
+    operations = {name: _Operation(name, model) for name in OPERATIONS}
+    rng = random.Random(seed)
+    patched = ("folder_documents", "JSON_PATHS", "template_path")
+    originals = {name: getattr(functions, name) for name in patched}
+
+    with tempfile.TemporaryDirectory(prefix="sds_benchmark_") as workdir, open(os.devnull, "w") as devnull:
+        corpus_dir = os.path.join(workdir, "documents")
+        output_dir = os.path.join(workdir, "output_Excel")
+        os.makedirs(output_dir)
+        names = write_corpus(corpus_dir, documents, seed)
+        json_paths, excel_template = JSON_PATHS, template_path
+        if fixtures:
+            json_paths, excel_template = write_template_fixtures(os.path.join(workdir, "templates"))
+        store = build_store(os.path.join(workdir, "store"), corpus_dir, names, embeddings)
+
+        llm_setup.set_shared("llm", model)
+        llm_setup.set_shared("embeddings", embeddings)
+        llm_setup.set_shared("db", store)
+        functions.folder_documents = corpus_dir
+        functions.JSON_PATHS, functions.template_path = json_paths, excel_template
+        try:
+            with contextlib.redirect_stdout(devnull):
+                contents = {}
+                for name in names:
+                    with open(os.path.join(corpus_dir, name), "r", encoding="utf-8") as f:
+                        contents[name] = f.read()
+
+                # Untimed warm-up: template compilation and first-use imports are not part of the steady state
+                functions.process_document(names[0], contents[names[0]], max_workers=max_workers, output_dir=output_dir)
+                functions.clear_selector_cache()
+                op = operations["process_document"]
+
+                def process(name):
+                    return op.timed(functions.process_document, name, contents[name],
+                                    max_workers=max_workers, output_dir=output_dir)
+
+                with op.phase(), ThreadPoolExecutor(max_workers=max(1, doc_workers)) as executor:
+                    results = list(executor.map(process, names))
+
+                # One untimed call first: the source catalog and the name index are built once per collection
+                functions.list_db_sources(store)
+                functions.filter_document(names[0], store)
+
+                op = operations["list_db_sources"]
+                with op.phase():
+                    for _ in range(queries):
+                        op.timed(functions.list_db_sources, store)
+
+                op = operations["filter_document[name]"]
+                with op.phase():
+                    for name in rng.choices(names, k=queries):
+                        product = contents[name].split("Product name: ", 1)[1].split("\n", 1)[0]
+                        op.timed(functions.filter_document, product, store)
+
+                op = operations["filter_document[vector]"]
+                with op.phase():
+                    for name in rng.choices(names, k=queries):
+                        line = rng.choice([l for l in contents[name].splitlines() if l and not l.startswith("#")])
+                        op.timed(functions.filter_document, line, store, use_name_index=False)
+
+                op = operations["fill_excel_with_json"]
+                with op.phase():
+                    for name, (updated_jsons, _) in zip(names, results):
+                        op.timed(functions.fill_excel_with_json, list(updated_jsons.values()), excel_template,
+                                 output_dir, source_match=name)
+        finally:
+            for name, value in originals.items():
+                setattr(functions, name, value)
+            for shared in ("llm", "embeddings", "db"):
+                llm_setup.set_shared(shared, None)
+
+    return {
+        "settings": {"documents": documents, "latency_s": latency_s, "jitter_s": jitter_s,
+                     "doc_workers": doc_workers, "max_workers": max_workers, "queries": queries, "seed": seed,
+                     "fixtures": fixtures},
+        "operations": {name: op.summary() for name, op in operations.items()},
+    }
+
+
+# ============================
+# Baseline y regresiones
+# ============================
+def compare_with_baseline(report: dict, baseline: dict, cpu_tolerance: float = BENCHMARK_CPU_TOLERANCE,
+                          cpu_min_delta_ms: float = BENCHMARK_CPU_MIN_DELTA_MS) -> List[str]:
+    """
+    Returns the regressions of a report against a baseline report (empty list if none).
+    An operation regresses when it issues more LLM calls per call than the baseline, or when its
+    CPU time per call exceeds the baseline by more than `cpu_tolerance` and `cpu_min_delta_ms`
+    (the absolute margin keeps sub-millisecond operations from failing on timer noise).
+    Notes:
+        - CPU times only compare on the same machine; record the baseline where the check runs.
+    """
+    regressions = []
+    for name, base in baseline.get("operations", {}).items():
+        current = report["operations"].get(name)
+        if current is None:
+            continue
+        if current["llm_calls_per_call"] > base["llm_calls_per_call"] + 1e-9:
+            regressions.append(f"{name}: LLM calls per call {current['llm_calls_per_call']} "
+                               f"> baseline {base['llm_calls_per_call']}")
+        limit = max(base["cpu_ms_per_call"] * (1 + cpu_tolerance), base["cpu_ms_per_call"] + cpu_min_delta_ms)
+        if current["cpu_ms_per_call"] > limit:
+            regressions.append(f"{name}: CPU {current['cpu_ms_per_call']} ms per call "
+                               f"> baseline {base['cpu_ms_per_call']} ms (limit {limit:.3f} ms)")
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    header = f"{'operation':<26}{'count':>7}{'per s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'CPU ms':>10}{'LLM':>7}{'cached':>8}"
+    lines = [header, "-" * len(header)]
+    for name, s in report["operations"].items():
+        lines.append(f"{name:<26}{s['count']:>7}{s['throughput_per_s']:>9.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                     f"{s['p99_ms']:>10.2f}{s['cpu_ms_per_call']:>10.2f}{s['llm_calls_per_call']:>7.1f}"
+                     f"{s.get('cached_prompt_share', 0.0):>8.0%}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the SDS pipeline (no API calls).")
+    parser.add_argument("--documents", type=int, default=20, help="Synthetic SDS documents.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated LLM latency per call (s).")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Maximum extra random latency per call (s).")
+    parser.add_argument("--doc-workers", type=int, default=1, help="Documents processed at the same time.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Concurrent stages per document.")
+    parser.add_argument("--queries", type=int, default=200, help="filter_document / list_db_sources calls.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures", action="store_true", default=None,
+                        help="Use minimal templates instead of the project ones (default: only if they are missing).")
+    parser.add_argument("--output", help="Write the report as JSON.")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH, help="Baseline report.")
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the baseline.")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if the run regresses past the baseline.")
+    parser.add_argument("--cpu-tolerance", type=float, default=BENCHMARK_CPU_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.documents, args.latency, args.jitter, args.doc_workers, args.max_workers,
+                           args.queries, args.seed, args.fixtures)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved: {args.baseline}")
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline} (record one with --save-baseline)")
+            return 1
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.cpu_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# cassette.py
+# Record/replay of the chat model traffic: profile real documents without paying for the calls again
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from config import folder_documents, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY
+
+MODES = ("record", "replay")
+LATENCIES = ("recorded", "zero")
+
+
+class CassetteMiss(KeyError):
+    """
+    Raised in replay mode for a prompt that is not in the cassette.
+    """
+
+
+class Cassette:
+    """
+    JSON lines file of prompt/response pairs captured from the chat model.
+    Args:
+        path (str): Cassette file.
+        mode (str): "record" (entries are appended to the file) or "replay" (the file is loaded).
+    Notes:
+        - Entries are keyed by a SHA-256 of the serialized messages. A prompt sent several times keeps
+          one entry per call; replay serves them in order and repeats the last one.
+        - Each line also keeps the prompt text, the model and the call latency, so two cassettes
+          can be compared by hand (e.g. before and after a refactor of functions.py).
+    """
+
+    def __init__(self, path: str, mode: str = "replay"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}' (use one of {MODES})")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = {}
+        self._served: Dict[str, int] = {}
+        self.recorded = 0
+        self.misses = 0
+
+        if mode == "replay":
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette not found: {path} (record one first)")
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(messages) -> str:
+        return hashlib.sha256(dumps(messages).encode("utf-8")).hexdigest()
+
+    def record(self, messages, result: ChatResult, latency_s: float, model: Optional[str] = None) -> None:
+        """
+        Appends the response of a real call to the cassette file.
+        """
+        entry = {
+            "key": self.key(messages),
+            "model": model,
+            "latency_s": round(latency_s, 4),
+            "prompt": "\n".join(str(message.content) for message in messages),
+            "generations": [
+                {"message": message_to_dict(generation.message), "generation_info": generation.generation_info}
+                for generation in result.generations
+            ],
+            "llm_output": result.llm_output,
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._entries.setdefault(entry["key"], []).append(entry)
+            self.recorded += 1
+
+    def next(self, messages) -> dict:
+        """
+        Returns the recorded entry for the messages (the next one if the prompt was recorded several times).
+        Raises:
+            CassetteMiss: If the prompt was never recorded.
+        """
+        key = self.key(messages)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"Prompt not in cassette {self.path} (key {key[:12]})")
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Recorded entries, calls served and missed, and entries never served during this replay
+        (a refactor that issues fewer calls leaves unused entries; one that changes prompts has misses).
+        """
+        with self._lock:
+            entries = sum(len(values) for values in self._entries.values())
+            served = sum(self._served.values())
+            unused = sum(max(0, len(values) - self._served.get(key, 0)) for key, values in self._entries.items())
+            return {"entries": entries, "recorded": self.recorded, "served": served, "misses": self.misses,
+                    "unused": unused}
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records the calls of a real model to a cassette, or replays them without the API.
+    Args:
+        cassette (Cassette): Cassette in "record" or "replay" mode.
+        inner (BaseChatModel, optional): Real model; required to record.
+        replay_latency (str): "recorded" (sleep the latency of the original call) or "zero".
+    Notes:
+        - Recording calls the real model directly, bypassing the LLM cache, so every request of the run
+          (and its real latency) ends up in the cassette. Rate limiting and retries still apply.
+        - Responses keep their original llm_output, so telemetry reports the same tokens in replay.
+        - Create it with cache=False: a cache hit would neither be recorded nor replayed.
+    """
+
+    cassette: Any
+    inner: Optional[Any] = None
+    replay_latency: str = "recorded"
+    model_name: str = "cassette"
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-{self.cassette.mode}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "cassette": self.cassette.path}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.cassette.mode == "record":
+            if self.inner is None:
+                raise ValueError("Recording a cassette needs the real model (inner)")
+            started = time.perf_counter()
+            result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            self.cassette.record(messages, result, time.perf_counter() - started,
+                                 model=getattr(self.inner, "model_name", None))
+            return result
+
+        entry = self.cassette.next(messages)
+        if self.replay_latency == "recorded" and entry.get("latency_s"):
+            time.sleep(entry["latency_s"])
+        generations = [
+            ChatGeneration(message=messages_from_dict([g["message"]])[0], generation_info=g.get("generation_info"))
+            for g in entry["generations"]
+        ]
+        return ChatResult(generations=generations, llm_output=entry.get("llm_output"))
+
+
+# ============================
+# Ejecución de documentos reales
+# ============================
+def run_documents(names: List[str], mode: str, path: str = LLM_CASSETTE_PATH, replay_latency: str = LLM_CASSETTE_LATENCY,
+                  input_dir: str = folder_documents, output_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                  fresh: bool = False) -> dict:
+    """
+    Processes documents with the shared model replaced by a cassette model.
+    Args:
+        names (list): Document file names in `input_dir`.
+        mode (str): "record" (real API calls, saved to `path`) or "replay".
+        replay_latency (str): "recorded" or "zero" (replay only).
+        fresh (bool): Record into an empty cassette instead of appending.
+    Returns:
+        dict: {"documents": [{"source", "wall_s", "calls", "misses", "error"}], "cassette": Cassette.stats()}.
+    """
+    import tempfile
+    import functions
+    import llm_setup
+
+    if mode == "record" and fresh and os.path.exists(path):
+        os.remove(path)
+    model = llm_setup.init_cassette_llm(mode, path, replay_latency)
+    cassette = model.cassette
+    llm_setup.set_shared("llm", model)
+    documents = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="sds_cassette_") as tmp_dir:
+            for name in names:
+                with open(os.path.join(input_dir, name), "r", encoding="utf-8") as f:
+                    content = f.read()
+                functions.clear_selector_cache()
+                before = cassette.stats()
+                started = time.perf_counter()
+                error = None
+                try:
+                    functions.process_document(name, content, max_workers=max_workers,
+                                               output_dir=output_dir or tmp_dir)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                after = cassette.stats()
+                calls = (after["recorded"] - before["recorded"]) + (after["served"] - before["served"])
+                documents.append({"source": name, "wall_s": round(time.perf_counter() - started, 3), "calls": calls,
+                                  "misses": after["misses"] - before["misses"], "error": error})
+    finally:
+        llm_setup.set_shared("llm", None)
+    return {"documents": documents, "cassette": cassette.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or replay the LLM calls of process_document on real documents.")
+    parser.add_argument("mode", choices=MODES)
+    parser.add_argument("documents", nargs="+", help=f"Document file names in --input (default {folder_documents}).")
+    parser.add_argument("--input", default=folder_documents, help="Folder with the documents.")
+    parser.add_argument("--cassette", default=LLM_CASSETTE_PATH, help="Cassette file.")
+    parser.add_argument("--latency", choices=LATENCIES, default=LLM_CASSETTE_LATENCY,
+                        help="Replay with the recorded latencies or without delay.")
+    parser.add_argument("--max-workers", type=int, default=None, help="Concurrent stages per document.")
+    parser.add_argument("--fresh", action="store_true", help="Record into an empty cassette.")
+    parser.add_argument("--strict", action="store_true", help="Replay: exit with status 1 on missing prompts.")
+    args = parser.parse_args(argv)
+
+    import contextlib
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run_documents(args.documents, args.mode, args.cassette, args.latency, args.input,
+                               max_workers=args.max_workers, fresh=args.fresh)
+    for doc in report["documents"]:
+        print(f"{doc['source']}: {doc['wall_s']} s, {doc['calls']} LLM calls, {doc['misses']} misses"
+              + (f" ({doc['error']})" if doc["error"] else ""))
+    print(f"Cassette {args.cassette}: {report['cassette']}")
+    if args.strict and (report["cassette"]["misses"] or any(doc["error"] for doc in report["documents"])):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,6 +29,131 @@ JSON_PATHS = {
     "storage": "./output_JSON/json_table_Storage.json"
 }
 
+# ============================
+# Concurrencia del pipeline
+# ============================
+# Maximum number of extraction stages running at the same time in process_document
+MAX_CONCURRENCY = int(os.environ.get("SDS_MAX_CONCURRENCY", "6"))
+
+# ============================
+# Telemetría
+# ============================
+# If True, process_document records wall time, LLM calls, tokens, cache hits and cost per stage/extractor
+TELEMETRY_ENABLED = True
+# One JSON line per processed document
+TELEMETRY_JSONL_PATH = "./telemetry/metrics.jsonl"
+# Process totals in Prometheus text format (rewritten after every document)
+TELEMETRY_PROMETHEUS_PATH = "./telemetry/metrics.prom"
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES_PER_1M = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
+
+# ============================
+# Plantilla Excel
+# ============================
+# Sheet of the template filled by fill_excel_with_json
+EXCEL_SHEET_NAME = "COSHH Assessment"
+# If True, the template is compiled once and each Excel only patches the sheet XML (excel_template.py);
+# if False (or the template is not supported), openpyxl loads and saves the whole workbook
+EXCEL_FAST_TEMPLATE = True
+
+# ============================
+# Trabajos en segundo plano (app)
+# ============================
+# Documents processed at the same time by the app (each one uses up to MAX_CONCURRENCY stages)
+JOB_WORKERS = int(os.environ.get("SDS_JOB_WORKERS", "2"))
+# Seconds a finished job (and its result) is kept so a session can reattach to it
+JOB_RETENTION_S = 3600
+# Seconds between two refreshes of the job progress in the app
+JOB_POLL_INTERVAL_S = 1.0
+
+# ============================
+# Benchmark offline
+# ============================
+# Reference results of benchmark.py (LLM calls and CPU time per operation), recorded with --save-baseline
+BENCHMARK_BASELINE_PATH = "./benchmark_baseline.json"
+# Allowed CPU time increase over the baseline before --check fails (0.25 = +25%)
+BENCHMARK_CPU_TOLERANCE = 0.25
+# ...and by at least this many milliseconds per call
+BENCHMARK_CPU_MIN_DELTA_MS = 0.5
+
+# ============================
+# Extracción de los campos de texto
+# ============================
+# "two_step": context selector + answer with an EXCEL_SUMMARY line, per field (two calls per field);
+# "structured": one JSON response per table, validated against the Sheet_2 fields (see structured_output.py)
+TEXT_EXTRACTION_MODE = os.environ.get("SDS_TEXT_EXTRACTION", "two_step")
+# Extra requests, limited to the invalid fields, when a structured response does not match the schema
+STRUCTURED_REPAIR_RETRIES = 1
+
+# ============================
+# Contexto de los prompts
+# ============================
+# Send only the mapped SDS sections (utils.TABLE_SECTIONS / FIELD_SECTIONS) instead of the full document
+SCOPE_PROMPTS_TO_SECTIONS = True
+
+# ============================
+# Caché persistente de respuestas del LLM
+# ============================
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = "./cache/llm_cache.sqlite"
+LLM_CACHE_MAX_ENTRIES = 50000
+LLM_CACHE_MAX_AGE_DAYS = 30
+
+# ============================
+# Cassette del LLM (grabación / reproducción)
+# ============================
+# "off"; "record": real calls, every prompt/response saved to LLM_CASSETTE_PATH;
+# "replay": responses served from the cassette, without the API (see cassette.py)
+LLM_CASSETTE_MODE = os.environ.get("SDS_LLM_CASSETTE", "off")
+LLM_CASSETTE_PATH = os.environ.get("SDS_LLM_CASSETTE_PATH", "./cache/llm_cassette.jsonl")
+# Replay delay of every response: "recorded" (latency of the original call) or "zero"
+LLM_CASSETTE_LATENCY = os.environ.get("SDS_LLM_CASSETTE_LATENCY", "recorded")
+
+# ============================
+# Caché de embeddings (consultas y documentos)
+# ============================
+EMBEDDINGS_CACHE_ENABLED = True
+EMBEDDINGS_CACHE_PATH = "./cache/embeddings_cache.sqlite"
+EMBEDDINGS_CACHE_MEMORY_SIZE = 2048
+# If True, queries are lowercased before being embedded ("Acetone" and "acetone" share a vector);
+# this changes the query vectors against the existing index, so check retrieval before enabling it
+EMBEDDINGS_CASEFOLD_QUERIES = False
+
+# ============================
+# Base de datos vectorial
+# ============================
+# "chroma" (Chroma_DB) or "numpy" (memory-mapped NumpyVectorStore, see numpy_store.py)
+VECTOR_STORE = os.environ.get("SDS_VECTOR_STORE", "chroma")
+DB_Numpy = "./Numpy_DB/"
+# Storage type of the NumpyVectorStore embeddings: "float16", "int8" or "float32"
+NUMPY_STORE_DTYPE = "float16"
+
+# ============================
+# Ingesta incremental en Chroma
+# ============================
+INGEST_MANIFEST_PATH = "./Chroma_DB/ingest_manifest.json"
+INGEST_CHUNK_SIZE = 500
+INGEST_CHUNK_OVERLAP = 100
+# Chunks embedded and added to Chroma per request
+INGEST_BATCH_SIZE = 256
+
+# ============================
+# Límites de la API de OpenAI (RPM / TPM de la cuenta)
+# ============================
+# Shared between threads and processes through RATE_LIMIT_STATE_PATH
+RATE_LIMIT_STATE_PATH = "./cache/rate_limits.sqlite"
+CHAT_RPM = 500
+CHAT_TPM = 200000
+EMBEDDINGS_RPM = 3000
+EMBEDDINGS_TPM = 1000000
+# Seconds before a request is abandoned and retried, and retries with jittered backoff
+LLM_TIMEOUT = 120
+LLM_MAX_RETRIES = 5
+
 # ============================
 # API Key OpenAI
 # ============================
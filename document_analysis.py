@@ -0,0 +1,189 @@
+# document_analysis.py
+# Per-document analysis of an SDS/MSDS built once in a single pass over its lines
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Minimum number of section headings required to trust the split into sections
+MIN_SECTIONS_FOUND = 4
+
+# "## SECTION 2: Hazards identification", "**Section 3 - Composition**" (markdown heading or bold)
+_SECTION_MARKED_RE = re.compile(
+    r"^\s*(?:#{1,6}\s*(?:\*\*|__)?|\*\*|__)\s*section\s*(\d{1,2})(?![.,]?\d)\s*(?:[:.\-–)]|\*\*|__|$|\s+[A-Za-z])",
+    re.IGNORECASE
+)
+# "SECTION 8. EXPOSURE CONTROLS", "SECTION 2 HAZARDS IDENTIFICATION" (plain text, e.g. PDF lines): without
+# a marker, the number must be followed by a separator, the end of the line or a word of the section title,
+# so a body line such as "Section 8 of this sheet lists exposure limits" is not a heading
+_SECTION_PLAIN_RE = re.compile(
+    r"^\s*section\s*(\d{1,2})(?![.,]?\d)\s*(?:[:.\-–)]|$|\s+([A-Za-z]+))",
+    re.IGNORECASE
+)
+# First word of the standard SDS section titles (and common variants), per section number
+_SECTION_TITLE_WORDS = {
+    1: ("identification", "product", "chemical"),
+    2: ("hazard", "hazards"),
+    3: ("composition", "information", "ingredients"),
+    4: ("first",),
+    5: ("fire", "firefighting", "fire-fighting"),
+    6: ("accidental", "spill"),
+    7: ("handling", "storage"),
+    8: ("exposure", "personal"),
+    9: ("physical",),
+    10: ("stability", "reactivity"),
+    11: ("toxicological", "toxicology"),
+    12: ("ecological", "ecology"),
+    13: ("disposal",),
+    14: ("transport",),
+    15: ("regulatory",),
+    16: ("other",),
+}
+# "# 2. Hazards identification", "## 13 - Disposal considerations" (requires a markdown heading)
+_SECTION_NUMBER_RE = re.compile(
+    r"^\s*#{1,6}\s*(?:\*\*|__)?\s*(\d{1,2})\s*[.:)\-–]?\s+[A-Za-z]"
+)
+_BULLET_RE = re.compile(r"^[\-\*\•\u2022]+\s*")
+_H_CODE_RE = re.compile(r"H\s*\d{3}")
+_P_CODE_RE = re.compile(r"\bP\s*\d{3}\b")
+_CAS_RE = re.compile(r"\b(\d{2,7})-(\d{2})-(\d)\b")
+
+
+def heading_number(line: str) -> Optional[int]:
+    """
+    Returns the SDS section number announced by a heading line, or None if the line is not a heading.
+    """
+    match = _SECTION_MARKED_RE.match(line) or _SECTION_NUMBER_RE.match(line)
+    if not match:
+        match = _SECTION_PLAIN_RE.match(line)
+        if not match:
+            return None
+        word = match.group(2)
+        if word and word.lower() not in _SECTION_TITLE_WORDS.get(int(match.group(1)), ()):
+            return None
+    number = int(match.group(1))
+    return number if 1 <= number <= 16 else None
+
+
+@lru_cache(maxsize=256)
+def clean_lines(text: str) -> tuple:
+    """
+    Returns the non-empty lines of a text, stripped of whitespace and bullet markers ('-', '*', '•').
+    Cached per text, so summaries scanned field by field are only split once.
+    """
+    lines = []
+    for raw_line in (text or "").splitlines():
+        line = raw_line.strip()
+        if line:
+            lines.append(_BULLET_RE.sub("", line).strip())
+    return tuple(lines)
+
+
+def _valid_cas(digits: str, check: str) -> bool:
+    """
+    Validates the check digit of a CAS registry number.
+    """
+    total = sum(int(d) * i for i, d in enumerate(reversed(digits), start=1))
+    return total % 10 == int(check)
+
+
+class DocumentAnalysis:
+    """
+    Everything the extractors need to know about an SDS/MSDS text, computed once.
+    Attributes:
+        content (str): Original document text.
+        sections (dict): Section number -> text, only if at least `MIN_SECTIONS_FOUND` headings were found.
+        all_sections (dict): Section number -> text for every heading found, without that threshold.
+        section_offsets (dict): Section number -> (start, end) character offsets in `content`.
+        h_codes (list): H-codes in order of appearance, normalized ("H225"), duplicates included.
+        section_h_codes (dict): Section number -> H-codes found in that section.
+        p_codes (list): Unique P-codes in order of appearance ("P210").
+        cas_numbers (list): Unique CAS numbers with a valid check digit ("67-64-1").
+        lines (list): Non-empty lines, stripped of whitespace and bullet markers.
+    Notes:
+        - H-codes are matched on the upper-cased text with the same pattern the pipeline always used
+          (`H\\s*\\d{3}`), so the hazard group letter does not change.
+        - Section numbers must appear in increasing order; a heading with a lower number is treated
+          as part of the current section and a repeated heading continues the same section.
+    """
+
+    __slots__ = (
+        "content", "sections", "all_sections", "section_offsets",
+        "h_codes", "section_h_codes", "p_codes", "cas_numbers", "lines"
+    )
+
+    def __init__(self, content: str):
+        self.content = content or ""
+        self.h_codes: List[str] = []
+        self.p_codes: List[str] = []
+        self.cas_numbers: List[str] = []
+        self.lines: List[str] = []
+        self.section_offsets: Dict[int, tuple] = {}
+        self.section_h_codes: Dict[int, List[str]] = {}
+
+        section_lines: Dict[int, List[str]] = {}
+        seen_p, seen_cas = set(), set()
+        current = None
+        offset = 0
+
+        for raw_line in self.content.splitlines(keepends=True):
+            start = offset
+            offset += len(raw_line)
+
+            # Sections
+            number = heading_number(raw_line)
+            if number is not None and (current is None or number >= current):
+                if number != current:
+                    self.section_offsets[number] = (start, offset)
+                current = number
+            if current is not None:
+                section_lines.setdefault(current, []).append(raw_line)
+                self.section_offsets[current] = (self.section_offsets[current][0], offset)
+
+            stripped = raw_line.strip()
+            if not stripped:
+                continue
+
+            # Cleaned lines
+            line = _BULLET_RE.sub("", stripped).strip()
+            self.lines.append(line)
+
+            # Hazard / precautionary codes and CAS numbers
+            upper = stripped.upper()
+            if "H" in upper:
+                codes = [code.replace(" ", "") for code in _H_CODE_RE.findall(upper)]
+                self.h_codes.extend(codes)
+                if codes and current is not None:
+                    self.section_h_codes.setdefault(current, []).extend(codes)
+            if "P" in upper:
+                for code in _P_CODE_RE.findall(upper):
+                    code = code.replace(" ", "")
+                    if code not in seen_p:
+                        seen_p.add(code)
+                        self.p_codes.append(code)
+            if "-" in stripped:
+                for digits, middle, check in _CAS_RE.findall(stripped):
+                    cas = f"{digits}-{middle}-{check}"
+                    if cas not in seen_cas and _valid_cas(digits + middle, check):
+                        seen_cas.add(cas)
+                        self.cas_numbers.append(cas)
+
+        self.all_sections = {number: "".join(lines).strip() for number, lines in section_lines.items()}
+        self.sections = self.all_sections if len(self.all_sections) >= MIN_SECTIONS_FOUND else {}
+
+    def section(self, number: int, default: str = "") -> str:
+        """
+        Returns the text of a section, using any heading found even if the full split was not reliable.
+        """
+        return self.all_sections.get(number, default)
+
+
+@lru_cache(maxsize=32)
+def analyze_document(content: str) -> DocumentAnalysis:
+    """
+    Returns the (cached) analysis of a document text.
+    Args:
+        content (str): Full SDS/MSDS document text.
+    Returns:
+        DocumentAnalysis: Shared, read-only analysis of the document.
+    """
+    return DocumentAnalysis(content)
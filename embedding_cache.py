@@ -0,0 +1,181 @@
+# embedding_cache.py
+# Embeddings wrapper with an in-memory LRU and a persistent SQLite cache
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from telemetry import record
+
+
+def normalize_text(text: str, casefold: bool = False) -> str:
+    """
+    Normalizes a search query before embedding it: Unicode NFC, collapsed whitespace and, optionally, casefolded.
+    """
+    text = " ".join(unicodedata.normalize("NFC", text or "").split())
+    return text.casefold() if casefold else text
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Caches the vectors of an embeddings model in memory (LRU) and on disk (SQLite).
+    Args:
+        embeddings (Embeddings): Underlying model (e.g. OpenAIEmbeddings).
+        model_name (str): Name of the model, part of the cache key.
+        db_path (str, optional): SQLite file of the persistent cache. If None, only the LRU is used.
+        memory_size (int): Maximum number of vectors kept in memory.
+        casefold_queries (bool): If True, queries are lowercased before being embedded, so
+                                 "Acetone" and "acetone" share the same vector. Off by default:
+                                 documents are not lowercased, so it changes retrieval results.
+    Notes:
+        - The key is the SHA-256 of the model name and the text sent to the model, so a hit returns
+          exactly the vector it would get.
+        - Only queries are normalized (`normalize_text`). Documents are embedded as they are: their
+          newlines and markdown tables are part of the vector, as in the Chroma index of the notebook.
+        - `embed_documents` only sends the texts that are not cached, in a single call to the model.
+        - Vectors are stored as float32.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, db_path: Optional[str] = None,
+                 memory_size: int = 2048, casefold_queries: bool = False):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.db_path = db_path
+        self.memory_size = max(0, memory_size)
+        self.casefold_queries = casefold_queries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            with self._lock:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+                    "created_at REAL NOT NULL, vector BLOB NOT NULL)"
+                )
+                self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        """
+        Adds a vector to the LRU. Must be called with the lock held.
+        """
+        if not self.memory_size:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached vectors of the given keys (memory first, then disk).
+        """
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            missing = [key for key in keys if key not in found]
+            if self._conn is not None and missing:
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embedding_cache WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._conn is not None and items:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (key, model, dim, created_at, vector) VALUES (?, ?, ?, ?, ?)",
+                    [(key, self.model_name, len(vector), now, array("f", vector).tobytes()) for key, vector in items.items()]
+                )
+                self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a list of texts, sending only the texts that are not cached.
+        """
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Unique texts that still need the model
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+
+        hits = len(texts) - sum(1 for key in keys if key in pending)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(pending)
+        record(embedding_cache_hits=hits, embedding_cache_misses=len(pending))
+
+        if pending:
+            vectors = self.embeddings.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+
+        return [list(found[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a search query, served from the cache when the same query was embedded before.
+        """
+        normalized = normalize_text(text, casefold=self.casefold_queries)
+        key = self._key(normalized)
+        found = self._lookup([key])
+        if key in found:
+            with self._lock:
+                self.hits += 1
+            record(embedding_cache_hits=1)
+            return list(found[key])
+
+        with self._lock:
+            self.misses += 1
+        record(embedding_cache_misses=1)
+        vector = self.embeddings.embed_query(normalized)
+        self._store({key: vector})
+        return list(vector)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit (memory + disk) / miss counters and the number of vectors in memory.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
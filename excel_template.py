@@ -0,0 +1,383 @@
+# excel_template.py
+# Fast filling of the COSHH Excel template: the template is compiled once and each output only
+# patches the XML of the target sheet inside a cached copy of the .xlsx zip
+import io
+import os
+import re
+import threading
+import zipfile
+import posixpath
+from typing import Any, Dict, Iterable, List, Tuple
+from xml.sax.saxutils import escape
+
+# Fields whose 'position' may be a list of cells (same rule as fill_excel_with_json)
+MULTI_POSITION_FIELDS = frozenset({
+    "likelihood_before_control_measures",
+    "severity",
+    "likelihood_after_control_measures",
+})
+
+# Style of every written cell: Arial 12 bold, centered and wrapped
+STAMP_FONT_XML = '<font><b/><sz val="12"/><name val="Arial"/></font>'
+STAMP_ALIGNMENT_XML = '<alignment horizontal="center" vertical="center" wrapText="1"/>'
+
+_CELL_REF_RE = re.compile(r"^\$?([A-Z]{1,3})\$?(\d+)$")
+_ROW_RE = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_ATTR_RE = re.compile(r'\b([\w:]+)="([^"]*)"')
+_XF_RE = re.compile(r'<xf\b([^>]*?)(?:/>|>(.*?)</xf>)', re.S)
+# Characters that are not allowed in XML 1.0 (openpyxl refuses them too)
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Errors of a template this module cannot patch (unsupported layout, malformed XML, missing parts,
+# corrupt zip): the caller falls back to openpyxl
+TEMPLATE_ERRORS = (ValueError, KeyError, IndexError, zipfile.BadZipFile)
+
+_CACHE: Dict[tuple, "ExcelTemplate"] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# ============================
+# Referencias de celdas
+# ============================
+def split_cell_ref(ref: str) -> Tuple[int, int]:
+    """
+    Returns (row, column) of a cell reference such as "AB13" (columns start at 1).
+    """
+    match = _CELL_REF_RE.match(ref.strip().upper())
+    if not match:
+        raise ValueError(f"Invalid cell reference '{ref}'")
+    column = 0
+    for char in match.group(1):
+        column = column * 26 + ord(char) - 64
+    return int(match.group(2)), column
+
+
+def column_letter(column: int) -> str:
+    """
+    Returns the letters of a column number (1 -> "A", 28 -> "AB").
+    """
+    letters = ""
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def field_cell_map(jsons_list: List[dict]) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Compiles the (field, cells) pairs of a list of table JSONs from their 'position' values.
+    Only the fields in MULTI_POSITION_FIELDS may write to several cells.
+    """
+    field_cells = []
+    for json_data in jsons_list:
+        for field, values in json_data.get("Sheet_2", {}).items():
+            position = values.get("position")
+            if not position:
+                continue
+            if field in MULTI_POSITION_FIELDS and isinstance(position, list):
+                field_cells.append((field, tuple(p.strip().upper() for p in position)))
+            elif isinstance(position, str):
+                field_cells.append((field, (position.strip().upper(),)))
+    return field_cells
+
+
+def cell_values(jsons_list: List[dict]) -> Dict[str, Any]:
+    """
+    Returns the value ('to_excel') to write in every cell. Fields without value are skipped and
+    later JSONs overwrite earlier ones, as with consecutive openpyxl assignments.
+    """
+    values: Dict[str, Any] = {}
+    for json_data in jsons_list:
+        sheet = json_data.get("Sheet_2", {})
+        for field, cells in field_cell_map([json_data]):
+            to_excel = sheet[field].get("to_excel")
+            if to_excel:
+                for cell in cells:
+                    values[cell] = to_excel
+    return values
+
+
+def _attrs(text: str) -> Dict[str, str]:
+    return dict(_ATTR_RE.findall(text or ""))
+
+
+def _format_attrs(attrs: Dict[str, str]) -> str:
+    return "".join(f' {name}="{value}"' for name, value in attrs.items())
+
+
+# ============================
+# Plantilla compilada
+# ============================
+class ExcelTemplate:
+    """
+    Excel template compiled for a fixed set of target cells of one sheet.
+    Args:
+        template_path (str): Path of the .xlsx template.
+        sheet_name (str): Sheet whose cells are filled.
+        cells (Iterable[str]): Cells that may be written (e.g. from `field_cell_map`).
+    Notes:
+        - styles.xml gets, once, one extra cell format per original style of the target cells: the same
+          format with the font and alignment replaced (Arial 12 bold, centered, wrapped), which is what
+          openpyxl produced. Borders, fills and number formats of the template are kept.
+        - The sheet XML is split into literal chunks and one slot per target cell, so rendering is a
+          single string join. Cells without value keep their template XML.
+        - Every other part of the zip is written once into a cached zip; each output only appends
+          the patched sheet to a copy of it, so nothing else is recompressed.
+        - Strings are written as inline strings, so sharedStrings.xml is never modified.
+        - As with openpyxl, formulas are recalculated when the workbook is opened (fullCalcOnLoad).
+        - Raises ValueError if the template has a layout this engine does not handle (the caller can
+          then fall back to openpyxl).
+    """
+
+    def __init__(self, template_path: str, sheet_name: str, cells: Iterable[str]):
+        self.template_path = template_path
+        self.sheet_name = sheet_name
+        self.cells = frozenset(c.strip().upper() for c in cells)
+
+        with zipfile.ZipFile(template_path) as archive:
+            infos = archive.infolist()
+            parts = {info.filename: archive.read(info.filename) for info in infos}
+
+        for required in ("xl/workbook.xml", "xl/_rels/workbook.xml.rels", "xl/styles.xml"):
+            if required not in parts:
+                raise ValueError(f"Template without {required}")
+        self.sheet_part = self._sheet_part(parts, sheet_name)
+        styles_xml, new_styles = self._patch_styles(parts["xl/styles.xml"].decode("utf-8"), parts[self.sheet_part])
+        self._chunks, self._slots = self._compile_sheet(parts[self.sheet_part].decode("utf-8"), new_styles)
+        parts["xl/styles.xml"] = styles_xml.encode("utf-8")
+        parts["xl/workbook.xml"] = self._full_calc_on_load(parts["xl/workbook.xml"].decode("utf-8")).encode("utf-8")
+
+        # Zip with every part except the target sheet, written once
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info in infos:
+                if info.filename != self.sheet_part:
+                    archive.writestr(info.filename, parts[info.filename], compress_type=zipfile.ZIP_DEFLATED)
+        self._base_zip = buffer.getvalue()
+
+    # ---------- Compilation ----------
+    @staticmethod
+    def _sheet_part(parts: Dict[str, bytes], sheet_name: str) -> str:
+        """
+        Returns the zip path of the sheet called `sheet_name`.
+        """
+        workbook = parts["xl/workbook.xml"].decode("utf-8")
+        relationship_id = None
+        for match in re.finditer(r"<sheet\b([^>]*?)/?>", workbook):
+            attrs = _attrs(match.group(1))
+            if attrs.get("name", "").replace("&amp;", "&") == sheet_name:
+                relationship_id = attrs.get("r:id")
+        if relationship_id is None:
+            raise ValueError(f"Sheet '{sheet_name}' not found in the template")
+
+        rels = parts["xl/_rels/workbook.xml.rels"].decode("utf-8")
+        for match in re.finditer(r"<Relationship\b([^>]*?)/?>", rels):
+            attrs = _attrs(match.group(1))
+            if attrs.get("Id") == relationship_id:
+                target = attrs["Target"]
+                path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+                if path in parts:
+                    return path
+        raise ValueError(f"Part of sheet '{sheet_name}' not found in the template")
+
+    def _patch_styles(self, styles_xml: str, sheet_xml: bytes) -> Tuple[str, Dict[int, int]]:
+        """
+        Adds the stamp font and one stamped cell format per style used by the target cells.
+        Returns the new styles.xml and the map original style index -> stamped style index.
+        """
+        sheet = sheet_xml.decode("utf-8")
+        used_styles = {0}
+        for match in _CELL_RE.finditer(sheet):
+            attrs = _attrs(match.group(1))
+            if attrs.get("r", "").upper() in self.cells:
+                used_styles.add(int(attrs.get("s", "0")))
+
+        fonts = re.search(r'<fonts\b([^>]*)>(.*?)</fonts>', styles_xml, re.S)
+        cell_xfs = re.search(r'<cellXfs\b([^>]*)>(.*?)</cellXfs>', styles_xml, re.S)
+        if not fonts or not cell_xfs:
+            raise ValueError("styles.xml without <fonts> or <cellXfs>")
+
+        font_id = len(re.findall(r"<font\b", fonts.group(2)))
+        xfs = list(_XF_RE.finditer(cell_xfs.group(2)))
+        new_styles: Dict[int, int] = {}
+        new_xfs = []
+        for style in sorted(used_styles):
+            if style >= len(xfs):
+                raise ValueError(f"Cell style {style} not found in styles.xml")
+            attrs = _attrs(xfs[style].group(1))
+            attrs.update({"fontId": str(font_id), "applyFont": "1", "applyAlignment": "1"})
+            children = re.sub(r"<alignment\b[^>]*?(?:/>|>.*?</alignment>)", "", xfs[style].group(2) or "", flags=re.S)
+            new_styles[style] = len(xfs) + len(new_xfs)
+            new_xfs.append(f"<xf{_format_attrs(attrs)}>{STAMP_ALIGNMENT_XML}{children}</xf>")
+
+        fonts_attrs = _attrs(fonts.group(1))
+        fonts_attrs["count"] = str(font_id + 1)
+        xfs_attrs = _attrs(cell_xfs.group(1))
+        xfs_attrs["count"] = str(len(xfs) + len(new_xfs))
+        patched = (
+            styles_xml[:fonts.start()]
+            + f"<fonts{_format_attrs(fonts_attrs)}>{fonts.group(2)}{STAMP_FONT_XML}</fonts>"
+            + styles_xml[fonts.end():cell_xfs.start()]
+            + f"<cellXfs{_format_attrs(xfs_attrs)}>{cell_xfs.group(2)}{''.join(new_xfs)}</cellXfs>"
+            + styles_xml[cell_xfs.end():]
+        )
+        return patched, new_styles
+
+    def _compile_sheet(self, sheet_xml: str, new_styles: Dict[int, int]) -> Tuple[List[str], List[tuple]]:
+        """
+        Splits the sheet XML into literal chunks and target cell slots.
+        Each slot is (cell reference, stamped style, original cell XML or "").
+        """
+        sheet_data = re.search(r"<sheetData\s*/>|<sheetData\b[^>]*>(.*?)</sheetData>", sheet_xml, re.S)
+        if sheet_data is None:
+            raise ValueError("Sheet without <sheetData>")
+        if re.search(r"<\w+:c\b|<\w+:row\b", sheet_xml):
+            raise ValueError("Sheet XML with prefixed cell elements is not supported")
+        # Cached formula results are dropped (as openpyxl does): they are recalculated on load
+        sheet_xml = re.sub(r"(<f\b[^>]*?(?:/>|>[^<]*</f>))<v>[^<]*</v>", r"\1", sheet_xml)
+
+        targets: Dict[int, Dict[int, str]] = {}
+        for ref in self.cells:
+            row, column = split_cell_ref(ref)
+            targets.setdefault(row, {})[column] = ref
+
+        # Existing rows: (row number, attributes, cells content or None)
+        rows = [(int(_attrs(m.group(1))["r"]), m.group(1), m.group(2) or "") for m in _ROW_RE.finditer(sheet_data.group(1) or "")]
+        row_numbers = {number for number, _, _ in rows}
+        for number in targets:
+            if number not in row_numbers:
+                rows.append((number, f' r="{number}"', ""))
+        rows.sort(key=lambda r: r[0])
+
+        chunks: List[str] = []
+        slots: List[tuple] = []
+        current = [self._with_dimension(sheet_xml[:sheet_data.start()]) + "<sheetData>"]
+        for number, row_attrs, content in rows:
+            if number not in targets:
+                current.append(f"<row{row_attrs}>{content}</row>" if content else f"<row{row_attrs}/>")
+                continue
+
+            # Spans are an optional hint that may no longer match the written cells
+            attrs = _attrs(row_attrs)
+            attrs.pop("spans", None)
+            current.append(f"<row{_format_attrs(attrs)}>")
+            cells = []
+            for match in _CELL_RE.finditer(content):
+                ref = _attrs(match.group(1)).get("r", "").upper()
+                cells.append((split_cell_ref(ref)[1] if ref else 0, ref, match.group(0)))
+            existing = {ref for _, ref, _ in cells}
+            cells.extend((column, ref, "") for column, ref in targets[number].items() if ref not in existing)
+            cells.sort(key=lambda c: c[0])
+
+            for column, ref, cell_xml in cells:
+                if ref not in self.cells:
+                    current.append(cell_xml)
+                    continue
+                style = int(_attrs(cell_xml[:cell_xml.find(">")]).get("s", "0")) if cell_xml else 0
+                chunks.append("".join(current))
+                slots.append((ref, new_styles[style], cell_xml))
+                current = []
+            current.append("</row>")
+
+        current.append("</sheetData>" + sheet_xml[sheet_data.end():])
+        chunks.append("".join(current))
+        return chunks, slots
+
+    def _with_dimension(self, sheet_head: str) -> str:
+        """
+        Extends the <dimension> of the sheet so it covers the target cells.
+        """
+        dimension = re.search(r'<dimension\b[^>]*?\bref="([^"]*)"[^>]*/>', sheet_head)
+        if dimension is None:
+            return sheet_head
+        refs = [split_cell_ref(c) for c in self.cells]
+        for part in dimension.group(1).split(":"):
+            refs.append(split_cell_ref(part))
+        rows = [r for r, _ in refs]
+        columns = [c for _, c in refs]
+        ref = f"{column_letter(min(columns))}{min(rows)}:{column_letter(max(columns))}{max(rows)}"
+        return sheet_head[:dimension.start()] + f'<dimension ref="{ref}"/>' + sheet_head[dimension.end():]
+
+    @staticmethod
+    def _full_calc_on_load(workbook_xml: str) -> str:
+        """
+        Makes Excel recalculate every formula when the workbook is opened (openpyxl does the same).
+        """
+        calc = re.search(r"<calcPr\b([^>]*?)/>", workbook_xml)
+        if calc:
+            attrs = _attrs(calc.group(1))
+            attrs["fullCalcOnLoad"] = "1"
+            return workbook_xml[:calc.start()] + f"<calcPr{_format_attrs(attrs)}/>" + workbook_xml[calc.end():]
+        for anchor in ("</definedNames>", "</sheets>"):
+            index = workbook_xml.find(anchor)
+            if index != -1:
+                index += len(anchor)
+                return workbook_xml[:index] + '<calcPr fullCalcOnLoad="1"/>' + workbook_xml[index:]
+        raise ValueError("workbook.xml without <sheets>")
+
+    # ---------- Rendering ----------
+    @staticmethod
+    def _cell_xml(ref: str, style: int, value: Any) -> str:
+        if isinstance(value, bool):
+            return f'<c r="{ref}" s="{style}" t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}" s="{style}"><v>{value}</v></c>'
+        text = escape(_ILLEGAL_XML_RE.sub("", str(value)))
+        return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def render_sheet(self, values: Dict[str, Any]) -> str:
+        """
+        Returns the XML of the sheet with the given {cell: value} written.
+        Values of cells that were not compiled into the template are ignored.
+        """
+        out = []
+        for chunk, (ref, style, original) in zip(self._chunks, self._slots):
+            out.append(chunk)
+            value = values.get(ref)
+            out.append(self._cell_xml(ref, style, value) if value not in (None, "") else original)
+        out.append(self._chunks[-1])
+        return "".join(out)
+
+    def render(self, values: Dict[str, Any]) -> bytes:
+        """
+        Returns the bytes of a complete .xlsx with the given {cell: value} written.
+        """
+        buffer = io.BytesIO(self._base_zip)
+        buffer.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(self.sheet_part, self.render_sheet(values).encode("utf-8"))
+        return buffer.getvalue()
+
+
+# ============================
+# API
+# ============================
+def get_excel_template(template_path: str, sheet_name: str, cells: Iterable[str]) -> ExcelTemplate:
+    """
+    Returns the compiled template, cached per process and recompiled when the file changes
+    or other target cells are requested.
+    """
+    cells = frozenset(c.strip().upper() for c in cells)
+    stat = os.stat(template_path)
+    key = (os.path.abspath(template_path), stat.st_mtime, stat.st_size, sheet_name, cells)
+    with _CACHE_LOCK:
+        template = _CACHE.get(key)
+    if template is None:
+        template = ExcelTemplate(template_path, sheet_name, cells)
+        with _CACHE_LOCK:
+            # Only the latest version of each template/sheet is kept
+            for old_key in [k for k in _CACHE if k[0] == key[0] and k[3] == sheet_name]:
+                del _CACHE[old_key]
+            _CACHE[key] = template
+    return template
+
+
+def render_excel(jsons_list: List[dict], template_path: str, sheet_name: str = "COSHH Assessment") -> bytes:
+    """
+    Fills the template with the 'to_excel' values of the JSONs and returns the .xlsx as bytes
+    (ready for a download button or to be written to disk).
+    """
+    cells = {cell for _, field_cells in field_cell_map(jsons_list) for cell in field_cells}
+    template = get_excel_template(template_path, sheet_name, cells)
+    return template.render(cell_values(jsons_list))
@@ -3,13 +3,19 @@
 # Standard Library
 import os
 import re
+import copy
 import json
+import hashlib
+import threading
+from concurrent.futures import Future
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Font, Alignment
-from config import folder_documents, JSON_PATHS, template_path, output_Excel
-from llm_setup import llm as default_llm, llm, db
+from functools import lru_cache
+from config import (
+    folder_documents, JSON_PATHS, template_path, output_Excel, MAX_CONCURRENCY,
+    EXCEL_FAST_TEMPLATE, EXCEL_SHEET_NAME, TEXT_EXTRACTION_MODE, STRUCTURED_REPAIR_RETRIES,
+)
+from llm_setup import get_llm
 from utils import (
     _FIELD_PATTERNS,
     PPE_FIELDS,
@@ -18,23 +24,72 @@ from utils import (
     dtr_tables, hazards_protection_measures_fields, hazards_fields_dtr,
     waste_disposal_measures_fields_dtr, spill_management_fields_dtr, fire_procedures_fields_dtr,
     first_aid_procedures_fields_dtr, storage_fields_dtr, hazards_fields_statements,
+    TABLE_SECTIONS, FIELD_SECTIONS, EXTRACTOR_SECTIONS,
+    H_STATEMENTS, GHS_PICTOGRAMS,
+)
+from sds_sections import scope_content
+from document_analysis import analyze_document, clean_lines
+from scheduler import Stage, run_stage_graph
+from excel_template import render_excel, MULTI_POSITION_FIELDS, TEMPLATE_ERRORS
+from json_templates import TableJSON, new_document_tables
+from structured_output import (
+    MAX_EXCEL_CHARS, table_schema, parse_json_object, validate_fields, salvage_fields, excel_value,
 )
-def process_document(source_match, content):
+from source_catalog import get_source_catalog
+from name_index import get_name_index
+from telemetry import track_document, checkpoint, span, traced
+from prompt_builder import build_prompt
+
+# Checkpoints of process_document, in order (reported through `on_event`)
+PIPELINE_STEPS = [
+    "Document identification",
+    "Initial information extraction",
+    "Initialization of JSONs with base data",
+    "Enrichment with Hazard Group RAG",
+    "Filling severity / probability fields",
+    "Processing fields with images / measures and extraction of specific text by section",
+    "Prepare list of JSONs for Excel",
+    "Create / fill final Excel",
+]
+
+def process_document(source_match, content, max_workers=None, output_dir=None, on_event=None):
     """
     Processes an SDS/MSDS document from data extraction to Excel completion.
+    The extraction steps are executed as a dependency graph: once the base data is filled,
+    the stages of the six tables run concurrently on a bounded worker pool.
     Args:
         source_match (str): File name or identifier.
         content (str): Full content of the document.
+        max_workers (int, optional): Maximum number of concurrent stages. Defaults to `MAX_CONCURRENCY`.
+        output_dir (str, optional): Folder for the generated Excel. Defaults to `output_Excel`.
+        on_event (Callable, optional): Receives a dict for every progress event:
+            - {"type": "step", "step": name, "index": i, "total": len(PIPELINE_STEPS)} when a step starts.
+            - {"type": "stage", "stage": name, "done": n, "total": m} when a stage of step 6 finishes.
+            - {"type": "partial", "table": name, "data": dict} with a copy of a table's JSON once
+              no stage modifies it anymore.
     Returns:
         tuple: (dict of updated JSONs, bool indicating if Excel was generated)
+    Notes:
+        - Stages of the same table that touch disjoint fields (e.g. PPE, pictograms and hazards text)
+          run in parallel and update the same JSON in place.
+        - Stages without LLM calls (hazard group, severity) run before the LLM stages of their table.
+        - `on_event` is called from the thread running process_document, never from the stage workers.
+        - Wall time, LLM calls, tokens, cache hits and cost of every step, stage and extractor are
+          recorded per document (see telemetry.py and TELEMETRY_* in config).
     """
+    with track_document(source_match):
+        return _process_document(source_match, content, max_workers, output_dir, on_event)
+
 
-    # Read JSONs
-    json_data = {}
+def _process_document(source_match, content, max_workers, output_dir, on_event):
+    if max_workers is None:
+        max_workers = MAX_CONCURRENCY
+    if output_dir is None:
+        output_dir = output_Excel
+
+    # Fresh copies of the base JSONs (parsed once per process, see json_templates.py)
     try:
-        for key, path in JSON_PATHS.items():
-            with open(path, "r", encoding="utf-8") as f:
-                json_data[key] = json.load(f)
+        json_data = new_document_tables(JSON_PATHS)
     except Exception as e:
         raise RuntimeError(f"Error reading base JSONs: {e}")
 
@@ -46,157 +101,157 @@ def process_document(source_match, content):
     json_first_aid_procedures = json_data["first_aid_procedures"]
     json_storage = json_data["storage"]
 
+    def emit(event):
+        if on_event is not None:
+            on_event(event)
+
+    def step(name):
+        print(name)
+        checkpoint(name)
+        emit({"type": "step", "step": name, "index": PIPELINE_STEPS.index(name), "total": len(PIPELINE_STEPS)})
+
+    def emit_partial(table, json_input):
+        if on_event is not None:
+            emit({"type": "partial", "table": table, "data": copy.deepcopy(json_input)})
+
     # 1. Document identification
-    print("Document identification")
+    step("Document identification")
     base_id = get_document_id(source_match)
 
     # 2. Initial information extraction
-    print("Initial information extraction")
+    step("Initial information extraction")
     chemical_names = extract_chemical_names(source_match, content)
 
     # 3. Initialization of JSONs with base data
-    print("Initialization of JSONs with base data")
-    updated_json_hazards = fill_json_chemical_fields(
-        json_input=json_hazards,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    updated_json_waste_disposal_measures = fill_json_chemical_fields(
-        json_input=json_waste_disposal_measures,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    updated_json_spill_management = fill_json_chemical_fields(
-        json_input=json_spill_management,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    updated_json_fire_procedures = fill_json_chemical_fields(
-        json_input=json_fire_procedures,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    updated_json_first_aid_procedures = fill_json_chemical_fields(
-        json_input=json_first_aid_procedures,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    updated_json_storage = fill_json_chemical_fields(
-        json_input=json_storage,
-        content=content,
-        base_id=base_id,
-        chemical_names=chemical_names,
-        source_match=source_match
-    )
-
-    # 4. Processing fields with images / measures
-    print("Processing fields with images / measures")
-    updated_json_hazards = control_measures_with_images(
-        "Personal Protection",
-        content,
-        hazards_protection_measures_fields,
-        updated_json_hazards['Sheet_2'],
-        llm
-    )
-
-    fields_with_images(
-        field_name="Hazard Statements",
-        content=content,
-        fields_list=hazards_fields_statements,
-        data_dict=updated_json_hazards['Sheet_2'],
-        model=llm
-    )
-
-    updated_json_storage = storage_fields_with_images(
-        "Storage",
-        content,
-        STORAGE_FIELDS,
-        updated_json_storage['Sheet_2'],
-        llm
-    )
-
-    # 5. Enrichment with Hazard Group RAG
-    print("Enrichment with Hazard Group RAG")
-    updated_json_hazards = fill_hazard_group_rag(source_match, updated_json_hazards, content)
-    updated_json_waste_disposal_measures = fill_hazard_group_rag(source_match, updated_json_waste_disposal_measures, content)
-    updated_json_storage = fill_hazard_group_rag(source_match, updated_json_storage, content)
-
-    # 6. Filling severity / probability fields
-    print("Filling severity / probability fields")
-    fill_json_severity_probability(updated_json_hazards)
-
-    # 7. Extraction of specific text by section
-    print("Extraction of specific text by section")
-    updated_json_hazards = extract_hazards_text(
-        source_match,
-        updated_json_hazards,
-        model=llm,
-        content=content,
-        fields_list=hazards_fields_dtr
-    )
-
-    updated_json_waste_disposal_measures = general_text_extraction(
-        source_match,
-        updated_json_waste_disposal_measures,
-        model=llm,
-        content=content,
-        fields_list=waste_disposal_measures_fields_dtr,
-        table_index=1
-    )
-
-    updated_json_spill_management = general_text_extraction(
-        source_match,
-        updated_json_spill_management,
-        model=llm,
-        content=content,
-        fields_list=spill_management_fields_dtr,
-        table_index=2
-    )
-
-    updated_json_fire_procedures = general_text_extraction(
-        source_match,
-        updated_json_fire_procedures,
-        model=llm,
-        content=content,
-        fields_list=fire_procedures_fields_dtr,
-        table_index=3
-    )
-
-    updated_json_first_aid_procedures = general_text_extraction(
-        source_match,
-        updated_json_first_aid_procedures,
-        model=llm,
-        content=content,
-        fields_list=first_aid_procedures_fields_dtr,
-        table_index=4
-    )
-
-    updated_json_storage = general_text_extraction(
-        source_match,
-        updated_json_storage,
-        model=llm,
-        content=content,
-        fields_list=storage_fields_dtr,
-        table_index=5
-    )
+    step("Initialization of JSONs with base data")
+    for json_input in json_data.values():
+        fill_json_chemical_fields(
+            json_input=json_input,
+            content=content,
+            base_id=base_id,
+            chemical_names=chemical_names,
+            source_match=source_match
+        )
 
-    # 8. Prepare list of JSONs for Excel
-    print("Prepare list of JSONs for Excel")
+    # 4. Enrichment with Hazard Group RAG
+    step("Enrichment with Hazard Group RAG")
+    fill_hazard_group_rag(source_match, json_hazards, content)
+    fill_hazard_group_rag(source_match, json_waste_disposal_measures, content)
+    fill_hazard_group_rag(source_match, json_storage, content)
+
+    # 5. Filling severity / probability fields
+    step("Filling severity / probability fields")
+    fill_json_severity_probability(json_hazards)
+    for table, json_input in (("Hazards", json_hazards), ("Waste_disposal_measures", json_waste_disposal_measures),
+                              ("Storage", json_storage), ("Fire_procedures", json_fire_procedures),
+                              ("First_aid_procedures", json_first_aid_procedures),
+                              ("Spill_management", json_spill_management)):
+        emit_partial(table, json_input)
+
+    # 6. Fields with images / measures and extraction of specific text by section
+    # Every stage below works on its own fields, so they are independent of each other
+    step("Processing fields with images / measures and extraction of specific text by section")
+    model = get_llm()
+    stages = [
+        Stage("hazards_control_measures", lambda deps: control_measures_with_images(
+            "Personal Protection",
+            content,
+            hazards_protection_measures_fields,
+            json_hazards,
+            model=model
+        )),
+        Stage("hazards_statements", lambda deps: fields_with_images(
+            field_name="Hazard Statements",
+            content=content,
+            fields_list=hazards_fields_statements,
+            data_dict=json_hazards['Sheet_2'],
+            model=model
+        )),
+        Stage("storage_fields", lambda deps: storage_fields_with_images(
+            "Storage",
+            content,
+            STORAGE_FIELDS,
+            json_storage['Sheet_2'],
+            model=model
+        )),
+    ]
+    # Text fields: two calls per field (selector + answer) or one structured response per table
+    structured = TEXT_EXTRACTION_MODE == "structured"
+    if structured:
+        stages.append(Stage("hazards_text", lambda deps: structured_text_extraction(
+            source_match,
+            json_hazards,
+            model=model,
+            content=content,
+            fields_list=hazards_fields_dtr,
+            table_index=0,
+            questions=HAZARD_TEXT_QUESTIONS
+        )))
+    else:
+        stages.append(Stage("hazards_text", lambda deps: extract_hazards_text(
+            source_match,
+            json_hazards,
+            model=model,
+            content=content,
+            fields_list=hazards_fields_dtr
+        )))
+    text_tables = [
+        ("waste_disposal_measures_text", json_waste_disposal_measures, waste_disposal_measures_fields_dtr, 1),
+        ("spill_management_text", json_spill_management, spill_management_fields_dtr, 2),
+        ("fire_procedures_text", json_fire_procedures, fire_procedures_fields_dtr, 3),
+        ("first_aid_procedures_text", json_first_aid_procedures, first_aid_procedures_fields_dtr, 4),
+        ("storage_text", json_storage, storage_fields_dtr, 5),
+    ]
+    text_extraction = structured_text_extraction if structured else general_text_extraction
+    for stage_name, json_input, fields_list, table_index in text_tables:
+        stages.append(Stage(stage_name, lambda deps, j=json_input, f=fields_list, t=table_index: text_extraction(
+            source_match,
+            j,
+            model=model,
+            content=content,
+            fields_list=f,
+            table_index=t
+        )))
+
+    # Each stage is measured as a telemetry span with its own name
+    stages = [Stage(stage.name, _stage_span(stage.name, stage.func), stage.depends_on) for stage in stages]
+
+    # Table modified by each stage: a table is reported as partial result once all its stages are done
+    stage_tables = {
+        "hazards_control_measures": ("Hazards", json_hazards),
+        "hazards_statements": ("Hazards", json_hazards),
+        "hazards_text": ("Hazards", json_hazards),
+        "storage_fields": ("Storage", json_storage),
+        "storage_text": ("Storage", json_storage),
+        "waste_disposal_measures_text": ("Waste_disposal_measures", json_waste_disposal_measures),
+        "spill_management_text": ("Spill_management", json_spill_management),
+        "fire_procedures_text": ("Fire_procedures", json_fire_procedures),
+        "first_aid_procedures_text": ("First_aid_procedures", json_first_aid_procedures),
+    }
+    stages_left = {}
+    for table, _ in stage_tables.values():
+        stages_left[table] = stages_left.get(table, 0) + 1
+    finished_stages = []
+
+    def on_stage_end(name):
+        finished_stages.append(name)
+        emit({"type": "stage", "stage": name, "done": len(finished_stages), "total": len(stages)})
+        table, json_input = stage_tables[name]
+        stages_left[table] -= 1
+        if not stages_left[table]:
+            emit_partial(table, json_input)
+
+    run_stage_graph(stages, max_workers=max_workers, on_stage_end=on_stage_end)
+
+    updated_json_hazards = json_hazards
+    updated_json_waste_disposal_measures = json_waste_disposal_measures
+    updated_json_spill_management = json_spill_management
+    updated_json_fire_procedures = json_fire_procedures
+    updated_json_first_aid_procedures = json_first_aid_procedures
+    updated_json_storage = json_storage
+
+    # 7. Prepare list of JSONs for Excel
+    step("Prepare list of JSONs for Excel")
     list_of_jsons_to_excel = [
         updated_json_waste_disposal_measures,
         updated_json_storage,
@@ -213,16 +268,16 @@ def process_document(source_match, content):
     print(updated_json_first_aid_procedures)
     print(updated_json_storage)
 
-    # 9. Create / fill final Excel
-    print("Create / fill final Excel")
+    # 8. Create / fill final Excel
+    step("Create / fill final Excel")
     excel_created = fill_excel_with_json(
         list_of_jsons_to_excel,
         template_path,
-        output_Excel,
+        output_dir,
         source_match=source_match
     )
 
-    # 10. Return updated JSONs and Excel status
+    # 9. Return updated JSONs and Excel status
     updated_jsons = {
         "Hazards": updated_json_hazards,
         "Waste_disposal_measures": updated_json_waste_disposal_measures,
@@ -233,6 +288,18 @@ def process_document(source_match, content):
     }
 
     return updated_jsons, excel_created
+
+
+def _stage_span(name, func):
+    """
+    Wraps the function of a stage so it runs inside the telemetry span `name`.
+    """
+    def run(deps):
+        with span(name):
+            return func(deps)
+    return run
+
+
 # Filtering
 def list_db_sources(db):
     """
@@ -242,20 +309,22 @@ def list_db_sources(db):
     Returns:
         A set of unique source strings extracted from the database metadata.
     Notes:
+        - Uses the cached source catalog (see source_catalog.py): only the metadata is read,
+          page by page, and only when the collection has changed since the last call.
         - Prints the total number of unique sources found.
         - Prints up to the first 100 sources for quick inspection.
     """
 
-    res = db.get()
-    metadatas = res.get("metadatas", [])
-    sources = {meta.get("source", "") for meta in metadatas if isinstance(meta, dict)}
+    catalog = get_source_catalog(db)
+    sources = set(catalog.sources)
     print(f"Found {len(sources)} unique sources")
-    for s in list(sources)[:100]:
+    for s in catalog.names()[:100]:
         print(" -", repr(s))
     return sources
 
 # Function responsible for returning a document for the retriever (with content)
-def filter_document(query_doc, db, k=10):
+@traced()
+def filter_document(query_doc, db, k=10, use_name_index=True):
     """
     Retrieves the most relevant document from a vector database based on a query,
     and returns its content along with the source filename.
@@ -263,6 +332,9 @@ def filter_document(query_doc, db, k=10):
         query_doc (str): The query text used to find similar documents.
         db: Vector database object with an `as_retriever` method.
         k (int, optional): Number of similar documents to fetch. Defaults to 10.
+        use_name_index (bool, optional): If True, first looks the query up in the local product name /
+            document ID index (see name_index.py) and only runs the vector search when there is no
+            confident match. Defaults to True.
     Returns:
         tuple: (source_match, content)
             - source_match (str): The filename of the most similar document.
@@ -272,20 +344,25 @@ def filter_document(query_doc, db, k=10):
         ValueError: If no similar documents are found in the database.
 
     Notes:
-        - Uses the database retriever with similarity search.
+        - Name index hits need no embedding request; otherwise uses the database retriever with similarity search.
         - Assumes that the file exists in `folder_documents` with the name in metadata.
         - If the physical file is missing or cannot be read, returns None for content.
     """
     print(db)
-    retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": k})
-    relevant_documents = retriever.invoke(query_doc)
+    source_match = get_name_index(db).best_match(query_doc) if use_name_index else None
 
-    if not relevant_documents:
-        raise ValueError("No similar document was found in the database.")
+    if source_match:
+        print(f"Document matched by name: {source_match}")
+    else:
+        retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": k})
+        relevant_documents = retriever.invoke(query_doc)
 
-    # Full name of the document (according to metadata)
-    source_match = relevant_documents[0].metadata.get('source')
-    print(f"Most similar document: {source_match}")
+        if not relevant_documents:
+            raise ValueError("No similar document was found in the database.")
+
+        # Full name of the document (according to metadata)
+        source_match = relevant_documents[0].metadata.get('source')
+        print(f"Most similar document: {source_match}")
 
     # Physical path to the file
     doc_path = os.path.join(folder_documents, source_match)
@@ -376,6 +453,7 @@ def clean_chemical_names(raw_list):
     return clean_names
 
 # Extract chemical names from a document (SDS/MSDS)
+@traced()
 def extract_chemical_names(source_match, content, use_llm=True, model=None):
     """
     Extracts chemical ingredient names from an SDS/MSDS document using a combination of regex and LLM-based parsing.
@@ -384,20 +462,18 @@ def extract_chemical_names(source_match, content, use_llm=True, model=None):
         content (str): Full text content of the SDS/MSDS document.
         use_llm (bool): If True, uses an LLM to supplement extraction when regex finds few or no names.
         model: Instance of an LLM (e.g., ChatOpenAI) to use if LLM extraction is enabled.
-               If None and use_llm=True, uses the global default llm instance.
+               If None and use_llm=True, uses the shared llm instance (llm_setup.get_llm).
     Returns:
         list of str: Cleaned list of extracted chemical names.
     """
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
 
     found_names = []
 
-    # Step 1: Regex on Section 3
-    section3 = ""
-    match = re.search(r"(section\s*3.*?composition.*?)(section\s*\d+|$)", content, re.IGNORECASE | re.DOTALL)
-    if match:
-        section3 = match.group(1)
+    # Step 1: Regex on Section 3 (located once by the document analysis)
+    section3 = analyze_document(content or "").section(3)
+    if section3:
         patterns = [
             r"ingredient[s]?:?\s*([\w\s\-\(\)\/]+)",
             r"component[s]?:?\s*([\w\s\-\(\)\/]+)",
@@ -412,10 +488,8 @@ def extract_chemical_names(source_match, content, use_llm=True, model=None):
 
     # Step 2: LLM if regex is insufficient
     if use_llm and (not found_names or len(found_names) < 2):
-        prompt_template = f"""
-        You are an expert assistant for analyzing chemical safety datasheets (SDS / MSDS).
-
-        Task: Extract **only the chemical ingredient names** from the following document.
+        prompt_template = build_prompt(scope_content(content, EXTRACTOR_SECTIONS["chemical_names"]), """
+        Task: Extract **only the chemical ingredient names** from the document.
 
         Strict rules:
         - Focus on Section 3 (Composition / Information on Ingredients)
@@ -424,13 +498,8 @@ def extract_chemical_names(source_match, content, use_llm=True, model=None):
         - DO NOT include percentages, CAS numbers, regulatory phrases, or comments
         - ALWAYS return valid JSON in this schema:
 
-        {{ "chemical_names": ["Name1", "Name2", "Name3"] }}
-
-        Document:
-        ---
-        {content}
-        ---
-        """
+        { "chemical_names": ["Name1", "Name2", "Name3"] }
+        """)
         response = model.invoke(prompt_template).content
 
         # Clean ```json ... ```
@@ -522,7 +591,8 @@ def fill_json_chemical_fields(
     Procedure:
         1. If `chemical_names` is not provided, extract them from the document using `extract_chemical_names`.
         2. Extract the product name from `source_match` if available.
-        3. Recursively traverse the JSON structure:
+        3. Write the fields directly if `json_input` is a compiled TableJSON; otherwise recursively
+           traverse the JSON structure:
             - For each 'chemical_name' field, fill it with either:
                 "{product_name}: name1, name2, ..." or "name1, name2, ..." if product name is unavailable.
             - For each 'sds_reference' field, fill it with `base_id`.
@@ -534,20 +604,25 @@ def fill_json_chemical_fields(
 
     product_name = get_product_name(source_match) if source_match else None
 
+    if product_name:
+        chemicals_str = f"{product_name}: {', '.join(chemical_names)}"
+    else:
+        chemicals_str = ", ".join(chemical_names)
+
+    # Compiled template: direct writes to the known records
+    if isinstance(json_input, TableJSON):
+        json_input.set_field("chemical_name", chemicals_str)
+        json_input.set_field("sds_reference", base_id)
+        return json_input
+
     def update_fields(data):
         if isinstance(data, dict):
             for key, value in data.items():
 
                 # 🔹 Store as plain string
                 if key == "chemical_name" and isinstance(value, dict):
-                    if product_name:
-                        chemicals_str = f"{product_name}: {', '.join(chemical_names)}"
-                        value["response"] = chemicals_str
-                        value["to_excel"] = chemicals_str
-                    else:
-                        chemicals_str = ", ".join(chemical_names)
-                        value["response"] = chemicals_str
-                        value["to_excel"] = chemicals_str
+                    value["response"] = chemicals_str
+                    value["to_excel"] = chemicals_str
 
                 elif key == "sds_reference" and isinstance(value, dict):
                     value["response"] = base_id
@@ -565,6 +640,13 @@ def fill_json_chemical_fields(
 
 
 # Control Measures
+@lru_cache(maxsize=256)
+def _compiled_patterns(patterns: tuple) -> tuple:
+    """
+    Compiles (once) the regex patterns of a field, used by `matches_any` / `_matches_any`.
+    """
+    return tuple(re.compile(p) for p in patterns)
+
 def _candidate_lines(text: str):
     """
     Extracts useful lines from a text document by cleaning and normalizing each line.
@@ -582,14 +664,7 @@ def _candidate_lines(text: str):
         5. Return the resulting list of cleaned lines.
     """
 
-    lines = []
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        line = re.sub(r"^[\-\*\•\u2022]+\s*", "", line).strip()
-        lines.append(line)
-    return lines
+    return list(clean_lines(text))
 
 def _matches_any(line: str, patterns):
     """
@@ -607,7 +682,7 @@ def _matches_any(line: str, patterns):
     """
 
     line_lower = line.lower()
-    return any(re.search(p, line_lower) for p in patterns)
+    return any(p.search(line_lower) for p in _compiled_patterns(tuple(patterns)))
 
 def _find_support_for_field(summary_text: str, field_key: str) -> str:
     """
@@ -654,6 +729,7 @@ def _extract_json_block(text: str):
     # Plan B: try parsing as is
     return text
 
+@traced()
 def control_measures_with_images(field_name, content, fields_list, data_dict, use_llm=True, model=None):
     """
     Extracts control measures (including PPE) from a text context and fills the JSON accordingly.
@@ -679,7 +755,10 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
 
     # Preparar el modelo LLM
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
+
+    # Only the SDS sections mapped to this group of fields
+    content = scope_content(content, EXTRACTOR_SECTIONS.get(field_name))
 
     # Base summary
     base_prompt = """
@@ -687,11 +766,11 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
     Do not invent or add external information.
     If the context contains no information relevant to the question, state explicitly that the information is not available.
     """
-    request = f"""
+    request = build_prompt(content, f"""
     Answer the question based only on these instructions: {base_prompt}.
-    What are the main {field_name} risks or measures in the context: {content}?
+    What are the main {field_name} risks or measures in the document (the context)?
     Answer in bullet points, keeping the exact wording from the context whenever possible.
-    """
+    """)
     field_summary = model.invoke(request).content
 
     # Special case: Hazard Statements (trabajar sobre sheet)
@@ -699,11 +778,9 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
         sheet["hazard_statements"]["to_excel"] = field_summary.replace('*','')
 
     # Prompt PPE: binary mapping of 6 fields
-    mapping_prompt = f"""
-    Based only on this extracted information:
-    {field_summary}
-
-    Check which of the following protection measures are explicitly required or implied.
+    mapping_prompt = build_prompt(field_summary, """
+    Based only on the extracted information in the document above,
+    check which of the following protection measures are explicitly required or implied.
     Mark with 'X' if true, otherwise '' (empty string).
 
     Fields:
@@ -718,7 +795,7 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
     field_name: X
     field_name:
     (one per line; no extra commentary)
-    """
+    """)
     ppe_result = model.invoke(mapping_prompt).content
 
     # Initialize PPE fields empty in sheet (si no existen, crear estructura mínima)
@@ -743,9 +820,8 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
 
     # Prompt "Other control measures" (excluding the six PPE fields)
     active_ppe = [f for f in PPE_FIELDS if sheet.get(f, {}).get("to_excel") == "X"]
-    other_prompt = f"""
-    You are given this extracted text (context):
-    {field_summary}
+    other_prompt = build_prompt(field_summary, f"""
+    The document above is extracted text (context).
 
     Task: List ALL explicit control or prevention measures that are NOT any of these categories:
     - full face visor / face shield
@@ -767,7 +843,7 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
     - "list": concise, actionable phrases; do not include H-codes or P-codes; no headings like 'Hygiene:'.
     - "paragraph": copy the original text fragment(s) verbatim from the context containing those 'other' measures.
     - If there are none, return: {{ "list": [], "paragraph": "" }}.
-    """
+    """)
     other_raw = model.invoke(other_prompt).content
 
     # Robust JSON parsing
@@ -809,8 +885,109 @@ def control_measures_with_images(field_name, content, fields_list, data_dict, us
     # If the input was only the sheet, return a JSON containing Sheet_2 to avoid breaking assignments
     return {"Sheet_2": sheet}
 
+
 # Hazards Extraction
-def fields_with_images(field_name, content, fields_list, data_dict, use_llm=True, model=None):
+def hazard_codes_for_pictograms(content: str) -> List[str]:
+    """
+    Returns the known H-codes (see `H_STATEMENTS`) that classify the product, in order of appearance.
+    The codes of Section 2 (hazards identification) are used when the document was split into
+    sections reliably, since Sections 3 and 16 also list the H-statements of the individual ingredients.
+    Otherwise (or if Section 2 has no known code) the codes of the whole document are used: a split
+    that failed validation can cut Section 2 short, and a missed pictogram is worse than an extra one.
+    """
+    analysis = analyze_document(content or "")
+    if analysis.sections:
+        known = [code for code in dict.fromkeys(analysis.section_h_codes.get(2, [])) if code in H_STATEMENTS]
+        if known:
+            return known
+    return [code for code in dict.fromkeys(analysis.h_codes) if code in H_STATEMENTS]
+
+
+def pictograms_from_h_codes(h_codes: List[str]) -> Dict[str, bool]:
+    """
+    Determines the pictogram fields of the Hazards table from a list of H-codes.
+    Args:
+        h_codes (list): Normalized H-codes (e.g. ["H225", "H319"]).
+    Returns:
+        dict: Pictogram field (values of `GHS_PICTOGRAMS`) -> True if the pictogram applies.
+    Notes:
+        Applies the precedence rules of CLP Article 26(1) for the exclamation mark (GHS07):
+        - not shown when the skull and crossbones (GHS06) applies;
+        - not shown for skin/eye irritation when the corrosion pictogram (GHS05) applies;
+        - not shown for skin sensitisation or skin/eye irritation when the health hazard
+          pictogram (GHS08) applies for respiratory sensitisation (H334).
+    """
+    sources = {}
+    for code in h_codes:
+        for pictogram in H_STATEMENTS.get(code, ("", (), ""))[1]:
+            sources.setdefault(pictogram, set()).add(code)
+
+    exclamation = sources.get("GHS07", set())
+    if exclamation:
+        if "GHS06" in sources:
+            exclamation = set()
+        else:
+            if "GHS05" in sources:
+                exclamation -= {"H315", "H319"}
+            if "H334" in h_codes:
+                exclamation -= {"H315", "H317", "H319"}
+        if not exclamation:
+            sources.pop("GHS07")
+
+    return {field: pictogram in sources for pictogram, field in GHS_PICTOGRAMS.items()}
+
+
+def classify_pictograms_batch(field_response, fields_list, data_dict, model):
+    """
+    Classifies all pictogram/hazard fields with a single LLM call returning JSON.
+    Args:
+        field_response (str): Base LLM answer describing the hazards of the document.
+        fields_list (list): Keys of the pictogram fields to classify.
+        data_dict (dict): JSON structure with the 'content' description of each field.
+        model: LLM object with a .predict() method.
+    Returns:
+        dict or None: Mapping field -> 'X' or '' for every field in `fields_list`,
+                      or None if the response is not valid JSON or does not match the field list.
+    """
+
+    fields_description = "\n    ".join(f"- {field}: {data_dict[field]['content']}" for field in fields_list)
+    schema_example = ", ".join(f'"{field}": "X" or ""' for field in fields_list)
+    request_batch = build_prompt(field_response, f"""
+    Answer the question based only on the information in the document above.
+    For each of the following risks, is it explicitly mentioned in the provided context?
+    Answer 'X' if True, else '' (empty string).
+    For the Serious health hazard risk, answer 'X' only if there is an extreme danger.
+
+    Fields:
+    {fields_description}
+
+    Return STRICT JSON with exactly these keys and no commentary:
+    {{{schema_example}}}
+    """)
+
+    try:
+        raw = model.predict(request_batch)
+        parsed = json.loads(extract_json_block(raw.strip().strip("`").replace("json", "", 1).strip()))
+    except Exception as e:
+        print(f"Batched pictogram classification failed: {e}")
+        return None
+
+    # Validate against the field list
+    if not isinstance(parsed, dict) or set(parsed) != set(fields_list):
+        print(f"Batched pictogram response does not match the field list: {parsed}")
+        return None
+    result = {}
+    for field in fields_list:
+        value = parsed[field]
+        value = value.strip().upper() if isinstance(value, str) else value
+        if value not in ("X", ""):
+            print(f"Invalid value for '{field}' in batched pictogram response: {parsed[field]!r}")
+            return None
+        result[field] = value
+    return result
+
+@traced()
+def fields_with_images(field_name, content, fields_list, data_dict, use_llm=True, model=None, batch=True, use_h_codes=True):
     """
     Updates hazard/pictogram fields in a JSON based on LLM analysis.
     Args:
@@ -819,32 +996,65 @@ def fields_with_images(field_name, content, fields_list, data_dict, use_llm=True
         fields_list (list): List of keys in `data_dict` corresponding to hazard/pictogram fields.
         data_dict (dict): JSON structure where the results will be stored.
                           Each key must contain 'content', 'position', and 'to_excel'.
-        llm: Language model object with an 'invoke' or 'predict' method to get LLM responses.
+        use_llm (bool): If True and no model is given, the shared model of `get_llm()` is used.
+        model: Language model object with an 'invoke' or 'predict' method to get LLM responses.
+        batch (bool): If True, classifies all fields in one JSON response (see `classify_pictograms_batch`)
+                      and only falls back to one call per field if that response is invalid.
+        use_h_codes (bool): If True and the document contains known H-codes, the pictogram fields and the
+                            hazard statements are filled from `H_STATEMENTS` without calling the LLM.
     Behavior:
+        0. Deterministic path: H-codes found (see `hazard_codes_for_pictograms`) -> pictograms from the
+           H-statement table (`pictograms_from_h_codes`) and hazard statements written as "H225 Highly ...".
+           Steps 1-3 only run for documents without H-codes.
         1. Generates a base response from the LLM describing the main risks/measures in the context.
         2. If `field_name` is 'Hazard Statements', updates the `hazard_statements` entry in `to_excel`.
-        3. Iterates over each field in `fields_list` (pictograms/hazard indicators):
-            - Prompts the LLM to check if the risk is explicitly mentioned.
-            - Marks 'X' in `to_excel` if present, otherwise leaves it empty.
+        3. Marks 'X' in `to_excel` for each field in `fields_list` (pictograms/hazard indicators)
+           whose risk is explicitly mentioned, otherwise leaves it empty:
+            - batched: a single prompt for all fields, validated against `fields_list`.
+            - per field (default fallback): one prompt per field.
         4. Updates the original `data_dict` with the new 'to_excel' values for all fields.
     Returns:
         None: Updates `data_dict` in place.
     """
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
 
     update_dict = {}
 
+    # Deterministic path: pictograms and statements from the H-codes of the document
+    h_codes = hazard_codes_for_pictograms(content) if use_h_codes else []
+    if h_codes:
+        flags = pictograms_from_h_codes(h_codes)
+        if field_name == 'Hazard Statements':
+            update_dict["hazard_statements"] = {
+                'content': data_dict["hazard_statements"]["content"],
+                'position': data_dict["hazard_statements"]["position"],
+                'to_excel': "\n".join(f"{code} {H_STATEMENTS[code][0]}" for code in h_codes)
+            }
+        print(f"Pictograms from H-codes {h_codes}:", [field for field, flag in flags.items() if flag], "\n")
+        for field in fields_list:
+            update_dict[field] = {
+                'content': data_dict[field]["content"],
+                'position': data_dict[field]["position"],
+                'to_excel': "X" if flags.get(field) else ""
+            }
+        for field, value in update_dict.items():
+            data_dict[field]['to_excel'] = value['to_excel']
+        return
+
+    # Only the SDS sections mapped to this group of fields
+    content = scope_content(content, EXTRACTOR_SECTIONS.get(field_name))
+
     base_prompt = f"""
     Answer STRICTLY using only the content retrieved from the provided context.
     Do not invent or add external information.
     If the context contains no information relevant to the question, state explicitly that the information is not available.
     """
-    request = f"""
+    request = build_prompt(content, f"""
     Answer the question based only on these instructions: {base_prompt}.
-    What are the main {field_name} risks or measures in the context: {content}?
+    What are the main {field_name} risks or measures in the document (the context)?
     Answer only the explicit values and exclude other precautions.
-    """
+    """)
 
     # Get base response from LLM
     field_response = model.invoke(request).content
@@ -859,14 +1069,26 @@ def fields_with_images(field_name, content, fields_list, data_dict, use_llm=True
 
     print("Base field response:", field_response, "\n")
 
-    # Iterate over each pictogram/hazard field and mark with 'X' if applicable
+    # Single call for all pictogram/hazard fields
+    batch_values = classify_pictograms_batch(field_response, fields_list, data_dict, model) if batch else None
+    if batch_values is not None:
+        for field in fields_list:
+            print(data_dict[field]["content"], batch_values[field])
+            update_dict[field] = {
+                'content': data_dict[field]["content"],
+                'position': data_dict[field]["position"],
+                'to_excel': batch_values[field]
+            }
+        fields_list = []
+
+    # Fallback: iterate over each pictogram/hazard field and mark with 'X' if applicable
     for field in fields_list:
-        request_images = f"""
-        Answer the question based only on this information: {field_response}.
+        request_images = build_prompt(field_response, f"""
+        Answer the question based only on the information in the document above.
         In the provided context, is there a {data_dict[field]["content"]} risk explicitly mentioned?
         Answer only 'X' if True, else '' (empty string).
         For the Serious health hazard risk, answer 'X' only if there is an extreme danger.
-        """
+        """)
 
         to_excel_value = model.predict(request_images)
         print(data_dict[field]["content"], to_excel_value)
@@ -899,14 +1121,7 @@ def candidate_lines(text: str):
         list[str]: A list of cleaned, non-empty lines.
     """
 
-    lines = []
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        line = re.sub(r"^[\-\*\•\u2022]+\s*", "", line).strip()
-        lines.append(line)
-    return lines
+    return list(clean_lines(text))
 
 def matches_any(line: str, patterns):
     """
@@ -922,7 +1137,7 @@ def matches_any(line: str, patterns):
     """
 
     line_lower = line.lower()
-    return any(re.search(p, line_lower) for p in patterns)
+    return any(p.search(line_lower) for p in _compiled_patterns(tuple(patterns)))
 
 def find_support_for_storage(base_summary: str, field_key: str) -> str:
     """
@@ -965,6 +1180,7 @@ def extract_json_block(text: str):
         return match.group(0)
     return text
 
+@traced()
 def storage_fields_with_images(field_name, content, fields_list, data_dict, use_llm=True, model=None):
     print("Entro a Storage")
     """
@@ -987,22 +1203,25 @@ def storage_fields_with_images(field_name, content, fields_list, data_dict, use_
         dict: Updated `data_dict` with populated storage fields.
     """
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
 
     if not isinstance(data_dict, dict):
         raise ValueError("storage_fields_with_images espera un dict (p.ej. updated_json_storage['Sheet_2']).")
 
+    # Only the SDS sections mapped to this group of fields
+    content = scope_content(content, EXTRACTOR_SECTIONS.get(field_name))
+
         # Base summary (LLM)
     base_prompt = """
         Answer STRICTLY using only the content retrieved from the provided context.
         Do not invent or add external information.
         If the context contains no information relevant to the question, state explicitly that the information is not available.
         """
-    request = f"""
+    request = build_prompt(content, f"""
         Answer the question based only on these instructions: {base_prompt}.
-        What are the main {field_name} storage requirements or recommendations in the context: {content}?
+        What are the main {field_name} storage requirements or recommendations in the document (the context)?
         Answer in bullet points, keeping the exact wording from the context whenever possible.
-        """
+        """)
     try:
         base_response = model.invoke(request).content
     except Exception as e:
@@ -1020,11 +1239,9 @@ def storage_fields_with_images(field_name, content, fields_list, data_dict, use_
             data_dict[field].setdefault("to_excel", "")
 
     # Mapping of the 7 fields by LLM
-    mapping_prompt = f"""
-        Based only on this extracted information:
-        {base_response}
-
-        Check which of the following STORAGE requirements are explicitly required or implied.
+    mapping_prompt = build_prompt(base_response, """
+        Based only on the extracted information in the document above,
+        check which of the following STORAGE requirements are explicitly required or implied.
         Mark with 'X' if true, otherwise '' (empty string).
 
         Fields:
@@ -1041,7 +1258,7 @@ def storage_fields_with_images(field_name, content, fields_list, data_dict, use_
         field_name: X
         field_name:
         (one per line; no extra commentary)
-        """
+        """)
     try:
         result = model.invoke(mapping_prompt).content
     except Exception as e:
@@ -1070,9 +1287,8 @@ def storage_fields_with_images(field_name, content, fields_list, data_dict, use_
 
     # Prompt "special_storage_describe" (other measures)
     active_fields = [f for f in STORAGE_FIELDS if data_dict.get(f, {}).get("to_excel") == "X"]
-    other_prompt = f"""
-        You are given this extracted text (context):
-        {base_response}
+    other_prompt = build_prompt(base_response, f"""
+        The document above is extracted text (context).
 
         Task: List ALL explicit storage measures that are NOT any of these categories:
         - flammables cupboard (flammables cabinet/cupboard; ignition sources)
@@ -1095,7 +1311,7 @@ def storage_fields_with_images(field_name, content, fields_list, data_dict, use_
         - "list": concise, actionable phrases; do not include H-codes or P-codes; no generic headings.
         - "paragraph": copy the original text fragment(s) verbatim from the context containing those 'other' storage measures.
         - If there are none, return: {{ "list": [], "paragraph": "" }}.
-        """
+        """)
     try:
         other_raw = model.invoke(other_prompt).content
     except Exception as e:
@@ -1146,6 +1362,9 @@ def update_hazard_group_in_json(data, hazard_letter):
     Returns:
         The updated JSON structure with all 'hazard_group' fields modified.
     """
+    if isinstance(data, TableJSON):
+        data.set_field("hazard_group", hazard_letter)
+        return data
     if isinstance(data, dict):
         for key, value in data.items():
             if key == "hazard_group" and isinstance(value, dict):
@@ -1158,16 +1377,22 @@ def update_hazard_group_in_json(data, hazard_letter):
             update_hazard_group_in_json(item, hazard_letter)
     return data
 
+# Severity priority (A = most severe)
+HAZARD_PRIORITY = ["A", "B", "C", "D", "E", "N"]
+
+# Code -> hazard letter, from the H-statement table (utils.H_STATEMENTS)
+_CODE_TO_LETTER = {code: group for code, (_, _, group) in H_STATEMENTS.items()}
+
+@traced()
 def fill_hazard_group_rag(source_match, json_input, content="") -> Dict[str, Any]:
     """
     Extracts hazard H-codes from a document and assigns a hazard letter (A to N) to all 'hazard_group' fields in a JSON.
     Steps:
     1. Extract all H-codes (e.g., H300, H315) from the text `content`.
-    2. Map each code to a hazard letter using a global `hazard_classification` table.
-       - Fallback classification is provided if not defined globally.
+    2. Map each code to a hazard letter using the H-statement table `H_STATEMENTS` (utils.py).
        - Unknown codes default to letter 'E'.
     3. Determine the most severe hazard letter among all detected codes (priority A > B > C > D > E > N).
-    4. Recursively update the JSON:
+    4. Update the JSON (see `update_hazard_group_in_json`):
        - Each 'hazard_group' dictionary has its 'response' and 'to_excel' set to the selected letter.
     Args:
         json_input (dict): Nested JSON containing hazard fields to update.
@@ -1180,56 +1405,25 @@ def fill_hazard_group_rag(source_match, json_input, content="") -> Dict[str, Any
         - Prints debug information including detected codes, mapped letters, and final letter.
     """
 
-    # Global classification table (fallback if not defined)
-    global hazard_classification
-    if "hazard_classification" not in globals():
-        hazard_classification = {
-            "N": [],
-            "E": ["H303", "H305", "H313", "H316", "H318", "H320", "H333"],
-            "D": ["H302", "H312", "H332", "H315", "H319"],
-            "C": ["H341", "H351", "H361", "H362", "H371", "H373", "H317", "H335", "H336"],
-            "B": ["H301", "H304", "H311", "H331", "H334", "H314", "H318"],
-            "A": ["H300", "H310", "H330", "H340", "H350", "H360", "H370", "H372"]
-        }
-
-    # Severity priority (A = most severe)
-    priority = ["A", "B", "C", "D", "E", "N"]
-
-    # Build code -> letter mapping
-    code_to_letter = {code: letter for letter in priority for code in hazard_classification.get(letter, [])}
-
-    # Extract all H-codes from the text (normalized)
-    h_codes = re.findall(r'H\s*\d{3}', (content or "").upper())
-    h_codes = [c.replace(" ", "") for c in h_codes]
+    # H-codes of the text (normalized), from the cached document analysis
+    h_codes = analyze_document(content or "").h_codes
 
     if not h_codes:
         hazard_letter = "N"
         print(f"No H-codes detected in {source_match}")
     else:
         # Map to letters, unknown codes = "E"
-        detected_letters = {code_to_letter.get(c, "E") for c in h_codes}
+        detected_letters = {_CODE_TO_LETTER.get(c, "E") for c in h_codes}
 
         # Select the most severe
-        hazard_letter = next((letter for letter in priority if letter in detected_letters), "N")
+        hazard_letter = next((letter for letter in HAZARD_PRIORITY if letter in detected_letters), "N")
 
         print(f"H-codes detected in {source_match}: {h_codes}")
         print(f"Letters detected: {detected_letters}")
         print(f"Final hazard letter: {hazard_letter}")
 
-    # Update JSON recursively
-    def _update_hazard_group(node):
-        if isinstance(node, dict):
-            for key, value in node.items():
-                if key == "hazard_group" and isinstance(value, dict):
-                    value["response"] = hazard_letter
-                    value["to_excel"] = hazard_letter
-                else:
-                    _update_hazard_group(value)
-        elif isinstance(node, list):
-            for item in node:
-                _update_hazard_group(item)
-
-    _update_hazard_group(json_input)
+    # Update every 'hazard_group' field (direct writes for compiled templates)
+    update_hazard_group_in_json(json_input, hazard_letter)
     return json_input
 
 
@@ -1274,6 +1468,91 @@ def fill_json_severity_probability(json_input: Dict[str, Any]) -> Dict[str, Any]
 
     return json_input
 
+# Context selector cache
+# (model, document hash, section, selector prompt hash) -> Future with the selected context
+_SELECTOR_CACHE: Dict[tuple, Future] = {}
+_SELECTOR_CACHE_LOCK = threading.Lock()
+_SELECTOR_CACHE_MAX_ENTRIES = 512
+
+
+@traced()
+def select_context(model, prompt_selector: str, section: str, document_text: str) -> str:
+    """
+    Runs the context selector prompt for a (document, section) pair, reusing previous results.
+    Args:
+        model: LLM object with a .predict() method.
+        prompt_selector (str): Selector instructions with a `{section}` placeholder.
+        section (str): Name of the SECTION the context is selected for.
+        document_text (str): Document text, sent first (see prompt_builder.build_prompt).
+    Returns:
+        str: The selected context, stripped.
+    Notes:
+        - The selector does not depend on the field being answered, so its result is shared
+          across fields, tables and repeated runs over the same document.
+        - Concurrent requests for the same key wait for the call already in flight.
+        - Failed calls are not cached; the exception is raised to the caller.
+    """
+    key = (
+        getattr(model, "model_name", None) or type(model).__name__,
+        hashlib.sha256(document_text.encode("utf-8")).hexdigest(),
+        section,
+        hashlib.sha256(prompt_selector.encode("utf-8")).hexdigest(),
+    )
+
+    with _SELECTOR_CACHE_LOCK:
+        future = _SELECTOR_CACHE.get(key)
+        owner = future is None
+        if owner:
+            if len(_SELECTOR_CACHE) >= _SELECTOR_CACHE_MAX_ENTRIES:
+                # Drop the oldest entry (dicts keep insertion order)
+                _SELECTOR_CACHE.pop(next(iter(_SELECTOR_CACHE)))
+            future = Future()
+            _SELECTOR_CACHE[key] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        selector_prompt = build_prompt(document_text, prompt_selector.format(section=section))
+        context = model.predict(selector_prompt).strip()
+    except Exception as e:
+        with _SELECTOR_CACHE_LOCK:
+            _SELECTOR_CACHE.pop(key, None)
+        future.set_exception(e)
+        raise
+    future.set_result(context)
+    return context
+
+
+def clear_selector_cache():
+    """
+    Empties the context selector cache (e.g. after changing the selector prompts or the model).
+    """
+    with _SELECTOR_CACHE_LOCK:
+        _SELECTOR_CACHE.clear()
+
+# Questions of the hazards text fields (the other tables use the 'content' of each field as question)
+HAZARD_TEXT_QUESTIONS = {
+    "physical_form_and_quantity": (
+        "What is the physical form of the substance (gas, liquid, solid) "
+        "and in what packaging or quantity format is it supplied (e.g., bottle 200 ml, bag, sack, cylinder)?"
+    ),
+    "potential_routes_of_exposure": (
+        "What are the possible routes of exposure to the substance for humans? "
+        "(e.g., inhalation, skin contact, eye contact, ingestion)."
+    ),
+    "workplace_exposure_limits": (
+        "What are the Workplace Exposure Limits (WEL), TWA (8h), STEL (15 min), or other exposure thresholds "
+        "provided? Include numeric values and units."
+    ),
+    "arising_harm": (
+        "What are the potential harms or adverse effects associated with exposure to this substance? "
+        "(e.g., toxic effects, respiratory issues, organ damage, skin/eye irritation)."
+    )
+}
+
+
+@traced()
 def extract_hazards_text(source_match, json_input, use_llm=True, model=None, content="", fields_list=None) -> Dict[str, Any]:
     """
     Extracts hazard-related information from an SDS/MSDS document and populates a JSON.
@@ -1288,7 +1567,8 @@ def extract_hazards_text(source_match, json_input, use_llm=True, model=None, con
         source_match (str): Filename or document reference for tracking/logging.
         json_input (dict): JSON structure to populate (must contain 'Sheet_2').
         llm: LLM object with a .predict() method to query.
-        content (str): Full SDS/MSDS document text.
+        content (str): Full SDS/MSDS document text. Only the sections mapped to each field
+                       in `FIELD_SECTIONS` are sent to the context selector.
         fields_list (List[str], optional): Specific fields to extract. Defaults to all hazard fields.
         table_index (int, optional): Index of the table (reserved for future use).
     Returns:
@@ -1304,46 +1584,28 @@ def extract_hazards_text(source_match, json_input, use_llm=True, model=None, con
     max_excel_chars = 300
 
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
 
     if sheet_key not in json_input:
         raise ValueError(f"Sheet key '{sheet_key}' not found in json_input")
 
     # Questions for each field
-    questions = {
-        "physical_form_and_quantity": (
-            "What is the physical form of the substance (gas, liquid, solid) "
-            "and in what packaging or quantity format is it supplied (e.g., bottle 200 ml, bag, sack, cylinder)?"
-        ),
-        "potential_routes_of_exposure": (
-            "What are the possible routes of exposure to the substance for humans? "
-            "(e.g., inhalation, skin contact, eye contact, ingestion)."
-        ),
-        "workplace_exposure_limits": (
-            "What are the Workplace Exposure Limits (WEL), TWA (8h), STEL (15 min), or other exposure thresholds "
-            "provided? Include numeric values and units."
-        ),
-        "arising_harm": (
-            "What are the potential harms or adverse effects associated with exposure to this substance? "
-            "(e.g., toxic effects, respiratory issues, organ damage, skin/eye irritation)."
-        )
-    }
+    questions = HAZARD_TEXT_QUESTIONS
 
     # Context selector prompt
     prompt_selector = (
         "You are an intelligent assistant specialized in analyzing Safety Data Sheets (SDS).\n"
-        "You will be given the full SDS text and a SECTION name.\n"
+        "You are given the SDS text above and a SECTION name.\n"
         "Task: Extract only the sentences and fragments relevant to the SECTION. "
         "If nothing is relevant, return an empty string.\n\n"
         "SECTION: {section}\n\n"
-        "DOCUMENT:\n{fragments}\n\n"
         "Return ONLY the relevant CONTEXT text."
     )
 
     # Final response prompt template
     prompt_template = (
         "You are a precise assistant specialized in Safety Data Sheets.\n"
-        "Answer STRICTLY using only the provided CONTEXT. Do not invent or add external info.\n\n"
+        "Answer STRICTLY using only the CONTEXT (the document above). Do not invent or add external info.\n\n"
         "If the document contains no relevant information, answer: 'The document does not provide this information.'\n\n"
         "At the end of your answer, ALWAYS add a final line:\n"
         "EXCEL_SUMMARY: <short summary or 'no information'>\n\n"
@@ -1351,8 +1613,7 @@ def extract_hazards_text(source_match, json_input, use_llm=True, model=None, con
         " - If no info: EXCEL_SUMMARY: no information\n"
         " - If info exists: concise summary (max 50 words, max 200 chars), in English\n"
         " - Prefer keywords, numbers, hazard codes, short phrases, comma-separated\n\n"
-        "QUESTION: {question}\n\n"
-        "CONTEXT:\n{context}"
+        "QUESTION: {question}"
     )
 
     excel_marker_re = re.compile(r"EXCEL_SUMMARY:\s*(.+)$", re.IGNORECASE | re.MULTILINE)
@@ -1362,22 +1623,20 @@ def extract_hazards_text(source_match, json_input, use_llm=True, model=None, con
         cell = json_input[sheet_key].get(field, {})
         question = questions.get(field, f"Extract the information about {field}.")
 
-        # Step 1: Context selector
-        selector_prompt = prompt_selector.format(
-            section=field,
-            fragments=content
-        )
+        # Step 1: Context selector (only the SDS sections mapped to the field, memoized per document)
         try:
-            context_filtered = model.predict(selector_prompt).strip()
+            context_filtered = select_context(
+                model,
+                prompt_selector,
+                section=field,
+                document_text=scope_content(content, FIELD_SECTIONS.get(field, TABLE_SECTIONS[0]))
+            )
         except Exception as e:
             context_filtered = ""
             print(f"Error in context selector for '{field}': {e}")
 
         # Step 2: Final answer
-        final_prompt = prompt_template.format(
-            question=question,
-            context=context_filtered
-        )
+        final_prompt = build_prompt(context_filtered, prompt_template.format(question=question))
         try:
             full_response = model.predict(final_prompt).strip()
         except Exception as e:
@@ -1408,6 +1667,7 @@ def extract_hazards_text(source_match, json_input, use_llm=True, model=None, con
     return json_input
 
 
+@traced()
 def general_text_extraction (source_match, json_input, use_llm=True, model=None, content="", fields_list=None, table_index=0) -> Dict[str, Any]:
     """
     Performs hierarchical extraction of information from a full SDS/MSDS document.
@@ -1418,7 +1678,8 @@ def general_text_extraction (source_match, json_input, use_llm=True, model=None,
         source_match (str): Document filename or identifier for tracking/logging.
         json_input (Dict[str, Any]): JSON structure to populate (must contain 'Sheet_2').
         llm: LLM object with a .predict() method.
-        content (str): Full text content of the SDS/MSDS document.
+        content (str): Full text content of the SDS/MSDS document. Only the sections mapped to
+                       the table in `TABLE_SECTIONS` are sent to the context selector.
         fields_list (List[str], optional): List of field keys to extract. Defaults to all fields in 'Sheet_2'.
         table_index (int, optional): Index of the table or section for context (default is 0).
     Returns:
@@ -1433,7 +1694,7 @@ def general_text_extraction (source_match, json_input, use_llm=True, model=None,
     """
 
     if model is None and use_llm:
-        model = default_llm
+        model = get_llm()
 
     excel_na_to_excel = "N/A"
     sheet_key = "Sheet_2"
@@ -1442,17 +1703,16 @@ def general_text_extraction (source_match, json_input, use_llm=True, model=None,
     if fields_list is None:
         fields_list = list(json_input[sheet_key].keys())
 
-    # Use full document content
-    full_document_text = content.strip()
+    # Use only the SDS sections mapped to the table (full document if they cannot be found)
+    full_document_text = scope_content(content, TABLE_SECTIONS.get(table_index)).strip()
 
     # Prompts
     prompt_selector = (
         "You are an intelligent assistant specialized in analyzing Safety Data Sheets (SDS).\n"
-        "You will be given a full SDS document and a target SECTION name.\n"
+        "You are given the SDS document above and a target SECTION name.\n"
         "Task: Read the document, understand the whole context, and produce a single coherent CONTEXT text\n"
         "that contains only the information relevant to the SECTION. If there is no relevant information, return an empty string.\n\n"
         "SECTION: {section}\n\n"
-        "DOCUMENT:\n{fragments}\n\n"
         "Return ONLY the CONTEXT text (no JSON, no explanation)."
     )
 
@@ -1486,29 +1746,29 @@ def general_text_extraction (source_match, json_input, use_llm=True, model=None,
         consulta = str(cell.get("content", "") or "").strip()
 
         if not consulta:
-            json_input[sheet_key][campo] = {
+            # Update the record in place: a TableJSON keeps references to it (TableJSON.fields)
+            json_input[sheet_key].setdefault(campo, {}).update({
                 "content": cell.get("content", ""),
                 "position": cell.get("position", ""),
                 "response": "",
                 "to_excel": excel_na_to_excel
-            }
+            })
             continue
 
-        # Step 1: Context selection
-        selector_prompt = prompt_selector.format(
-            section=section_name,
-            fragments=full_document_text
-        )
+        # Step 1: Context selection (same for every field of the table, memoized per document)
         try:
-            context_filtered = model.predict(selector_prompt).strip()
+            context_filtered = select_context(
+                model,
+                prompt_selector,
+                section=section_name,
+                document_text=full_document_text
+            )
         except Exception as e:
             context_filtered = ""
             print(f"Error in context selector for field '{campo}': {e}")
 
         # Step 2: Final response
-        final_prompt = (
-            f"{prompt_template}\n\nQUESTION: {consulta}\n\nCONTEXT:\n{context_filtered}"
-        )
+        final_prompt = build_prompt(context_filtered, f"{prompt_template}\n\nQUESTION: {consulta}")
         try:
             respuesta_completa = model.predict(final_prompt).strip()
         except Exception as e:
@@ -1539,7 +1799,114 @@ def general_text_extraction (source_match, json_input, use_llm=True, model=None,
     return json_input
 
 
+@traced()
+def structured_text_extraction(source_match, json_input, use_llm=True, model=None, content="", fields_list=None,
+                               table_index=0, questions=None, max_repairs=None) -> Dict[str, Any]:
+    """
+    Extracts every text field of one table with a single structured LLM response.
+    Alternative to `general_text_extraction` / `extract_hazards_text` (two calls per field): the model
+    answers all fields at once with a JSON object validated against the schema derived from Sheet_2
+    ('response' + 'to_excel' per field, see structured_output.py).
+    Args:
+        source_match (str): Document filename or identifier for tracking/logging.
+        json_input (Dict[str, Any]): JSON structure to populate (must contain 'Sheet_2').
+        model: Chat model with an .invoke() method.
+        content (str): Full text content of the SDS/MSDS document. Only the sections mapped to the
+                       fields (`FIELD_SECTIONS`) or to the table (`TABLE_SECTIONS`) are sent.
+        fields_list (List[str], optional): Field keys to extract. Defaults to all fields in 'Sheet_2'.
+        table_index (int, optional): Index of the table in `dtr_tables` / `TABLE_SECTIONS`.
+        questions (dict, optional): Field -> question. Defaults to the 'content' of each field.
+        max_repairs (int, optional): Repair requests for invalid fields. Defaults to STRUCTURED_REPAIR_RETRIES.
+    Returns:
+        Dict[str, Any]: Updated JSON with 'response' and 'to_excel' for each field.
+    Notes:
+        - Fields missing, malformed or with a 'to_excel' over the cap are requested again (only those
+          fields) up to `max_repairs` times; what is still invalid afterwards is truncated or set to "N/A".
+        - Fields without a question are set to "N/A" without asking the model, as in general_text_extraction.
+    """
+    if model is None and use_llm:
+        model = get_llm()
+    if max_repairs is None:
+        max_repairs = STRUCTURED_REPAIR_RETRIES
+
+    excel_na_to_excel = "N/A"
+    sheet_key = "Sheet_2"
+    sheet = json_input[sheet_key]
+    if fields_list is None:
+        fields_list = list(sheet.keys())
+    questions = questions or {}
+
+    asked = {}
+    for field in fields_list:
+        cell = sheet.get(field, {})
+        question = questions.get(field) or str(cell.get("content", "") or "").strip()
+        if question:
+            asked[field] = question
+        else:
+            sheet.setdefault(field, {}).update({"content": cell.get("content", ""), "position": cell.get("position", ""),
+                                                "response": "", "to_excel": excel_na_to_excel})
+    if not asked:
+        return json_input
+
+    sections = set()
+    for field in asked:
+        sections.update(FIELD_SECTIONS.get(field, TABLE_SECTIONS.get(table_index) or ()))
+    document_text = scope_content(content, sorted(sections)).strip()
+
+    def request(fields, previous=None, errors=None):
+        fields_text = "\n".join(f"- {field}: {asked[field]}" for field in fields)
+        repair_text = ""
+        if errors:
+            repair_text = (
+                "Your previous answer for these fields was invalid:\n"
+                + "\n".join(f"- {field}: {error}" for field, error in errors.items())
+                + f"\nPrevious answer:\n{json.dumps({f: previous.get(f) for f in fields}, ensure_ascii=False)}\n\n"
+            )
+        instructions = (
+            f"Answer every FIELD of the table '{dtr_tables[table_index]}' STRICTLY using only the document above. "
+            "Do not invent or add external information.\n\n"
+            "For each field:\n"
+            " - \"response\": complete answer; if the document has no relevant information, write "
+            "'The document does not provide this information.'\n"
+            f" - \"to_excel\": summary for a single Excel cell, in English, max 50 words and max {MAX_EXCEL_CHARS} "
+            "characters (keywords, numeric values, hazard codes, comma-separated short phrases, no newlines), "
+            "or exactly 'no information'.\n\n"
+            f"{repair_text}"
+            "Return ONLY a JSON object matching this JSON schema:\n"
+            f"{json.dumps(table_schema(fields), separators=(',', ':'))}\n\n"
+            f"FIELDS:\n{fields_text}"
+        )
+        try:
+            raw = model.invoke(build_prompt(document_text, instructions), response_format={"type": "json_object"}).content
+        except Exception as e:
+            print(f"structured_text_extraction: LLM call failed for {source_match}: {e}")
+            raw = ""
+        return parse_json_object(raw)
+
+    data = request(list(asked))
+    results, errors = validate_fields(data, asked)
+    attempts = 0
+    while errors and attempts < max_repairs:
+        attempts += 1
+        print(f"structured_text_extraction: repairing {sorted(errors)} (attempt {attempts})")
+        data = request(list(errors), previous=data or {}, errors=errors)
+        repaired, errors = validate_fields(data, list(errors))
+        results.update(repaired)
+    results.update(salvage_fields(data, list(errors)))
+
+    for field in asked:
+        value = results.get(field, {"response": "", "to_excel": ""})
+        sheet[field]["response"] = value["response"]
+        sheet[field]["to_excel"] = excel_value(value["to_excel"], excel_na_to_excel)
+        print("-----"*80)
+        print(f"Field: '{field}'")
+        print(f"response: {sheet[field]['response']}")
+        print(f"to_excel: {sheet[field]['to_excel']}")
+    return json_input
+
+
 # Function to fill an Excel with JSON data, applying Arial 12, centered text, and wrap text
+@traced()
 def fill_excel_with_json(jsons_list: list, template_path: str, output_dir: str, source_match: str):
     """
     Fills an Excel template with data from multiple JSON objects and saves it as a new file.
@@ -1559,22 +1926,34 @@ def fill_excel_with_json(jsons_list: list, template_path: str, output_dir: str,
         - All text is written in Arial 12, bold, centered, and wrapped.
         - Column widths are adjusted automatically based on the maximum content length.
         - Output filename format: {source_match}_YYYY-MM-DD_HHMM.xlsx
+        - With EXCEL_FAST_TEMPLATE the template is compiled once per process and each file only
+          patches the sheet XML (see excel_template.py); openpyxl is used if the template is not supported.
     Returns:
         str: Full path of the generated Excel file.
     """
+    datetime_str = datetime.now().strftime("%Y-%m-%d_%H%M")
+    filename = f"{source_match}_{datetime_str}.xlsx"
+    output_path = os.path.join(output_dir, filename)
+
+    if EXCEL_FAST_TEMPLATE:
+        try:
+            excel_bytes = render_excel(jsons_list, template_path, EXCEL_SHEET_NAME)
+            with open(output_path, "wb") as f:
+                f.write(excel_bytes)
+            return str(output_path)
+        except TEMPLATE_ERRORS as e:
+            print(f"Template not supported by excel_template ({type(e).__name__}: {e}); using openpyxl")
+
+    # Imported here: openpyxl (and numpy) are only needed when an Excel is written
+    import openpyxl
+    from openpyxl.styles import Font, Alignment
 
     wb = openpyxl.load_workbook(template_path)
-    ws = wb['COSHH Assessment']
+    ws = wb[EXCEL_SHEET_NAME]
 
     standard_font = Font(name="Arial", size=12, bold=True)
     standard_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
 
-    multi_position_fields = {
-        "likelihood_before_control_measures",
-        "severity",
-        "likelihood_after_control_measures"
-    }
-
     for json_data in jsons_list:
         for field, values in json_data.get("Sheet_2", {}).items():
             position = values.get("position")
@@ -1583,7 +1962,7 @@ def fill_excel_with_json(jsons_list: list, template_path: str, output_dir: str,
             if not position or not to_excel:
                 continue
 
-            if field in multi_position_fields and isinstance(position, list):
+            if field in MULTI_POSITION_FIELDS and isinstance(position, list):
                 for pos in position:
                     cell = ws[pos]
                     cell.value = to_excel
@@ -1595,10 +1974,6 @@ def fill_excel_with_json(jsons_list: list, template_path: str, output_dir: str,
                 cell.font = standard_font
                 cell.alignment = standard_alignment
 
-    datetime_str = datetime.now().strftime("%Y-%m-%d_%H%M")
-    filename = f"{source_match}_{datetime_str}.xlsx"
-    output_path = os.path.join(output_dir, filename)
-
     wb.save(output_path)
     wb.close()
     return str(output_path)
@@ -0,0 +1,97 @@
+# import_budget.py
+# Measures the import time of the project modules and checks it against a budget
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+# Maximum cold import time (milliseconds) of each module, without the interpreter startup
+IMPORT_BUDGETS_MS = {
+    "config": 20,
+    "llm_setup": 50,
+    "functions": 150,
+    "batch_process": 100,
+    "ingest": 1500,
+}
+
+# Packages that must not be loaded just by importing the modules above (they are imported lazily)
+HEAVY_PACKAGES = ("langchain", "langchain_openai", "langchain_community", "chromadb", "openai", "openpyxl", "numpy")
+
+
+def measure_import(module: str, cwd: str) -> Tuple[float, List[str]]:
+    """
+    Imports a module in a fresh interpreter with `-X importtime`.
+    Args:
+        module (str): Module name.
+        cwd (str): Project folder (added to sys.path).
+    Returns:
+        tuple: (cumulative import time of the module in ms, heavy packages loaded by the import).
+    """
+    code = (
+        f"import sys; sys.path.insert(0, {cwd!r}); import {module}; "
+        f"print(','.join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONWARNINGS="ignore"),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    heavy = [p for p in result.stdout.strip().split(",") if p]
+    return cumulative_us / 1000.0, heavy
+
+
+def check_import_budget(budgets: Optional[Dict[str, float]] = None, runs: int = 3, cwd: Optional[str] = None) -> List[dict]:
+    """
+    Measures every module `runs` times (keeping the fastest run) and compares it with its budget.
+    Returns:
+        list: One dict per module with 'module', 'ms', 'budget_ms', 'heavy' and 'ok'.
+    """
+    budgets = budgets or IMPORT_BUDGETS_MS
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for module, budget_ms in budgets.items():
+        measures = [measure_import(module, cwd) for _ in range(max(1, runs))]
+        ms = min(m[0] for m in measures)
+        heavy = measures[0][1]
+        results.append({
+            "module": module,
+            "ms": round(ms, 1),
+            "budget_ms": budget_ms,
+            "heavy": heavy,
+            "ok": ms <= budget_ms,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the project modules against a budget.")
+    parser.add_argument("--runs", type=int, default=3, help="Imports per module (the fastest one is kept).")
+    parser.add_argument("--modules", nargs="*", help="Only check these modules.")
+    args = parser.parse_args(argv)
+
+    budgets = IMPORT_BUDGETS_MS
+    if args.modules:
+        budgets = {m: IMPORT_BUDGETS_MS.get(m, float("inf")) for m in args.modules}
+
+    results = check_import_budget(budgets, runs=args.runs)
+    for r in results:
+        status = "OK  " if r["ok"] else "OVER"
+        heavy = f"  (loads {', '.join(r['heavy'])})" if r["heavy"] else ""
+        print(f"{status} {r['module']:<15} {r['ms']:>8.1f} ms / {r['budget_ms']} ms{heavy}")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,244 @@
+# ingest.py
+# Incremental ingestion of the markdown SDS documents into the Chroma vector database
+import os
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+from datetime import datetime
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config import (
+    folder_documents, DB_Chroma,
+    INGEST_MANIFEST_PATH, INGEST_CHUNK_SIZE, INGEST_CHUNK_OVERLAP, INGEST_BATCH_SIZE,
+)
+from source_catalog import get_source_catalog
+
+MANIFEST_VERSION = 1
+
+
+# ============================
+# Manifest
+# ============================
+def file_fingerprint(path: str) -> str:
+    """
+    Returns the SHA-256 of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Reads the ingestion manifest (an empty manifest if it does not exist yet).
+    """
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"version": MANIFEST_VERSION, "settings": {}, "sources": {}}
+
+
+def save_manifest(manifest: dict, manifest_path: str) -> None:
+    """
+    Writes the manifest atomically, so an interrupted run never leaves a truncated file.
+    """
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
+# ============================
+# Documentos y chunks
+# ============================
+def load_markdown_document(input_dir: str, filename: str) -> Document:
+    """
+    Loads a markdown file as a LangChain Document with its file name as 'source'.
+    """
+    with open(os.path.join(input_dir, filename), "r", encoding="utf-8") as f:
+        text = f.read()
+    return Document(page_content=text, metadata={"source": filename})
+
+
+def split_into_token_chunks(docs: List[Document], chunk_size: int = INGEST_CHUNK_SIZE,
+                            chunk_overlap: int = INGEST_CHUNK_OVERLAP) -> List[Document]:
+    """
+    Splits documents into chunks (same splitter as the Create_RAG notebook).
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True,
+    )
+    return splitter.split_documents(docs)
+
+
+def delete_source_chunks(db, source: str) -> int:
+    """
+    Deletes every chunk of a source from the collection and returns how many were deleted.
+    Works for chunks added by this module and by the notebook (random ids).
+    """
+    ids = db.get(where={"source": source}, include=[]).get("ids", [])
+    if ids:
+        db.delete(ids=ids)
+    return len(ids)
+
+
+# ============================
+# Ingesta incremental
+# ============================
+def run_ingestion(db, input_dir: str = folder_documents, manifest_path: str = INGEST_MANIFEST_PATH,
+                  chunk_size: int = INGEST_CHUNK_SIZE, chunk_overlap: int = INGEST_CHUNK_OVERLAP,
+                  batch_size: int = INGEST_BATCH_SIZE, embedding_model: Optional[str] = None,
+                  adopt_existing: bool = False, dry_run: bool = False) -> dict:
+    """
+    Synchronizes the Chroma collection with the markdown documents of a folder.
+    Args:
+        db: Chroma database instance (with its embedding function).
+        input_dir (str): Folder with the SDS markdown documents.
+        manifest_path (str): JSON manifest with the fingerprint of every ingested document.
+        chunk_size (int): Characters per chunk.
+        chunk_overlap (int): Characters shared by consecutive chunks.
+        batch_size (int): Chunks embedded and added per request.
+        embedding_model (str, optional): Name of the embedding model, stored in the manifest.
+        adopt_existing (bool): If True, documents without a manifest entry that are already in the
+                               collection (e.g. built with the Create_RAG notebook) are recorded as
+                               ingested instead of being embedded again.
+        dry_run (bool): If True, only reports what would change.
+    Returns:
+        dict: Summary with the added, updated, removed and unchanged sources and the chunk counts.
+    Notes:
+        - A document is re-embedded only if its SHA-256 changed; size and modification time are
+          checked first so unchanged files are not even hashed.
+        - Chunks of changed or removed documents are deleted before the new ones are added.
+          New chunks get deterministic ids ("<sha256(name, sha256)[:16]>-<n>"), so byte-identical files
+          under different names never share ids.
+        - Changing the chunking settings or the embedding model re-ingests every document.
+        - The manifest is saved after every document, so an interrupted run resumes where it stopped
+          (with a NumpyVectorStore, the whole run is written at the end and resumes from the start).
+    """
+    started = time.time()
+    manifest = load_manifest(manifest_path)
+    settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "embedding_model": embedding_model}
+    if manifest.get("settings") and manifest["settings"] != settings:
+        print(f"Ingestion settings changed {manifest['settings']} -> {settings}: every document is re-ingested")
+        manifest["sources"] = {}
+    manifest["version"] = MANIFEST_VERSION
+    manifest["settings"] = settings
+    entries: Dict[str, dict] = manifest.setdefault("sources", {})
+
+    filenames = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(".md"))
+    existing = set()
+    if adopt_existing:
+        existing = set(get_source_catalog(db, refresh=True).sources)
+
+    summary = {"added": [], "updated": [], "removed": [], "unchanged": 0, "adopted": [],
+               "chunks_added": 0, "chunks_deleted": 0}
+
+    # A store with `bulk_write` (NumpyVectorStore) rewrites its matrix on every write: the run is written
+    # once at the end, and the manifest is only saved then, so it never lists chunks that were not written
+    bulk_write = getattr(db, "bulk_write", None)
+    deferred = bulk_write is not None and not dry_run
+
+    def checkpoint():
+        if not deferred:
+            save_manifest(manifest, manifest_path)
+
+    with bulk_write() if deferred else contextlib.nullcontext():
+        # Removed documents
+        for source in sorted(set(entries) - set(filenames)):
+            if not dry_run:
+                summary["chunks_deleted"] += delete_source_chunks(db, source)
+                del entries[source]
+                checkpoint()
+            summary["removed"].append(source)
+
+        # New and changed documents
+        for filename in filenames:
+            path = os.path.join(input_dir, filename)
+            stat = os.stat(path)
+            entry = entries.get(filename)
+            if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+                summary["unchanged"] += 1
+                continue
+
+            sha256 = file_fingerprint(path)
+            if entry and entry.get("sha256") == sha256:
+                # Touched but identical: only refresh the stat information
+                entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+                summary["unchanged"] += 1
+                if not dry_run:
+                    checkpoint()
+                continue
+
+            record = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime}
+            if entry is None and filename in existing:
+                summary["adopted"].append(filename)
+                if not dry_run:
+                    entries[filename] = dict(record, chunks=None, ingested_at=datetime.now().isoformat(timespec="seconds"))
+                    checkpoint()
+                continue
+
+            summary["updated" if entry else "added"].append(filename)
+            if dry_run:
+                continue
+
+            chunks = split_into_token_chunks([load_markdown_document(input_dir, filename)], chunk_size, chunk_overlap)
+            summary["chunks_deleted"] += delete_source_chunks(db, filename)
+            prefix = hashlib.sha256(f"{filename}\0{sha256}".encode("utf-8")).hexdigest()[:16]
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                db.add_documents(batch, ids=[f"{prefix}-{start + i}" for i in range(len(batch))])
+            summary["chunks_added"] += len(chunks)
+
+            entries[filename] = dict(record, chunks=len(chunks), ingested_at=datetime.now().isoformat(timespec="seconds"))
+            checkpoint()
+            print(f"Ingested {filename}: {len(chunks)} chunks")
+
+    if not dry_run:
+        save_manifest(manifest, manifest_path)
+    summary["elapsed_s"] = round(time.time() - started, 3)
+    print(
+        f"Ingestion finished: {len(summary['added'])} added, {len(summary['updated'])} updated, "
+        f"{len(summary['removed'])} removed, {summary['unchanged']} unchanged, {len(summary['adopted'])} adopted "
+        f"({summary['chunks_added']} chunks added, {summary['chunks_deleted']} deleted) in {summary['elapsed_s']} s"
+    )
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally ingest the SDS markdown documents into Chroma.")
+    parser.add_argument("--input", default=folder_documents, help="Folder with the SDS markdown documents.")
+    parser.add_argument("--db", default=DB_Chroma, help="Chroma persist directory.")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH, help="JSON manifest of the ingested documents.")
+    parser.add_argument("--adopt-existing", action="store_true",
+                        help="Record documents already in the collection without embedding them again.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+    args = parser.parse_args(argv)
+
+    # Imported here so that `--help` does not initialize the OpenAI clients
+    from llm_setup import init_embeddings, load_chroma_db
+
+    embeddings = init_embeddings()
+    db = load_chroma_db(embeddings, args.db)
+    run_ingestion(
+        db,
+        input_dir=args.input,
+        manifest_path=args.manifest,
+        embedding_model=getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None),
+        adopt_existing=args.adopt_existing,
+        dry_run=args.dry_run,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+# jobs.py
+# Background execution of process_document with per-stage progress, shared by every app session
+import copy
+import time
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from config import JOB_WORKERS, JOB_RETENTION_S
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_key(source_match: str, content: str) -> str:
+    """
+    Identifies the work of a job (document name + content), used to reattach instead of resubmitting.
+    """
+    digest = hashlib.sha256((content or "").encode("utf-8")).hexdigest()[:16]
+    return f"{source_match}:{digest}"
+
+
+class Job:
+    """
+    State of a background run of process_document.
+    Attributes:
+        id (str): Job identifier.
+        key (str): Work identifier (see `job_key`).
+        source_match (str): Document being processed.
+        status (str): "queued", "running", "done" or "failed".
+        steps (list): One dict per started step: {"step", "started_at", "finished_at"}.
+        stages_done (int) / stages_total (int): Progress of the parallel extraction stages.
+        partial (dict): Copy of every table JSON already completed, keyed by table name.
+        result (tuple): (updated JSONs, Excel path) once done.
+        error (str): Error message if failed.
+    Notes:
+        - Every attribute is updated under the job lock; readers should use `snapshot()`.
+    """
+
+    def __init__(self, source_match: str, key: str, total_steps: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.source_match = source_match
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.total_steps = total_steps
+        self.steps: List[dict] = []
+        self.stages_done = 0
+        self.stages_total = 0
+        self.partial: Dict[str, dict] = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self._step_fraction = 0.0
+        self._lock = threading.Lock()
+
+    def handle_event(self, event: dict) -> None:
+        """
+        Updates the job with an event of process_document (see its `on_event` argument).
+        """
+        now = time.time()
+        with self._lock:
+            kind = event.get("type")
+            if kind == "step":
+                if self.steps and self.steps[-1]["finished_at"] is None:
+                    self.steps[-1]["finished_at"] = now
+                self.total_steps = event.get("total", self.total_steps)
+                self.steps.append({"step": event["step"], "index": event.get("index", len(self.steps)),
+                                   "started_at": now, "finished_at": None})
+                self._step_fraction = 0.0
+            elif kind == "stage":
+                self.stages_done = event.get("done", self.stages_done + 1)
+                self.stages_total = event.get("total", self.stages_total)
+                if self.stages_total:
+                    self._step_fraction = self.stages_done / self.stages_total
+            elif kind == "partial":
+                self.partial[event["table"]] = event["data"]
+
+    def _finish(self, status: str, result=None, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            if self.steps and self.steps[-1]["finished_at"] is None:
+                self.steps[-1]["finished_at"] = now
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = now
+
+    def progress(self) -> float:
+        """
+        Fraction of the work done (0-1). Must be called with the lock held.
+        """
+        if self.status == DONE:
+            return 1.0
+        if not self.steps or not self.total_steps:
+            return 0.0
+        return min(1.0, (self.steps[-1]["index"] + self._step_fraction) / self.total_steps)
+
+    def snapshot(self) -> dict:
+        """
+        Returns a consistent copy of the job state for the UI.
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                "id": self.id,
+                "source_match": self.source_match,
+                "status": self.status,
+                "progress": self.progress(),
+                "current_step": self.steps[-1]["step"] if self.steps and self.status == RUNNING else None,
+                "steps": [
+                    dict(s, elapsed_s=round((s["finished_at"] or now) - s["started_at"], 2)) for s in self.steps
+                ],
+                "stages_done": self.stages_done,
+                "stages_total": self.stages_total,
+                "partial": copy.deepcopy(self.partial),
+                "elapsed_s": round((self.finished_at or now) - (self.started_at or now), 2),
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs process_document jobs on a bounded thread pool and keeps their state in memory.
+    Args:
+        max_workers (int): Documents processed at the same time.
+        retention_s (float): Seconds a finished job is kept before being discarded.
+        runner (Callable, optional): Function with the signature of process_document (for tests).
+    Notes:
+        - A queued or running job with the same key (document + content) is reused, so a second click
+          or another session reattaches to it instead of processing the document twice.
+        - Finished jobs are kept `retention_s` seconds, so a session can still read their result.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, retention_s: float = JOB_RETENTION_S,
+                 runner: Optional[Callable[..., Any]] = None):
+        self.max_workers = max(1, int(max_workers))
+        self.retention_s = retention_s
+        self._runner = runner
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _prune(self) -> None:
+        """
+        Discards the jobs finished more than `retention_s` seconds ago. Must be called with the lock held.
+        """
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.finished_at is not None and now - j.finished_at > self.retention_s]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id) if job_id else None
+
+    def submit(self, source_match: str, content: str, force: bool = False, **kwargs: Any) -> Job:
+        """
+        Starts processing a document in the background, or reattaches to an equivalent job.
+        Args:
+            source_match (str): File name of the document.
+            content (str): Content of the document.
+            force (bool): If True, starts a new job even if an equivalent one is running.
+            **kwargs: Extra arguments for process_document (max_workers, output_dir).
+        Returns:
+            Job: The new or reattached job.
+        """
+        from functions import process_document, PIPELINE_STEPS
+
+        key = job_key(source_match, content)
+        with self._lock:
+            self._prune()
+            if not force:
+                for job in sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True):
+                    if job.key == key and job.status in (QUEUED, RUNNING):
+                        return job
+            job = Job(source_match, key, len(PIPELINE_STEPS))
+            self._jobs[job.id] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sds-job")
+            executor = self._executor
+
+        runner = self._runner or process_document
+        executor.submit(self._run, job, runner, content, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job: Job, runner: Callable[..., Any], content: str, kwargs: dict) -> None:
+        with job._lock:
+            job.status = RUNNING
+            job.started_at = time.time()
+        try:
+            result = runner(job.source_match, content, on_event=job.handle_event, **kwargs)
+            job._finish(DONE, result=result)
+        except Exception as e:
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}")
+
+    def jobs(self) -> List[dict]:
+        """
+        Returns a snapshot of every job kept in memory, newest first.
+        """
+        with self._lock:
+            self._prune()
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return [job.snapshot() for job in jobs]
+
+
+_MANAGER: Optional[JobManager] = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the job manager shared by every session of the app process.
+    """
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = JobManager()
+    return _MANAGER
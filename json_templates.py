@@ -0,0 +1,126 @@
+# json_templates.py
+# Table JSON templates (config.JSON_PATHS) compiled once per process, with direct access to their fields
+import os
+import json
+import pickle
+import threading
+from typing import Any, Dict, List, Tuple
+from config import JSON_PATHS
+
+_CACHE: Dict[tuple, "CompiledTemplates"] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class TableJSON(dict):
+    """
+    Table JSON of one document: a plain dict with the shape of the template file, plus
+    direct references to its field records.
+    Attributes:
+        fields (dict): Field name -> list of the record dicts ({"content", "position", "response",
+                       "to_excel"}) stored under that name anywhere in the JSON.
+    Notes:
+        - It serializes (json.dumps), copies and compares exactly like the dict it wraps.
+    """
+
+    __slots__ = ("fields",)
+
+    def set_field(self, name: str, value: Any) -> int:
+        """
+        Sets 'response' and 'to_excel' of every record called `name`; returns how many were updated.
+        """
+        records = self.fields.get(name, ())
+        for record in records:
+            record["response"] = value
+            record["to_excel"] = value
+        return len(records)
+
+
+def _field_paths(node: Any, path: tuple = ()) -> List[Tuple[str, tuple]]:
+    """
+    Returns (field name, path) for every field record (a dict with "response" or "to_excel") stored
+    under a key, at any depth. Containers such as "Sheet_2" are searched but not indexed.
+    """
+    paths = []
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if isinstance(value, dict) and ("response" in value or "to_excel" in value):
+                paths.append((key, path + (key,)))
+            paths.extend(_field_paths(value, path + (key,)))
+    elif isinstance(node, list):
+        for index, item in enumerate(node):
+            paths.extend(_field_paths(item, path + (index,)))
+    return paths
+
+
+class TableTemplate:
+    """
+    One compiled table template.
+    Attributes:
+        name (str): Key in JSON_PATHS (e.g. "hazards").
+        paths (tuple): (field name, path) of every field record, found once at compile time.
+    """
+
+    __slots__ = ("name", "paths", "_blob")
+
+    def __init__(self, name: str, data: dict):
+        self.name = name
+        self.paths = tuple(_field_paths(data))
+        self._blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def new(self) -> TableJSON:
+        """
+        Returns a fresh, independent copy of the template with its field index resolved.
+        """
+        table = TableJSON(pickle.loads(self._blob))
+        fields: Dict[str, list] = {}
+        for name, path in self.paths:
+            node = table
+            for key in path:
+                node = node[key]
+            fields.setdefault(name, []).append(node)
+        table.fields = fields
+        return table
+
+
+class CompiledTemplates:
+    """
+    The table templates of JSON_PATHS, parsed once.
+    Args:
+        json_paths (dict): Table key -> path of the template JSON.
+    """
+
+    def __init__(self, json_paths: Dict[str, str]):
+        self.tables: Dict[str, TableTemplate] = {}
+        for key, path in json_paths.items():
+            with open(path, "r", encoding="utf-8") as f:
+                self.tables[key] = TableTemplate(key, json.load(f))
+
+    def new_document(self) -> Dict[str, TableJSON]:
+        """
+        Returns fresh table JSONs for one document, keyed like JSON_PATHS.
+        """
+        return {key: template.new() for key, template in self.tables.items()}
+
+
+def get_templates(json_paths: Dict[str, str] = JSON_PATHS) -> CompiledTemplates:
+    """
+    Returns the compiled templates, cached per process and recompiled when a template file changes
+    (the check costs one stat per file).
+    """
+    stats = {name: os.stat(path) for name, path in json_paths.items()}
+    key = tuple((name, path, stats[name].st_mtime_ns, stats[name].st_size) for name, path in json_paths.items())
+    with _CACHE_LOCK:
+        compiled = _CACHE.get(key)
+    if compiled is None:
+        compiled = CompiledTemplates(json_paths)
+        with _CACHE_LOCK:
+            _CACHE.clear()
+            _CACHE[key] = compiled
+    return compiled
+
+
+def new_document_tables(json_paths: Dict[str, str] = JSON_PATHS) -> Dict[str, TableJSON]:
+    """
+    Fresh table JSONs for one document (replaces reading the six JSON_PATHS files per document).
+    """
+    return get_templates(json_paths).new_document()
@@ -0,0 +1,172 @@
+# llm_cache.py
+# Persistent, content-addressed cache for LLM responses (SQLite)
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumpd, load
+from telemetry import record
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Disk-backed cache for LangChain chat models and LLMs.
+    Responses are stored under a SHA-256 key of the model configuration (`llm_string`, which
+    contains the model name and its parameters such as temperature) and the prompt, so the
+    same prompt sent to the same model with the same parameters is only paid once.
+    Args:
+        db_path (str): Path of the SQLite file.
+        max_entries (int): Maximum number of stored responses. The least recently used
+                           entries are evicted when the limit is exceeded.
+        max_age_days (float): Entries older than this are treated as misses and evicted.
+                              0 or None disables age-based eviction.
+        evict_every (int): Number of inserts between eviction passes.
+    Usage:
+        llm = ChatOpenAI(..., cache=SQLiteLLMCache("./cache/llm_cache.sqlite"))
+        Works transparently for .invoke(), .predict() and batch calls of the model.
+    Notes:
+        - The file can be shared by several processes (WAL journal mode).
+        - Hit/miss counters are kept per instance, see `stats()`.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 50000, max_age_days: Optional[float] = 30, evict_every: int = 100):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.evict_every = max(1, evict_every)
+
+        self._lock = threading.Lock()
+        self._inserts_since_eviction = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    llm_hash TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+            self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        """
+        Content address of a (model configuration, prompt) pair.
+        """
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """
+        Returns the cached generations for the prompt, or None on a miss.
+        """
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds and now - row[0] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        record(llm_cache_hits=1)
+
+        try:
+            return [load(generation) for generation in json.loads(row[1])]
+        except Exception as e:
+            print(f"LLM cache: could not deserialize entry {key[:12]}: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """
+        Stores the generations returned by the model for the prompt.
+        """
+        key = self._key(prompt, llm_string)
+        llm_hash = hashlib.sha256(llm_string.encode("utf-8")).hexdigest()
+        value = json.dumps([dumpd(generation) for generation in return_val])
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, llm_hash, created_at, last_access, size, value) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, llm_hash, now, now, len(value), value)
+            )
+            self._inserts_since_eviction += 1
+            if self._inserts_since_eviction >= self.evict_every:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """
+        Removes expired entries and the least recently used ones above `max_entries`.
+        Must be called with the lock held.
+        """
+        self._inserts_since_eviction = 0
+        if self.max_age_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def evict(self) -> None:
+        """
+        Runs an eviction pass immediately.
+        """
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        """
+        Deletes every cached response and resets the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns hit/miss counters and the current size of the cache.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "size_bytes": size,
+            }
+
@@ -1,21 +1,51 @@
 # llm_setup.py
+# Model, embeddings and vector database setup. Every object is created lazily, on first use,
+# and shared by the whole process (Streamlit sessions, scheduler threads, batch workers).
 import os
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.chat_models import ChatOpenAI
-from langchain.vectorstores import Chroma
-from config import DB_Chroma, API_KEY
+import threading
+from config import (
+    DB_Chroma, DB_Numpy, API_KEY, VECTOR_STORE, NUMPY_STORE_DTYPE,
+    EMBEDDINGS_CACHE_ENABLED, EMBEDDINGS_CACHE_PATH, EMBEDDINGS_CACHE_MEMORY_SIZE, EMBEDDINGS_CASEFOLD_QUERIES,
+    LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS,
+    LLM_CASSETTE_MODE, LLM_CASSETTE_PATH, LLM_CASSETTE_LATENCY,
+    RATE_LIMIT_STATE_PATH, CHAT_RPM, CHAT_TPM, EMBEDDINGS_RPM, EMBEDDINGS_TPM, LLM_TIMEOUT, LLM_MAX_RETRIES,
+)
+
+# LangChain, Chroma and the OpenAI client are imported inside the init functions: importing this
+# module (or functions.py) must not pay for them until a model or the database is actually needed.
 
 # ============================
 # Función para inicializar embeddings
 # ============================
-def init_embeddings(api_key: str = API_KEY):
+def init_embeddings(api_key: str = API_KEY, cached: bool = EMBEDDINGS_CACHE_ENABLED):
     """
     Inicializa el embedding model compatible con GPT-4.
+    Las peticiones respetan el presupuesto RPM/TPM compartido de embeddings.
+    Si `cached` es True, los vectores se guardan en memoria (LRU) y en disco, de modo que
+    las búsquedas repetidas no hacen peticiones a la API.
     """
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        api_key=api_key
+    from embedding_cache import CachedEmbeddings
+    from rate_limiter import TokenBucketRateLimiter, RateLimitedOpenAIEmbeddings
+
+    model_name = "text-embedding-3-large"
+    embeddings = RateLimitedOpenAIEmbeddings(
+        model=model_name,
+        api_key=api_key,
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        request_limiter=TokenBucketRateLimiter(
+            "embeddings:text-embedding-3-large", EMBEDDINGS_RPM, EMBEDDINGS_TPM, RATE_LIMIT_STATE_PATH
+        ),
+        backoff_retries=LLM_MAX_RETRIES
     )
+    if cached:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model_name=model_name,
+            db_path=EMBEDDINGS_CACHE_PATH,
+            memory_size=EMBEDDINGS_CACHE_MEMORY_SIZE,
+            casefold_queries=EMBEDDINGS_CASEFOLD_QUERIES
+        )
     return embeddings
 
 
@@ -26,6 +56,8 @@ def load_chroma_db(embeddings, db_path: str = DB_Chroma):
     """
     Inicializa o carga la base de datos Chroma.
     """
+    from langchain.vectorstores import Chroma
+
     # Crear carpeta si no existe
     if not os.path.exists(db_path):
         os.makedirs(db_path)
@@ -37,27 +69,165 @@ def load_chroma_db(embeddings, db_path: str = DB_Chroma):
     return db
 
 
+# ============================
+# Función para cargar la base de datos vectorial NumPy (mmap)
+# ============================
+def load_numpy_db(embeddings, db_path: str = DB_Numpy, dtype: str = NUMPY_STORE_DTYPE):
+    """
+    Carga la base de datos vectorial NumPy (alternativa a Chroma, ver numpy_store.py).
+    Para crearla a partir de Chroma_DB sin recalcular embeddings: numpy_store.export_chroma(...).
+    """
+    from numpy_store import NumpyVectorStore
+
+    return NumpyVectorStore(db_path, embeddings, dtype)
+
+
+def load_vector_db(embeddings, store: str = VECTOR_STORE):
+    """
+    Carga la base de datos vectorial configurada en VECTOR_STORE ("chroma" o "numpy").
+    """
+    if store == "numpy":
+        return load_numpy_db(embeddings)
+    return load_chroma_db(embeddings)
+
+
+# ============================
+# Función para inicializar la caché del LLM
+# ============================
+def init_llm_cache(db_path: str = LLM_CACHE_PATH):
+    """
+    Inicializa la caché persistente (SQLite) de respuestas del LLM.
+    """
+    from llm_cache import SQLiteLLMCache
+
+    return SQLiteLLMCache(
+        db_path,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        max_age_days=LLM_CACHE_MAX_AGE_DAYS
+    )
+
+
 # ============================
 # Función para inicializar LLM
 # ============================
-def init_llm(api_key: str = API_KEY):
+def init_llm(api_key: str = API_KEY, cache=None):
     """
     Inicializa el modelo GPT-4o-mini para respuestas de LLM.
+    Si se pasa `cache`, las respuestas se reutilizan en .invoke() y .predict()
+    mientras no cambien el prompt, el modelo ni sus parámetros.
+    Las peticiones respetan el presupuesto RPM/TPM compartido y se reintentan con backoff aleatorio.
     """
-    llm = ChatOpenAI(
+    from rate_limiter import TokenBucketRateLimiter, RateLimitedChatOpenAI
+
+    llm = RateLimitedChatOpenAI(
         model="gpt-4o-mini",
         temperature=0,
         max_tokens=None,
-        timeout=None,
-        max_retries=2,
-        api_key=api_key
+        timeout=LLM_TIMEOUT,
+        max_retries=0,
+        api_key=api_key,
+        cache=cache,
+        request_limiter=TokenBucketRateLimiter("chat:gpt-4o-mini", CHAT_RPM, CHAT_TPM, RATE_LIMIT_STATE_PATH),
+        backoff_retries=LLM_MAX_RETRIES
     )
     return llm
 
 
 # ============================
-# Inicialización por defecto
+# Función para grabar / reproducir las llamadas del LLM
+# ============================
+def init_cassette_llm(mode: str = LLM_CASSETTE_MODE, path: str = LLM_CASSETTE_PATH,
+                      replay_latency: str = LLM_CASSETTE_LATENCY):
+    """
+    Inicializa el modelo con cassette (ver cassette.py): en "record" hace las llamadas reales y
+    guarda cada prompt/respuesta; en "replay" sirve las respuestas grabadas sin usar la API.
+    La caché del LLM no se usa en ninguno de los dos modos.
+    """
+    from cassette import Cassette, CassetteChatModel
+
+    inner = init_llm() if mode == "record" else None
+    return CassetteChatModel(
+        cassette=Cassette(path, mode),
+        inner=inner,
+        replay_latency=replay_latency,
+        model_name=getattr(inner, "model_name", "cassette"),
+        cache=False
+    )
+
+
 # ============================
-embeddings = init_embeddings()
-db = load_chroma_db(embeddings)
-llm = init_llm()
+# Instancias compartidas (inicialización perezosa)
+# ============================
+_INSTANCES = {}
+_LOCK = threading.RLock()
+
+
+def _shared(name: str, factory):
+    """
+    Returns the process-wide instance `name`, creating it with `factory()` the first time.
+    Thread-safe: concurrent first calls create the object only once. The lock is re-entrant
+    because some factories depend on other shared instances (e.g. the database on the embeddings).
+    """
+    instance = _INSTANCES.get(name)
+    if instance is None:
+        with _LOCK:
+            instance = _INSTANCES.get(name)
+            if instance is None:
+                instance = factory()
+                _INSTANCES[name] = instance
+    return instance
+
+
+def get_embeddings():
+    """
+    Embeddings model shared by the whole process (see init_embeddings).
+    """
+    return _shared("embeddings", init_embeddings)
+
+
+def get_db():
+    """
+    Vector database shared by the whole process (see load_vector_db).
+    """
+    return _shared("db", lambda: load_vector_db(get_embeddings()))
+
+
+def get_llm_cache():
+    """
+    Persistent LLM response cache shared by the whole process, or None if LLM_CACHE_ENABLED is False.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    return _shared("llm_cache", init_llm_cache)
+
+
+def get_llm():
+    """
+    Chat model shared by the whole process (see init_llm), or the cassette model when
+    LLM_CASSETTE_MODE is "record" or "replay" (see init_cassette_llm).
+    """
+    if LLM_CASSETTE_MODE != "off":
+        return _shared("llm", init_cassette_llm)
+    return _shared("llm", lambda: init_llm(cache=get_llm_cache()))
+
+
+def set_shared(name: str, instance) -> None:
+    """
+    Replaces a shared instance ("embeddings", "db", "llm_cache" or "llm"), e.g. with a fake model
+    in tests and benchmarks. Passing None drops it, so the next access creates it again.
+    """
+    with _LOCK:
+        if instance is None:
+            _INSTANCES.pop(name, None)
+        else:
+            _INSTANCES[name] = instance
+
+
+_ACCESSORS = {"embeddings": get_embeddings, "db": get_db, "llm_cache": get_llm_cache, "llm": get_llm}
+
+
+def __getattr__(name):
+    # Backwards compatibility: `from llm_setup import llm, db` keeps working and creates the object on demand
+    if name in _ACCESSORS:
+        return _ACCESSORS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,153 @@
+# name_index.py
+# In-memory lexical / fuzzy index of product names and document IDs (from the SDS file names)
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from source_catalog import get_source_catalog, collection_key
+
+# Minimum score of a confident match and minimum lead over the second best product
+MIN_SCORE = 0.6
+MIN_MARGIN = 0.1
+
+# "CO-028674", "co 028674", "028674" (optionally followed by "-DS-1")
+_DOC_ID_RE = re.compile(r"(?:\bco[\s\-_]*)?\b(\d{6})\b", re.IGNORECASE)
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text: str) -> str:
+    """
+    Lowercases a name and replaces punctuation, hyphens and underscores by single spaces.
+    """
+    return _NON_ALNUM_RE.sub(" ", (text or "").lower()).strip()
+
+
+def trigrams(text: str) -> set:
+    """
+    Character trigrams of a normalized name, spaces removed and padded at both ends.
+    """
+    compact = text.replace(" ", "")
+    if not compact:
+        return set()
+    padded = f"  {compact} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Index of the SDS documents by product name and document ID, built from the file names
+    ("CO-028674-DS-1-Acetone-Cleaner.md": ID = first 14 characters, product = the rest without extension,
+    as in `get_document_id` / `get_product_name`).
+    Args:
+        sources (Iterable[str]): File names of the documents (e.g. the Chroma source catalog).
+    Notes:
+        - Scores are in [0, 1]: 1 for an exact document ID or product name, ~0.85-1 when every word of
+          the query appears in the product name or the name starts with the query, otherwise the Dice coefficient of the character trigrams.
+        - Only products sharing at least one trigram with the query are scored (inverted index).
+    """
+
+    def __init__(self, sources: Iterable[str]):
+        self.entries: List[dict] = []
+        self._by_trigram: Dict[str, set] = {}
+        self._by_number: Dict[str, List[int]] = {}
+
+        for source in sorted(set(s for s in sources if s)):
+            stem = source[:-3] if source.lower().endswith(".md") else source
+            product = normalize_name(stem[15:]) if len(stem) > 15 else normalize_name(stem)
+            entry = {
+                "source": source,
+                "doc_id": stem[:14],
+                "product": product,
+                "tokens": set(product.split()),
+                "trigrams": trigrams(product),
+            }
+            position = len(self.entries)
+            self.entries.append(entry)
+            for gram in entry["trigrams"]:
+                self._by_trigram.setdefault(gram, set()).add(position)
+            number = _DOC_ID_RE.search(stem[:14])
+            if number:
+                self._by_number.setdefault(number.group(1), []).append(position)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        Returns the best matching documents for a query.
+        Args:
+            query (str): Product name, part of it, or a document ID (e.g. "WD 40", "CO-028674").
+            limit (int): Maximum number of results.
+        Returns:
+            list: (source, score) pairs sorted by decreasing score.
+        """
+        scores: Dict[int, float] = {}
+
+        # Exact document ID
+        for number in _DOC_ID_RE.findall(query or ""):
+            for position in self._by_number.get(number, []):
+                scores[position] = 1.0
+
+        normalized = normalize_name(query)
+        query_grams = trigrams(normalized)
+        query_tokens = set(normalized.split())
+        compact = normalized.replace(" ", "")
+
+        candidates = set()
+        for gram in query_grams:
+            candidates |= self._by_trigram.get(gram, set())
+
+        for position in candidates:
+            entry = self.entries[position]
+            product_compact = entry["product"].replace(" ", "")
+            if compact and compact == product_compact:
+                score = 1.0
+            elif query_tokens and (query_tokens <= entry["tokens"] or product_compact.startswith(compact)):
+                # Every word of the query is in the name ("wd 40"), or the name starts with it ("wd40"):
+                # prefer the shortest names
+                score = 0.85 + 0.15 * len(compact) / max(len(product_compact), 1)
+            else:
+                common = len(query_grams & entry["trigrams"])
+                score = 2.0 * common / (len(query_grams) + len(entry["trigrams"]))
+            scores[position] = max(scores.get(position, 0.0), score)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.entries[item[0]]["source"]))
+        return [(self.entries[position]["source"], round(score, 4)) for position, score in ranked[:limit]]
+
+    def best_match(self, query: str, min_score: float = MIN_SCORE, min_margin: float = MIN_MARGIN) -> Optional[str]:
+        """
+        Returns the source of a confident match, or None.
+        A match is confident if its score reaches `min_score` and it leads the second result by
+        `min_margin` (an exact ID or name match is always confident if it is unique).
+        """
+        results = self.search(query, limit=2)
+        if not results:
+            return None
+        source, score = results[0]
+        second = results[1][1] if len(results) > 1 else 0.0
+        if score < min_score:
+            return None
+        if score - second < min_margin and not (score == 1.0 and second < 1.0):
+            return None
+        return source
+
+
+_INDEX_CACHE: Dict[str, tuple] = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def get_name_index(db) -> NameIndex:
+    """
+    Returns the name index of the sources of a Chroma collection.
+    The index is rebuilt only when the cached source catalog changes (see source_catalog.py).
+    """
+    catalog = get_source_catalog(db)
+    key = collection_key(db)
+    with _INDEX_LOCK:
+        cached = _INDEX_CACHE.get(key)
+        if cached is not None and cached[0] is catalog:
+            return cached[1]
+
+    index = NameIndex(catalog.sources)
+    with _INDEX_LOCK:
+        _INDEX_CACHE[key] = (catalog, index)
+    return index
@@ -0,0 +1,452 @@
+# numpy_store.py
+# Memory-mapped NumPy vector store (quantized embeddings + SQLite metadata), alternative to Chroma
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+METADATA_FILE = "metadata.sqlite"
+# Rows converted to float32 at a time during a search (small blocks stay in the CPU cache)
+SEARCH_BLOCK_ROWS = 512
+# Times a reader re-reads the generation when its matrix file was removed by a concurrent write
+LOAD_RETRIES = 3
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Quantizes L2-normalized vectors.
+    Args:
+        vectors (np.ndarray): Matrix (n, d) of embeddings.
+        dtype (str): "float32", "float16" or "int8" (symmetric, one float32 scale per row).
+    Returns:
+        tuple: (quantized matrix, scales or None).
+    """
+    vectors = _normalize(vectors)
+    if dtype == "float32":
+        return vectors, None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported dtype '{dtype}' (use 'float32', 'float16' or 'int8')")
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact cosine-similarity vector store on a memory-mapped, quantized `.npy` matrix.
+    Args:
+        persist_directory (str): Folder with `vectors.<generation>.npy` (+ `scales.<generation>.npy` for int8)
+                                 and the `metadata.sqlite` side table.
+        embedding_function (Embeddings): Model used to embed queries and new texts.
+        dtype (str): Storage type of new stores, "float16" (default), "int8" or "float32" (twice the size of
+                     float16 but searched without any conversion). Existing stores keep theirs.
+    Notes:
+        - The matrix is opened with `mmap_mode="r"`: several app processes share the same pages
+          and nothing is loaded until the first search.
+        - Search is an exact matrix-vector product over the whole matrix (in blocks of
+          `SEARCH_BLOCK_ROWS` rows converted to float32) followed by `argpartition`.
+        - Every write saves a new generation of the matrix files and switches to it in the same SQLite
+          transaction as the metadata, so readers never see a half-written store and files mapped by
+          other processes are never overwritten. Old generations are removed right after the switch
+          (see `_remove_old_generations`).
+        - `similarity_search_with_score` returns the cosine similarity (higher is more similar).
+        - `get()`, `delete()` and `count()` follow the Chroma API used by ingest.py and source_catalog.py.
+          Every write rewrites the matrix; group the writes of a run with `bulk_write()` so it is
+          written once (intended for corpora of thousands of chunks).
+    """
+
+    def __init__(self, persist_directory: str, embedding_function: Optional[Embeddings] = None, dtype: str = "float16"):
+        self._persist_directory = persist_directory
+        self.collection_name = "numpy"
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._loaded_generation = None
+        self._pending: Optional[dict] = None
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(persist_directory, METADATA_FILE), check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "position INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, source TEXT, document TEXT, metadata TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (source)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS store_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    # ============================
+    # Matriz (mmap)
+    # ============================
+    def _path(self, name: str) -> str:
+        return os.path.join(self._persist_directory, name)
+
+    def _generation(self) -> int:
+        """
+        Current generation of the matrix files (0 = empty store). Must be called with the lock held.
+        """
+        row = self._conn.execute("SELECT value FROM store_state WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _matrix(self) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Returns the memory-mapped matrix and scales, reopening them if another process wrote a new generation.
+        If the files of the generation just read are gone (a writer switched to a newer one and removed
+        them before they were opened), the generation is read again.
+        """
+        with self._lock:
+            for attempt in range(LOAD_RETRIES):
+                generation = self._generation()
+                if generation == self._loaded_generation:
+                    break
+                self._vectors, self._scales = None, None
+                try:
+                    if generation:
+                        self._vectors = np.load(self._path(f"vectors.{generation}.npy"), mmap_mode="r")
+                        if self._vectors.dtype == np.int8:
+                            self._scales = np.load(self._path(f"scales.{generation}.npy"), mmap_mode="r")
+                except FileNotFoundError:
+                    self._vectors, self._scales = None, None
+                    if attempt == LOAD_RETRIES - 1:
+                        raise
+                    continue
+                self._loaded_generation = generation
+                break
+            return self._vectors, self._scales
+
+    def _write(self, vectors: Optional[np.ndarray], scales: Optional[np.ndarray]) -> None:
+        """
+        Saves a new generation of the matrix files and records it in the (uncommitted) transaction.
+        Must be called with the lock held, before committing the metadata changes.
+        """
+        generation = self._generation() + 1
+        if vectors is not None and len(vectors):
+            np.save(self._path(f"vectors.{generation}.npy"), vectors)
+            if scales is not None:
+                np.save(self._path(f"scales.{generation}.npy"), scales)
+        else:
+            generation = 0
+        self._conn.execute(
+            "INSERT OR REPLACE INTO store_state (key, value) VALUES ('generation', ?)", (str(generation),)
+        )
+        self._vectors, self._scales, self._loaded_generation = None, None, None
+
+    def _remove_old_generations(self) -> None:
+        """
+        Deletes matrix files of previous generations.
+        On POSIX they are removed even if another process maps them: existing mappings stay valid, and a
+        reader that read the old generation but had not opened its files yet reads it again (see `_matrix`).
+        On Windows mapped files cannot be removed; they are skipped and removed by a later write.
+        """
+        with self._lock:
+            current = self._generation()
+        for name in os.listdir(self._persist_directory):
+            parts = name.split(".")
+            if len(parts) == 3 and parts[0] in ("vectors", "scales") and parts[2] == "npy" and parts[1] != str(current):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def count(self) -> int:
+        """
+        Number of chunks in the store.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    # ============================
+    # Escritura
+    # ============================
+    @contextmanager
+    def bulk_write(self):
+        """
+        Groups the writes of a block: `add_embeddings`, `add_texts` and `delete` calls inside it are applied
+        at the end as a single new generation, instead of rewriting the matrix on every call.
+        Notes:
+            - Reads inside the block (`get`, `count`, searches) see the store as it was before it.
+            - Nothing is written if the block raises. Other threads' writes wait until the block ends.
+        """
+        with self._write_lock:
+            if self._pending is not None:
+                # Nested block: the outer one writes
+                yield self
+                return
+            self._pending = {"delete": set(), "add": {}}
+            try:
+                yield self
+                pending = self._pending
+            finally:
+                self._pending = None
+            rows = pending["add"]
+            self._apply(pending["delete"], list(rows), *map(list, zip(*rows.values())) if rows else ([], [], []))
+
+    def _apply(self, delete_ids: set, ids: List[str], texts: List[str], embeddings: List[List[float]],
+               metadatas: List[dict]) -> None:
+        """
+        Deletes `delete_ids` and the rows replaced by `ids`, appends the new rows and saves the result as
+        one new generation.
+        """
+        with self._write_lock:
+            vectors, scales = self._matrix()
+            delete_ids = set(delete_ids) | set(ids)
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT position, id, source, document, metadata FROM chunks ORDER BY position"
+                ).fetchall()
+                remaining = [row for row in rows if row[1] not in delete_ids]
+                if len(remaining) == len(rows) and not ids:
+                    return
+
+                keep = np.array([row[0] for row in remaining], dtype=np.int64)
+                parts, scale_parts = [], []
+                if len(keep):
+                    parts.append(np.asarray(vectors) if len(keep) == len(vectors) else np.asarray(vectors[keep]))
+                    if scales is not None:
+                        scale_parts.append(np.asarray(scales) if len(keep) == len(scales) else np.asarray(scales[keep]))
+                if ids:
+                    dtype = str(vectors.dtype) if vectors is not None else self.dtype
+                    new_vectors, new_scales = quantize(np.asarray(embeddings, dtype=np.float32), dtype)
+                    parts.append(new_vectors)
+                    if new_scales is not None:
+                        scale_parts.append(new_scales)
+
+                if len(remaining) != len(rows):
+                    # Rewrite the table so positions match the rows of the new matrix
+                    self._conn.execute("DELETE FROM chunks")
+                    self._conn.executemany(
+                        "INSERT INTO chunks (position, id, source, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                        [(new_position, *row[1:]) for new_position, row in enumerate(remaining)]
+                    )
+                self._conn.executemany(
+                    "INSERT INTO chunks (position, id, source, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (len(remaining) + i, chunk_id, (meta or {}).get("source"), text,
+                         json.dumps(meta or {}, ensure_ascii=False))
+                        for i, (chunk_id, text, meta) in enumerate(zip(ids, texts, metadatas))
+                    ]
+                )
+                if parts:
+                    self._write(np.concatenate(parts), np.concatenate(scale_parts) if scale_parts else None)
+                else:
+                    self._write(None, None)
+                self._conn.commit()
+            del vectors, scales
+            self._remove_old_generations()
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Adds precomputed embeddings (no call to the embedding model). Existing ids are replaced.
+        """
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if ids and len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in the same call to add_embeddings")
+
+        with self._write_lock:
+            if self._pending is not None:
+                for chunk_id, text, embedding, meta in zip(ids, texts, embeddings, metadatas):
+                    self._pending["add"].pop(chunk_id, None)
+                    self._pending["add"][chunk_id] = (text, embedding, meta)
+            else:
+                self._apply(set(), list(ids), list(texts), list(embeddings), list(metadatas))
+        return list(ids)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if self.embedding_function is None:
+            raise ValueError("NumpyVectorStore needs an embedding_function to add texts")
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Deletes chunks by id.
+        """
+        if not ids:
+            return True
+        with self._write_lock:
+            if self._pending is not None:
+                for chunk_id in ids:
+                    self._pending["add"].pop(chunk_id, None)
+                self._pending["delete"].update(ids)
+            else:
+                self._apply(set(ids), [], [], [], [])
+        return True
+
+    # ============================
+    # Lectura (compatible con Chroma.get)
+    # ============================
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Returns chunks as Chroma does: {"ids": [...], "metadatas": [...], "documents": [...]}.
+        `where` supports equality filters on metadata keys ({"source": "file.md"}).
+        """
+        include = ["metadatas", "documents"] if include is None else include
+        conditions, params = self._where_clause(where)
+        if ids is not None:
+            conditions.append(f"id IN ({','.join('?' * len(ids))})")
+            params += list(ids)
+        query = "SELECT id, document, metadata FROM chunks"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY position"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset or 0]
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {
+            "ids": [row[0] for row in rows],
+            "documents": [row[1] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(row[2]) for row in rows] if "metadatas" in include else None,
+        }
+
+    @staticmethod
+    def _where_clause(where: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+        """
+        SQL conditions for a Chroma-style equality filter on metadata keys.
+        """
+        conditions, params = [], []
+        for key, value in (where or {}).items():
+            if key == "source":
+                conditions.append("source = ?")
+            else:
+                conditions.append("json_extract(metadata, '$.' || ?) = ?")
+                params.append(key)
+            params.append(value)
+        return conditions, params
+
+    def get_by_ids(self, ids, /) -> List[Document]:
+        result = self.get(ids=list(ids))
+        return [
+            Document(id=chunk_id, page_content=text, metadata=meta)
+            for chunk_id, text, meta in zip(result["ids"], result["documents"], result["metadatas"])
+        ]
+
+    # ============================
+    # Búsqueda
+    # ============================
+    def _scores(self, query_vector: List[float]) -> np.ndarray:
+        vectors, scales = self._matrix()
+        if vectors is None or not len(vectors):
+            return np.zeros(0, dtype=np.float32)
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = np.empty(len(vectors), dtype=np.float32)
+        if vectors.dtype == np.float32:
+            return np.asarray(vectors @ query, dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if scales is not None:
+            scores *= np.asarray(scales)
+        return scores
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Top-k chunks by cosine similarity to a vector, optionally filtered by metadata equality.
+        """
+        scores = self._scores(embedding)
+        if not len(scores):
+            return []
+        if filter:
+            allowed = self._positions(filter)
+            mask = np.full(len(scores), -np.inf, dtype=np.float32)
+            mask[allowed] = 0
+            scores = scores + mask
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = [int(p) for p in top if np.isfinite(scores[p])]
+
+        with self._lock:
+            rows = {
+                row[0]: row[1:] for row in self._conn.execute(
+                    f"SELECT position, id, document, metadata FROM chunks WHERE position IN ({','.join(str(p) for p in top)})"
+                ).fetchall()
+            } if top else {}
+        return [
+            (Document(id=rows[p][0], page_content=rows[p][1], metadata=json.loads(rows[p][2])), float(scores[p]))
+            for p in top if p in rows
+        ]
+
+    def _positions(self, where: Dict[str, Any]) -> List[int]:
+        conditions, params = self._where_clause(where)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT position FROM chunks WHERE " + " AND ".join(conditions), params
+            ).fetchall()]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, persist_directory: str = "./Numpy_DB/",
+                   dtype: str = "float16", **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(persist_directory, embedding, dtype)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def export_chroma(chroma_db, persist_directory: str, embedding_function: Optional[Embeddings] = None,
+                  dtype: str = "float16", page_size: int = 1000) -> NumpyVectorStore:
+    """
+    Copies a Chroma collection (ids, texts, metadata and stored embeddings) into a new NumpyVectorStore,
+    without calling the embedding model.
+    """
+    store = NumpyVectorStore(persist_directory, embedding_function or chroma_db.embeddings, dtype)
+    offset = 0
+    # Pages are read one at a time but the matrix is written once
+    with store.bulk_write():
+        while True:
+            page = chroma_db.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not len(page["ids"]):
+                break
+            store.add_embeddings(page["documents"], page["embeddings"], page["metadatas"], page["ids"])
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+    return store
@@ -0,0 +1,365 @@
+# pdf_to_markdown.py
+# Local, parallel PDF -> Markdown conversion of SDS documents (LLM only for blocks with a broken layout)
+import os
+import re
+import json
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+from config import folder_documents
+from document_analysis import heading_number
+
+# Pages per output block (blocks are joined with "---" as in the Create_RAG notebook)
+PAGES_PER_BLOCK = 5
+# Sections whose tables are rebuilt as markdown tables
+TABLE_SECTIONS = (3, 8)
+# Header/footer band (fraction of the page height) and minimum share of pages a line must repeat in
+MARGIN_BAND = 0.08
+REPEATED_LINE_SHARE = 0.5
+# Layout checks
+MIN_PAGE_CHARS = 40
+MAX_BROKEN_GLYPH_RATIO = 0.01
+MAX_SHORT_LINE_RATIO = 0.5
+
+EMPTY_DOCUMENT = "_Document empty or no relevant text found._"
+_PAGE_NUMBER_RE = re.compile(r"^\s*(page\s*)?\d+\s*((of|/)\s*\d+)?\s*$", re.IGNORECASE)
+_BULLET_RE = re.compile(r"^[•·●▪\uf0b7\-\*]\s+")
+
+LLM_SYSTEM_PROMPT = (
+    "You are an expert in data science and precise document conversion to Markdown for RAG systems. "
+    "Preserve semantic integrity and remove irrelevant noise."
+)
+
+
+# ============================
+# Extracción local por página
+# ============================
+def _line_key(text: str) -> str:
+    """
+    Normalized line used to detect repeated headers/footers (digits ignored, e.g. "Page 2 of 7").
+    """
+    return re.sub(r"\d+", "#", text.strip().lower())
+
+
+def _page_lines(page) -> List[dict]:
+    """
+    Text lines of a fitz page with their position, font size and bold flag, grouped by block.
+    """
+    lines = []
+    for block_number, block in enumerate(page.get_text("dict")["blocks"]):
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            lines.append({
+                "text": text,
+                "block": block_number,
+                "y0": line["bbox"][1],
+                "y1": line["bbox"][3],
+                "size": max(span["size"] for span in spans),
+                "bold": all(span["flags"] & 16 for span in spans),
+            })
+    return lines
+
+
+def _repeated_margin_lines(pages_lines: List[List[dict]], page_heights: List[float]) -> set:
+    """
+    Keys of the lines repeated in the top/bottom band of most pages (running headers and footers).
+    """
+    if len(pages_lines) < 3:
+        return set()
+    counts = Counter()
+    for lines, height in zip(pages_lines, page_heights):
+        keys = {
+            _line_key(line["text"]) for line in lines
+            if line["y0"] < height * MARGIN_BAND or line["y1"] > height * (1 - MARGIN_BAND)
+        }
+        counts.update(keys)
+    threshold = max(2, int(len(pages_lines) * REPEATED_LINE_SHARE))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def table_to_markdown(rows: List[List[Optional[str]]]) -> str:
+    """
+    Renders a table extracted by pdfplumber as a markdown table (first row as header).
+    """
+    rows = [[" ".join((cell or "").split()).replace("|", "\\|") for cell in row] for row in rows if row]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * width]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+
+def layout_problems(lines: List[dict]) -> List[str]:
+    """
+    Returns the reasons why the local extraction of a page is not reliable (empty if it is).
+    """
+    text = "\n".join(line["text"] for line in lines)
+    if len(text.strip()) < MIN_PAGE_CHARS:
+        return []
+    problems = []
+    broken = text.count("(cid:") + text.count("\ufffd")
+    if broken / len(text) > MAX_BROKEN_GLYPH_RATIO:
+        problems.append("broken glyphs")
+    short = sum(1 for line in lines if len(line["text"]) < 3)
+    if short / len(lines) > MAX_SHORT_LINE_RATIO:
+        problems.append("fragmented lines")
+    return problems
+
+
+def page_to_markdown(lines: List[dict], tables: List[dict], body_size: float, skip_keys: set) -> str:
+    """
+    Rebuilds the markdown of a page: SDS section headings, sub-headings, bullets, paragraphs and tables.
+    Args:
+        lines (list): Lines of the page (see `_page_lines`).
+        tables (list): Tables to render, as {"y0", "y1", "markdown"} (their text lines are skipped).
+        body_size (float): Most common font size of the document.
+        skip_keys (set): Running headers/footers to drop.
+    Returns:
+        str: Markdown of the page.
+    """
+    items = []
+    paragraph, paragraph_block = [], None
+
+    def flush():
+        nonlocal paragraph
+        if paragraph:
+            items.append((paragraph[0]["y0"], " ".join(line["text"] for line in paragraph)))
+            paragraph = []
+
+    for line in lines:
+        text = line["text"]
+        if _line_key(text) in skip_keys or _PAGE_NUMBER_RE.match(text):
+            continue
+        if any(table["y0"] - 1 <= line["y0"] and line["y1"] <= table["y1"] + 1 for table in tables):
+            continue
+
+        if heading_number(text) is not None:
+            flush()
+            items.append((line["y0"], f"## {text.strip('#* ')}"))
+        elif (line["bold"] or line["size"] >= body_size + 1.5) and len(text) < 100:
+            flush()
+            items.append((line["y0"], f"### {text.strip('#* ')}"))
+        elif _BULLET_RE.match(text):
+            flush()
+            items.append((line["y0"], "- " + _BULLET_RE.sub("", text)))
+        else:
+            if paragraph and line["block"] != paragraph_block:
+                flush()
+            paragraph.append(line)
+            paragraph_block = line["block"]
+    flush()
+
+    items += [(table["y0"], table["markdown"]) for table in tables if table["markdown"]]
+    items.sort(key=lambda item: item[0])
+    return "\n\n".join(text for _, text in items)
+
+
+# ============================
+# Conversión de un PDF
+# ============================
+def _llm_block(model, block_text: str, start_page: int, end_page: int) -> str:
+    """
+    Converts a block of pages with the LLM (same instructions as the Create_RAG notebook).
+    """
+    prompt = f"""
+    You are an expert in data science and document conversion.
+    Convert the following text extracted from pages {start_page} to {end_page} of a PDF document into clean,
+    well-structured Markdown suitable for ingestion into a Retrieval-Augmented Generation (RAG) system.
+    It is essential to preserve **all relevant information** without omitting any section of the pages.
+
+    Requirements:
+    - Maintain the original hierarchical structure of headings using Markdown syntax (#, ##, ###, etc.) as accurately as possible.
+    - Correctly format lists, tables, and any logical content structures.
+    - Do NOT include Markdown code blocks (```markdown``` or any other code syntax).
+    - Do NOT add or retain titles like # Safety Data Sheet..
+    - Ensure **no content is omitted**, especially near the beginning of the pages.
+    - Keep the output in **clean, clear, and readable Markdown format**.
+    - Write all output in **English**.
+    - Ignore text styling such as underlines or colored fonts; treat all text as plain.
+    - Remove any page numbers, headers, or footers such as "Page 1", "Page 2", etc.
+
+    Original text from pages {start_page} to {end_page}:{block_text}
+    """
+    return model.invoke([("system", LLM_SYSTEM_PROMPT), ("human", prompt)]).content.strip()
+
+
+def convert_pdf(pdf_path: str, output_dir: str = folder_documents, pages_per_block: int = PAGES_PER_BLOCK,
+                use_llm: bool = True, model=None) -> dict:
+    """
+    Converts one PDF into a markdown file named like the PDF.
+    Args:
+        pdf_path (str): Path of the PDF.
+        output_dir (str): Folder where the markdown file is written.
+        pages_per_block (int): Pages per output block.
+        use_llm (bool): If True, blocks whose local layout detection fails are converted by the LLM.
+        model: Chat model for those blocks. Defaults to the shared model of llm_setup (`get_llm()`).
+    Returns:
+        dict: Report with the output path, the blocks sent to the LLM and the timing of every page.
+    Notes:
+        - Headings: lines recognized as SDS section headings become "## ...", bold or larger lines "### ...".
+        - Tables of Sections 3 and 8 are rebuilt with pdfplumber as markdown tables.
+        - Running headers, footers and page numbers are removed.
+        - A block goes to the LLM if any of its pages has broken glyphs or fragmented lines, or if no
+          section heading is found in the whole document.
+    """
+    import fitz
+    import pdfplumber
+
+    started = time.time()
+    filename = os.path.basename(pdf_path)
+    output_path = os.path.join(output_dir, os.path.splitext(filename)[0] + ".md")
+    report = {"source": filename, "output_path": output_path, "pages": [], "llm_blocks": [], "error": None}
+
+    with fitz.open(pdf_path) as doc, pdfplumber.open(pdf_path) as plumber:
+        page_started = time.time()
+        pages_lines = [_page_lines(page) for page in doc]
+        page_heights = [page.rect.height for page in doc]
+        extraction_s = (time.time() - page_started) / max(len(doc), 1)
+
+        sizes = Counter(round(line["size"]) for lines in pages_lines for line in lines)
+        body_size = sizes.most_common(1)[0][0] if sizes else 10
+        skip_keys = _repeated_margin_lines(pages_lines, page_heights)
+        has_headings = any(heading_number(line["text"]) for lines in pages_lines for line in lines)
+
+        pages_markdown, pages_problems = [], []
+        current_section = None
+        for number, lines in enumerate(pages_lines):
+            page_started = time.time()
+            sections = {current_section}
+            for line in lines:
+                section = heading_number(line["text"])
+                if section is not None and (current_section is None or section >= current_section):
+                    current_section = section
+                    sections.add(section)
+
+            tables = []
+            if sections & set(TABLE_SECTIONS):
+                for table in plumber.pages[number].find_tables():
+                    tables.append({"y0": table.bbox[1], "y1": table.bbox[3], "markdown": table_to_markdown(table.extract())})
+
+            pages_markdown.append(page_to_markdown(lines, tables, body_size, skip_keys))
+            problems = layout_problems(lines) if has_headings else ["no section headings"]
+            pages_problems.append(problems)
+            report["pages"].append({
+                "page": number + 1,
+                "seconds": round(extraction_s + time.time() - page_started, 4),
+                "tables": len(tables),
+                "problems": problems,
+            })
+
+        blocks = []
+        for start in range(0, len(pages_lines), pages_per_block):
+            end = min(start + pages_per_block, len(pages_lines))
+            block_markdown = "\n\n".join(text for text in pages_markdown[start:end] if text.strip())
+            if not block_markdown.strip():
+                continue
+            if use_llm and any(pages_problems[start:end]):
+                if model is None:
+                    from llm_setup import get_llm
+                    model = get_llm()
+                llm_started = time.time()
+                block_text = "".join(doc[p].get_text() + "\n\n" for p in range(start, end))
+                block_markdown = _llm_block(model, block_text, start + 1, end)
+                llm_s = (time.time() - llm_started) / (end - start)
+                for page in report["pages"][start:end]:
+                    page["seconds"] = round(page["seconds"] + llm_s, 4)
+                    page["method"] = "llm"
+                report["llm_blocks"].append([start + 1, end])
+            blocks.append(block_markdown)
+
+    for page in report["pages"]:
+        page.setdefault("method", "local")
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n\n---\n\n".join(blocks) if blocks else EMPTY_DOCUMENT)
+    report["seconds"] = round(time.time() - started, 3)
+    return report
+
+
+def _convert_safely(pdf_path: str, output_dir: str, pages_per_block: int, use_llm: bool) -> dict:
+    """
+    Worker entry point: converts one PDF and returns its report (never raises).
+    """
+    started = time.time()
+    try:
+        return convert_pdf(pdf_path, output_dir, pages_per_block, use_llm)
+    except Exception as e:
+        return {"source": os.path.basename(pdf_path), "output_path": None, "pages": [], "llm_blocks": [],
+                "error": f"{type(e).__name__}: {e}", "seconds": round(time.time() - started, 3)}
+
+
+# ============================
+# Conversión de una carpeta
+# ============================
+def convert_pdfs_to_markdown(pdf_folder: str, output_folder: str = folder_documents, workers: int = None,
+                             pages_per_block: int = PAGES_PER_BLOCK, use_llm: bool = True,
+                             report_path: Optional[str] = None) -> List[dict]:
+    """
+    Converts every PDF of a folder to markdown on a process pool.
+    Args:
+        pdf_folder (str): Folder with the PDFs.
+        output_folder (str): Folder for the markdown files (read by the app and ingest.py).
+        workers (int, optional): Number of processes. Defaults to the number of CPUs.
+        pages_per_block (int): Pages per output block.
+        use_llm (bool): If False, the LLM is never called (blocks with problems are kept as extracted).
+        report_path (str, optional): JSON lines file with the per-page timing of every PDF.
+    Returns:
+        list: Report of every PDF (see `convert_pdf`).
+    """
+    pdf_paths = [os.path.join(pdf_folder, f) for f in sorted(os.listdir(pdf_folder)) if f.lower().endswith(".pdf")]
+    reports = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_convert_safely, path, output_folder, pages_per_block, use_llm) for path in pdf_paths]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            if report["error"]:
+                print(f"Error processing {report['source']}: {report['error']}")
+            else:
+                print(
+                    f"{report['source']}: {len(report['pages'])} pages in {report['seconds']} s, "
+                    f"{len(report['llm_blocks'])} blocks sent to the LLM -> {report['output_path']}"
+                )
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            for report in sorted(reports, key=lambda r: r["source"]):
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    pages = sum(len(r["pages"]) for r in reports)
+    llm_blocks = sum(len(r["llm_blocks"]) for r in reports)
+    print(f"Converted {len(reports)} PDFs ({pages} pages, {llm_blocks} LLM blocks) in {time.time() - started:.2f} s")
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a folder of SDS PDFs to markdown.")
+    parser.add_argument("--input", required=True, help="Folder with the PDF documents.")
+    parser.add_argument("--output", default=folder_documents, help="Folder for the markdown files.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: CPUs).")
+    parser.add_argument("--pages-per-block", type=int, default=PAGES_PER_BLOCK, help="Pages per output block.")
+    parser.add_argument("--no-llm", action="store_true", help="Never call the LLM, not even for hard blocks.")
+    parser.add_argument("--report", default=None, help="JSON lines file with the per-page timing.")
+    args = parser.parse_args(argv)
+
+    reports = convert_pdfs_to_markdown(
+        args.input, args.output, workers=args.workers, pages_per_block=args.pages_per_block,
+        use_llm=not args.no_llm, report_path=args.report
+    )
+    return 0 if all(not r["error"] for r in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,26 @@
+# prompt_builder.py
+# Prompt layout for provider-side prompt caching: the document text first, the per-call instructions last
+import textwrap
+
+
+def build_prompt(document: str, instructions: str) -> str:
+    """
+    Builds an LLM prompt with a stable prefix: the document first, then the instructions.
+    Args:
+        document (str): Text the task is about (section-scoped SDS text, or a previous answer that
+                        several follow-up calls work on).
+        instructions (str): Task, question, rules and output format of this call.
+    Returns:
+        str: The prompt.
+    Notes:
+        - OpenAI caches prompt prefixes of 1024+ tokens: calls that send the same document (e.g. the
+          fields of one table, or the selector and the extractors of the same sections) only pay the
+          cached input price for it and start answering sooner. Anything that varies per call
+          (field, question, active categories) must go in `instructions`, never before the document.
+        - The document is stripped and the instructions dedented, so the same inputs always give
+          byte-identical prompts.
+    """
+    return (
+        f"<document>\n{(document or '').strip()}\n</document>\n\n"
+        f"{textwrap.dedent(instructions).strip()}\n"
+    )
@@ -0,0 +1,304 @@
+# rate_limiter.py
+# Client-side token-bucket rate limiting for the OpenAI requests-per-minute / tokens-per-minute quotas
+import os
+import time
+import random
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+import openai
+from langchain.chat_models import ChatOpenAI
+from langchain.embeddings.openai import OpenAIEmbeddings
+from telemetry import record
+
+# Errors worth retrying: quota (429), timeouts, connection problems and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+# ============================
+# Estimación de tokens
+# ============================
+_ENCODINGS: Dict[str, Any] = {}
+
+
+def estimate_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Estimates the number of tokens of a text before sending it.
+    Args:
+        text (str): Text of the request.
+        model (str): Model name, used to select the tiktoken encoding.
+    Returns:
+        int: Number of tokens (tiktoken if available, otherwise ~4 characters per token).
+    """
+    if not text:
+        return 0
+    encoding = _ENCODINGS.get(model)
+    if encoding is None:
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            encoding = False
+        _ENCODINGS[model] = encoding
+    if encoding is False:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# ============================
+# Token bucket
+# ============================
+class TokenBucketRateLimiter:
+    """
+    Enforces a requests-per-minute and a tokens-per-minute budget with two token buckets.
+    Args:
+        name (str): Name of the budget (e.g. "chat:gpt-4o-mini"). Limiters with the same name and
+                    `state_path` share the budget, also across processes.
+        rpm (int): Requests per minute allowed.
+        tpm (int): Tokens per minute allowed.
+        state_path (str, optional): SQLite file where the bucket state is shared between processes.
+                                    If None, the budget is only shared between the threads of this process.
+    Notes:
+        - Buckets start full and refill continuously (rpm/60 requests and tpm/60 tokens per second).
+        - A request larger than the whole TPM budget is clamped to it so it can still be sent.
+        - Queue wait times are accumulated in `stats()` and, while a document is tracked, added to its
+          telemetry (rate_limit_wait_s) instead of being printed from the worker threads.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int, state_path: Optional[str] = None):
+        self.name = name
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._state = None
+        self._conn = None
+        if state_path:
+            directory = os.path.dirname(state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(state_path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                "name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+        # Statistics
+        self.requests = 0
+        self.throttled = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.retries = 0
+
+    def _try_consume(self, tokens: float) -> float:
+        """
+        Takes one request and `tokens` tokens from the buckets if available.
+        Returns 0 on success, otherwise the seconds to wait before trying again.
+        Must be called with the lock held.
+        """
+        if self._conn is None:
+            return self._consume_state(tokens)
+
+        # Shared state: the read-modify-write runs inside an exclusive SQLite transaction
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._state = self._conn.execute(
+                "SELECT requests, tokens, updated FROM rate_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            wait_s = self._consume_state(tokens)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                (self.name, *self._state)
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return wait_s
+
+    def _consume_state(self, tokens: float) -> float:
+        """
+        Refills the buckets stored in `self._state` and consumes the request if it fits.
+        """
+        now = time.time()
+        requests, available_tokens, updated = self._state if self._state else (self.rpm, self.tpm, now)
+
+        # Refill
+        elapsed = max(0.0, now - updated)
+        requests = min(self.rpm, requests + elapsed * self.rpm / 60.0)
+        available_tokens = min(self.tpm, available_tokens + elapsed * self.tpm / 60.0)
+
+        if requests >= 1 and available_tokens >= tokens:
+            requests -= 1
+            available_tokens -= tokens
+            wait_s = 0.0
+        else:
+            wait_request = (1 - requests) * 60.0 / self.rpm if requests < 1 else 0.0
+            wait_tokens = (tokens - available_tokens) * 60.0 / self.tpm if available_tokens < tokens else 0.0
+            wait_s = max(wait_request, wait_tokens, 0.01)
+
+        self._state = (requests, available_tokens, now)
+        return wait_s
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Blocks until the request fits in the RPM and TPM budgets.
+        Args:
+            tokens (int): Estimated tokens of the request (prompt + expected completion).
+        Returns:
+            float: Seconds spent waiting in the queue.
+        """
+        tokens = min(float(tokens), self.tpm)
+        started = time.time()
+        throttled = False
+        while True:
+            with self._lock:
+                wait_s = self._try_consume(tokens)
+            if wait_s == 0.0:
+                break
+            throttled = True
+            time.sleep(wait_s)
+
+        waited = time.time() - started
+        with self._lock:
+            self.requests += 1
+            if throttled:
+                self.throttled += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+        if throttled:
+            record(rate_limit_wait_s=waited)
+        return waited
+
+    def record_retry(self) -> None:
+        """
+        Counts a request retried after a retryable error (see `call_with_backoff`).
+        """
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the number of requests, throttled requests, retries and queue wait times.
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "total_wait_s": round(self.total_wait_s, 3),
+                "mean_wait_s": round(self.total_wait_s / self.requests, 3) if self.requests else 0.0,
+                "max_wait_s": round(self.max_wait_s, 3),
+            }
+
+
+def call_with_backoff(func, limiter: Optional[TokenBucketRateLimiter] = None, tokens: int = 0,
+                      max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+    """
+    Calls `func` after acquiring the rate limiter, retrying retryable OpenAI errors with jittered backoff.
+    Args:
+        func (Callable): Function performing the request.
+        limiter (TokenBucketRateLimiter, optional): Budget acquired before every attempt.
+        tokens (int): Estimated tokens of the request.
+        max_retries (int): Maximum number of retries after the first attempt.
+        base_delay (float): Base delay of the exponential backoff, in seconds.
+        max_delay (float): Maximum delay between attempts, in seconds.
+    Returns:
+        The result of `func`.
+    Notes:
+        - "Full jitter" backoff: the delay is random in [0, min(max_delay, base_delay * 2**attempt)],
+          so parallel workers do not retry in lockstep.
+        - A `Retry-After` header sent by the API is respected as a minimum delay.
+        - Retries are counted in the limiter (`record_retry`) and in the document telemetry (rate_limit_retries).
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return func()
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_retries:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            retry_after = _retry_after_seconds(e)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            attempt += 1
+            if limiter is not None:
+                limiter.record_retry()
+            record(rate_limit_retries=1)
+            time.sleep(delay)
+
+
+def _retry_after_seconds(error) -> Optional[float]:
+    """
+    Reads the Retry-After header of an OpenAI error response, if present.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ============================
+# Integración con LangChain
+# ============================
+class RateLimitedChatOpenAI(ChatOpenAI):
+    """
+    ChatOpenAI that acquires a `TokenBucketRateLimiter` before every API request.
+    Cache hits (see llm_cache.py) do not reach the API and do not consume the budget.
+    """
+
+    request_limiter: Optional[Any] = None
+    backoff_retries: int = 5
+    completion_tokens_estimate: int = 512
+
+    def completion_with_retry(self, run_manager=None, **kwargs: Any) -> Any:
+        prompt_text = "\n".join(str(message.get("content") or "") for message in kwargs.get("messages", []))
+        tokens = estimate_tokens(prompt_text, self.model_name) + (kwargs.get("max_tokens") or self.completion_tokens_estimate)
+        parent = super(RateLimitedChatOpenAI, self)
+        return call_with_backoff(
+            lambda: parent.completion_with_retry(run_manager=run_manager, **kwargs),
+            limiter=self.request_limiter,
+            tokens=tokens,
+            max_retries=self.backoff_retries
+        )
+
+
+class RateLimitedOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    OpenAIEmbeddings that acquires a `TokenBucketRateLimiter` before every batch sent to the API.
+    """
+
+    request_limiter: Optional[Any] = None
+    backoff_retries: int = 5
+
+    def embed_documents(self, texts: List[str], chunk_size: Optional[int] = 0) -> List[List[float]]:
+        batch_size = chunk_size or self.chunk_size
+        parent = super(RateLimitedOpenAIEmbeddings, self)
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = sum(estimate_tokens(text, self.model) for text in batch)
+            vectors.extend(call_with_backoff(
+                lambda: parent.embed_documents(batch, chunk_size=batch_size),
+                limiter=self.request_limiter,
+                tokens=tokens,
+                max_retries=self.backoff_retries
+            ))
+        return vectors
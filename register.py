@@ -0,0 +1,247 @@
+# register.py
+# Consolidated COSHH register: one workbook with the six tables of every processed document
+import os
+import re
+import json
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from config import JSON_PATHS, output_Excel
+
+STAGING_NAME = "register_rows.jsonl"
+REGISTER_NAME = "COSHH_register.xlsx"
+
+# Register tables: name in the process_document output -> key in JSON_PATHS
+REGISTER_TABLES = {
+    "Hazards": "hazards",
+    "Storage": "storage",
+    "Waste_disposal_measures": "waste_disposal_measures",
+    "Spill_management": "spill_management",
+    "Fire_procedures": "fire_procedures",
+    "First_aid_procedures": "first_aid_procedures",
+}
+LAYOUTS = ("tables", "products")
+
+_APPEND_LOCK = threading.Lock()
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+# ============================
+# Staging (appends incrementales)
+# ============================
+def register_entry(source_match: str, updated_jsons: Dict[str, dict], excel_path: Optional[str] = None) -> dict:
+    """
+    Builds the register entry of a document: the 'to_excel' value of every field written to the Excel.
+    Args:
+        source_match (str): File name of the document.
+        updated_jsons (dict): First value returned by process_document (table name -> JSON).
+        excel_path (str, optional): Path of the Excel generated for the document.
+    Returns:
+        dict: {"source", "processed_at", "excel_path", "tables": {table: {field: value}}}.
+    """
+    tables = {}
+    for table in REGISTER_TABLES:
+        sheet = (updated_jsons.get(table) or {}).get("Sheet_2", {})
+        tables[table] = {
+            field: values.get("to_excel", "")
+            for field, values in sheet.items()
+            if isinstance(values, dict) and values.get("position")
+        }
+    return {
+        "source": source_match,
+        "processed_at": datetime.now().isoformat(timespec="seconds"),
+        "excel_path": excel_path,
+        "tables": tables,
+    }
+
+
+def append_to_register(staging_path: str, source_match: str, updated_jsons: Dict[str, dict],
+                       excel_path: Optional[str] = None) -> dict:
+    """
+    Appends the entry of a processed document to the staging JSON lines file of the register.
+    Safe to call from several worker threads; a document processed again replaces its previous rows
+    when the workbook is built.
+    """
+    entry = register_entry(source_match, updated_jsons, excel_path)
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    directory = os.path.dirname(staging_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _APPEND_LOCK:
+        with open(staging_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+    return entry
+
+
+def iter_register_entries(staging_path: str) -> Iterator[dict]:
+    """
+    Yields the latest entry of every document of the staging file, sorted by source name.
+    Notes:
+        - The file is read twice: the first pass only keeps the offset of the last line of each
+          document, so memory does not grow with the size of the register.
+    """
+    if not os.path.exists(staging_path):
+        return
+    offsets: Dict[str, int] = {}
+    with open(staging_path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                source = json.loads(line).get("source")
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                # Truncated line from an interrupted run
+                source = None
+            if source:
+                offsets[source] = offset
+            offset += len(line)
+
+        for source in sorted(offsets):
+            f.seek(offsets[source])
+            yield json.loads(f.readline())
+
+
+# ============================
+# Libro del registro (openpyxl write-only)
+# ============================
+def register_columns(json_paths: Dict[str, str] = JSON_PATHS) -> Dict[str, List[dict]]:
+    """
+    Returns the columns of every table: the fields of the base JSON with a cell 'position',
+    in template order, with their question ('content') as header.
+    """
+    columns = {}
+    for table, key in REGISTER_TABLES.items():
+        with open(json_paths[key], "r", encoding="utf-8") as f:
+            sheet = json.load(f).get("Sheet_2", {})
+        columns[table] = [
+            {"field": field, "header": (values.get("content") or field).rstrip("?").strip()}
+            for field, values in sheet.items()
+            if isinstance(values, dict) and values.get("position")
+        ]
+    return columns
+
+
+def _sheet_title(name: str, used: set) -> str:
+    """
+    Valid and unique sheet title (max. 31 characters, no []:*?/\\).
+    """
+    base = _INVALID_SHEET_CHARS.sub("_", os.path.splitext(name)[0]).strip("'") or "Sheet"
+    title = base[:31]
+    counter = 2
+    while title.lower() in used:
+        suffix = f"~{counter}"
+        title = base[:31 - len(suffix)] + suffix
+        counter += 1
+    used.add(title.lower())
+    return title
+
+
+def _cell_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def build_register(staging_path: str, output_path: str, layout: str = "tables",
+                   json_paths: Dict[str, str] = JSON_PATHS) -> dict:
+    """
+    Writes the register workbook from the staging file.
+    Args:
+        staging_path (str): JSON lines file filled by `append_to_register`.
+        output_path (str): Path of the register .xlsx.
+        layout (str): "tables" (one sheet per table, one row per document) or
+                      "products" (one sheet per document with its six tables).
+        json_paths (dict): Base JSONs, used for the columns of every table.
+    Returns:
+        dict: {"path", "documents", "layout"}.
+    Notes:
+        - The workbook is written with openpyxl in write-only mode: rows are streamed to disk
+          as they are appended, so memory stays flat with hundreds of products ("products" only
+          keeps the small per-sheet bookkeeping of openpyxl; each sheet is closed once written).
+        - The file is written next to the final path and renamed at the end, so a register
+          being opened never sees a half-written file.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown register layout '{layout}' (use one of {LAYOUTS})")
+
+    columns = register_columns(json_paths)
+    wb = Workbook(write_only=True)
+    header_font = Font(bold=True)
+    wrap = Alignment(wrap_text=True, vertical="top")
+
+    def header(ws, titles):
+        row = []
+        for title in titles:
+            cell = WriteOnlyCell(ws, value=title)
+            cell.font = header_font
+            cell.alignment = wrap
+            row.append(cell)
+        return row
+
+    documents = 0
+    if layout == "tables":
+        sheets = {}
+        for table, table_columns in columns.items():
+            ws = wb.create_sheet(title=table[:31])
+            ws.freeze_panes = "B2"
+            ws.column_dimensions["A"].width = 45
+            ws.append(header(ws, ["Source", "Processed at"] + [c["header"] for c in table_columns]))
+            sheets[table] = ws
+        for entry in iter_register_entries(staging_path):
+            documents += 1
+            for table, table_columns in columns.items():
+                values = entry.get("tables", {}).get(table, {})
+                sheets[table].append(
+                    [entry["source"], entry.get("processed_at")]
+                    + [_cell_value(values.get(c["field"], "")) for c in table_columns]
+                )
+    else:
+        used_titles = set()
+        for entry in iter_register_entries(staging_path):
+            documents += 1
+            ws = wb.create_sheet(title=_sheet_title(entry["source"], used_titles))
+            ws.column_dimensions["A"].width = 25
+            ws.column_dimensions["B"].width = 45
+            ws.column_dimensions["C"].width = 80
+            ws.append(header(ws, ["Source", entry["source"]]))
+            ws.append(["Processed at", entry.get("processed_at")])
+            for table, table_columns in columns.items():
+                values = entry.get("tables", {}).get(table, {})
+                ws.append([])
+                ws.append(header(ws, [table, "Field", "Value"]))
+                for c in table_columns:
+                    ws.append(["", c["header"], _cell_value(values.get(c["field"], ""))])
+            # Finishes the sheet now: its rows go to disk and its temporary file is closed
+            ws.close()
+        if not documents:
+            wb.create_sheet(title="Register")
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, output_path)
+    print(f"Register written: {output_path} ({documents} documents, layout '{layout}')")
+    return {"path": output_path, "documents": documents, "layout": layout}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the consolidated COSHH register from the batch staging file.")
+    parser.add_argument("--staging", default=os.path.join(output_Excel, STAGING_NAME),
+                        help="JSON lines file with the processed documents.")
+    parser.add_argument("--output", default=os.path.join(output_Excel, REGISTER_NAME), help="Register workbook.")
+    parser.add_argument("--layout", choices=LAYOUTS, default="tables",
+                        help="'tables': one sheet per table; 'products': one sheet per document.")
+    args = parser.parse_args(argv)
+    build_register(args.staging, args.output, layout=args.layout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
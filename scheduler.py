@@ -0,0 +1,77 @@
+# scheduler.py
+# Dependency-aware execution of pipeline stages on a bounded worker pool
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class Stage:
+    """
+    A single unit of work inside a stage graph.
+    Args:
+        name (str): Unique name of the stage.
+        func (Callable): Function executed for the stage. It receives the dict of results
+                         of the stages it depends on (keyed by stage name).
+        depends_on (Iterable[str], optional): Names of the stages that must finish first.
+    """
+
+    __slots__ = ("name", "func", "depends_on")
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any], depends_on: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+
+
+def run_stage_graph(stages, max_workers: int = 4, on_stage_end: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Runs a list of stages respecting their dependencies, executing independent stages concurrently.
+    Args:
+        stages (list[Stage]): Stages that make up the graph.
+        max_workers (int): Maximum number of stages running at the same time.
+        on_stage_end (Callable, optional): Called with the stage name each time a stage finishes.
+    Returns:
+        dict: Result of every stage, keyed by stage name.
+    Raises:
+        ValueError: If a stage depends on an unknown stage or the graph contains a cycle.
+        Exception: The first exception raised by a stage is re-raised once running stages finish;
+                   stages not yet started are cancelled.
+    """
+
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    results: Dict[str, Any] = {}
+    pending = dict(by_name)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        while pending or running:
+            # Launch every stage whose dependencies are already resolved
+            ready = [s for s in pending.values() if all(dep in results for dep in s.depends_on)]
+            for stage in ready:
+                del pending[stage.name]
+                deps = {dep: results[dep] for dep in stage.depends_on}
+                # Each stage runs in a copy of the caller's context (telemetry spans, LangChain callbacks)
+                context = contextvars.copy_context()
+                running[executor.submit(context.run, stage.func, deps)] = stage.name
+
+            if not running:
+                raise ValueError(f"Cyclic dependencies between stages: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for other in running:
+                        other.cancel()
+                    raise error
+                results[name] = future.result()
+                if on_stage_end is not None:
+                    on_stage_end(name)
+
+    return results
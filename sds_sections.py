@@ -0,0 +1,46 @@
+# sds_sections.py
+# Splitting of SDS/MSDS markdown documents into their 16 standard sections
+from typing import Dict, Iterable, Optional
+from config import SCOPE_PROMPTS_TO_SECTIONS
+from document_analysis import analyze_document
+
+
+def split_sds_sections(content: str) -> Dict[int, str]:
+    """
+    Splits an SDS/MSDS markdown document into its standard sections.
+    Args:
+        content (str): Full markdown content of the document.
+    Returns:
+        dict: Mapping section number (1-16) -> text of the section, heading included.
+              Returns an empty dict when the headings cannot be found reliably.
+    Notes:
+        - Section numbers must appear in increasing order; a heading with a lower number
+          (e.g. "See Section 8" written as a heading) is treated as part of the current section.
+        - A repeated heading (e.g. "SECTION 8 (continued)" after a page block) continues the same section.
+        - The split is part of the cached `DocumentAnalysis` (see document_analysis.py), so every
+          extractor shares the same single pass over the document.
+    """
+    if not content:
+        return {}
+    return analyze_document(content).sections
+
+
+def scope_content(content: str, section_numbers: Optional[Iterable[int]]) -> str:
+    """
+    Returns only the requested SDS sections of a document, to be used as LLM context.
+    Args:
+        content (str): Full markdown content of the document.
+        section_numbers (Iterable[int] or None): Sections to keep, e.g. [4] for first aid.
+    Returns:
+        str: The requested sections joined in document order, or the full document when
+             scoping is disabled, no sections are requested, the headings cannot be found
+             or none of the requested sections exists in the document.
+    """
+    if not SCOPE_PROMPTS_TO_SECTIONS or not section_numbers or not content:
+        return content
+
+    sections = split_sds_sections(content)
+    selected = [sections[n] for n in sorted(set(section_numbers)) if n in sections]
+    if not selected:
+        return content
+    return "\n\n".join(selected)
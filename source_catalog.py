@@ -0,0 +1,147 @@
+# source_catalog.py
+# Cached catalog of the documents stored in the Chroma database (metadata only)
+import os
+import threading
+from typing import Dict, List, Optional
+from config import folder_documents
+
+# Number of metadata rows fetched per request to Chroma
+PAGE_SIZE = 1000
+
+_CACHE: Dict[str, tuple] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class SourceCatalog:
+    """
+    Unique sources of a Chroma collection with their number of chunks and file size.
+    Attributes:
+        sources (dict): Source name -> {"chunks": int, "file_size": int or None}.
+                        `file_size` is the size in bytes of the file in `folder_documents`,
+                        or None if the file does not exist.
+        fingerprint (tuple): State of the collection when the catalog was built (see `collection_fingerprint`).
+    """
+
+    def __init__(self, sources: Dict[str, dict], fingerprint: tuple):
+        self.sources = sources
+        self.fingerprint = fingerprint
+
+    def names(self) -> List[str]:
+        """
+        Returns the source names in alphabetical order.
+        """
+        return sorted(self.sources)
+
+    def chunk_count(self, source: str) -> int:
+        return self.sources.get(source, {}).get("chunks", 0)
+
+    def file_size(self, source: str) -> Optional[int]:
+        return self.sources.get(source, {}).get("file_size")
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __contains__(self, source):
+        return source in self.sources
+
+
+def _collection_count(db) -> int:
+    """
+    Number of chunks of a Chroma collection or a NumpyVectorStore.
+    """
+    collection = getattr(db, "_collection", None)
+    return collection.count() if collection is not None else db.count()
+
+
+def collection_key(db) -> str:
+    """
+    Identifies a collection (persist directory + collection name) in the process-wide caches.
+    """
+    collection = getattr(db, "_collection", None)
+    name = collection.name if collection is not None else getattr(db, "collection_name", type(db).__name__)
+    return f"{getattr(db, '_persist_directory', None)}:{name}"
+
+
+def collection_fingerprint(db) -> tuple:
+    """
+    Cheap identifier of the current state of a Chroma collection.
+    Combines the number of chunks with the modification time of the SQLite files of the persist
+    directory (Chroma or NumpyVectorStore), so additions, deletions and updates all invalidate the catalog.
+    """
+    persist_directory = getattr(db, "_persist_directory", None)
+    mtimes = []
+    if persist_directory:
+        for name in ("chroma.sqlite3", "chroma.sqlite3-wal", "metadata.sqlite"):
+            path = os.path.join(persist_directory, name)
+            if os.path.exists(path):
+                mtimes.append(os.path.getmtime(path))
+    return (_collection_count(db), tuple(mtimes))
+
+
+def fetch_source_catalog(db, page_size: int = PAGE_SIZE, documents_dir: str = folder_documents) -> SourceCatalog:
+    """
+    Builds the catalog reading only the chunk metadata, page by page.
+    Args:
+        db: Chroma database instance.
+        page_size (int): Number of chunks requested per call to `db.get()`.
+        documents_dir (str): Folder with the markdown documents, used for the file sizes.
+    Returns:
+        SourceCatalog: Catalog of the collection.
+    Notes:
+        - Documents and embeddings are not loaded (`include=["metadatas"]`).
+    """
+    fingerprint = collection_fingerprint(db)
+    counts: Dict[str, int] = {}
+    offset = 0
+    while True:
+        page = db.get(include=["metadatas"], limit=page_size, offset=offset)
+        metadatas = page.get("metadatas") or []
+        for meta in metadatas:
+            if isinstance(meta, dict):
+                source = meta.get("source", "")
+                counts[source] = counts.get(source, 0) + 1
+        if len(metadatas) < page_size:
+            break
+        offset += page_size
+
+    sources = {}
+    for source, chunks in counts.items():
+        path = os.path.join(documents_dir, source) if source else ""
+        sources[source] = {
+            "chunks": chunks,
+            "file_size": os.path.getsize(path) if path and os.path.isfile(path) else None,
+        }
+    return SourceCatalog(sources, fingerprint)
+
+
+def get_source_catalog(db, refresh: bool = False) -> SourceCatalog:
+    """
+    Returns the catalog of a Chroma collection, cached for the whole process.
+    Args:
+        db: Chroma database instance.
+        refresh (bool): If True, rebuilds the catalog even if the collection did not change.
+    Returns:
+        SourceCatalog: Cached catalog, rebuilt only when the collection fingerprint changes.
+    Notes:
+        - The cache lives at module level, so it is shared by every Streamlit rerun and session
+          of the same server process. Checking the fingerprint costs one COUNT query.
+    """
+    key = collection_key(db)
+    fingerprint = collection_fingerprint(db)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None and not refresh and cached.fingerprint == fingerprint:
+            return cached
+
+    catalog = fetch_source_catalog(db)
+    with _CACHE_LOCK:
+        _CACHE[key] = catalog
+    return catalog
+
+
+def clear_source_catalog_cache():
+    """
+    Empties the process-wide catalog cache.
+    """
+    with _CACHE_LOCK:
+        _CACHE.clear()
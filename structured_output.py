@@ -0,0 +1,105 @@
+# structured_output.py
+# JSON schema of the text fields of a table and validation of the structured (single-call) LLM response
+import re
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Same cap as the 'to_excel' summaries of the two-step extraction
+MAX_EXCEL_CHARS = 300
+NO_INFORMATION = ("no information", "no information available", "not available")
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def table_schema(fields: Iterable[str], max_excel_chars: int = MAX_EXCEL_CHARS) -> dict:
+    """
+    JSON schema of the answer for some fields of a table: one object per field with the two values
+    written to the Sheet_2 template ('response' and 'to_excel').
+    Args:
+        fields (Iterable[str]): Field keys of Sheet_2.
+        max_excel_chars (int): Maximum length of 'to_excel'.
+    Returns:
+        dict: JSON schema (draft 2020-12 subset, compatible with OpenAI structured outputs).
+    """
+    field_schema = {
+        "type": "object",
+        "properties": {
+            "response": {"type": "string"},
+            "to_excel": {"type": "string", "maxLength": max_excel_chars},
+        },
+        "required": ["response", "to_excel"],
+        "additionalProperties": False,
+    }
+    fields = list(fields)
+    return {
+        "type": "object",
+        "properties": {field: field_schema for field in fields},
+        "required": fields,
+        "additionalProperties": False,
+    }
+
+
+def parse_json_object(text: str) -> Optional[dict]:
+    """
+    Parses the JSON object of a model response (plain or inside a ```json fence).
+    Returns None if the response holds no valid JSON object.
+    """
+    text = _FENCE_RE.sub("", (text or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def validate_fields(data: Optional[dict], fields: Iterable[str],
+                    max_excel_chars: int = MAX_EXCEL_CHARS) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    Checks every requested field of a parsed response against `table_schema`.
+    Returns:
+        tuple: (valid fields -> {"response", "to_excel"}, invalid fields -> error message).
+    """
+    valid: Dict[str, dict] = {}
+    errors: Dict[str, str] = {}
+    data = data if isinstance(data, dict) else {}
+    for field in fields:
+        value = data.get(field)
+        if not isinstance(value, dict):
+            errors[field] = "missing" if value is None else "must be an object with 'response' and 'to_excel'"
+            continue
+        response, to_excel = value.get("response"), value.get("to_excel")
+        if not isinstance(response, str) or not isinstance(to_excel, str):
+            errors[field] = "'response' and 'to_excel' must be strings"
+        elif len(to_excel) > max_excel_chars:
+            errors[field] = f"'to_excel' is {len(to_excel)} characters long (max {max_excel_chars})"
+        else:
+            valid[field] = {"response": response.strip(), "to_excel": to_excel.strip()}
+    return valid, errors
+
+
+def excel_value(to_excel: str, na_value: str = "N/A", max_excel_chars: int = MAX_EXCEL_CHARS) -> str:
+    """
+    Final Excel value of a summary: `na_value` when the model reports no information, capped otherwise.
+    """
+    to_excel = (to_excel or "").strip()
+    if not to_excel or to_excel.lower().rstrip(".") in NO_INFORMATION:
+        return na_value
+    return to_excel[:max_excel_chars].rstrip()
+
+
+def salvage_fields(data: Optional[dict], fields: List[str], max_excel_chars: int = MAX_EXCEL_CHARS) -> Dict[str, dict]:
+    """
+    Best-effort values of fields still invalid after the repair retries: strings are kept (the summary
+    is truncated to the cap), anything else is dropped.
+    """
+    salvaged = {}
+    data = data if isinstance(data, dict) else {}
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, dict) and isinstance(value.get("response"), str) and isinstance(value.get("to_excel"), str):
+            salvaged[field] = {"response": value["response"].strip(),
+                               "to_excel": value["to_excel"].strip()[:max_excel_chars].rstrip()}
+    return salvaged
@@ -0,0 +1,381 @@
+# telemetry.py
+# Per-document performance telemetry: wall time, LLM calls, tokens, cache hits and cost per stage/extractor
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from config import TELEMETRY_ENABLED, TELEMETRY_JSONL_PATH, TELEMETRY_PROMETHEUS_PATH, MODEL_PRICES_PER_1M
+
+# Metrics of the document being processed and innermost span name, propagated to the stage
+# threads with contextvars.copy_context() (see scheduler.run_stage_graph)
+_DOCUMENT: contextvars.ContextVar[Optional["DocumentMetrics"]] = contextvars.ContextVar("sds_document_metrics", default=None)
+_SPANS: contextvars.ContextVar[tuple] = contextvars.ContextVar("sds_spans", default=())
+
+COUNTERS = ("calls", "wall_s", "llm_calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+            "llm_cache_hits", "embedding_cache_hits", "embedding_cache_misses", "cost_usd",
+            "rate_limit_wait_s", "rate_limit_retries")
+
+
+def _empty_counters() -> Dict[str, float]:
+    return {name: 0 for name in COUNTERS}
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Estimated cost in USD of a request, from MODEL_PRICES_PER_1M (input, cached input, output per 1M tokens).
+    Unknown models cost 0.
+    """
+    prices = None
+    for name, value in MODEL_PRICES_PER_1M.items():
+        # "gpt-4o-mini-2024-07-18" uses the prices of "gpt-4o-mini"
+        if model and model.startswith(name) and (prices is None or len(name) > len(prices[0])):
+            prices = (name, value)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices[1]
+    cached_tokens = min(cached_tokens, prompt_tokens)
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+# ============================
+# Métricas por documento
+# ============================
+class DocumentMetrics:
+    """
+    Metrics of one processed document.
+    Attributes:
+        source (str): Document name.
+        spans (dict): Span name (stage or extractor function) -> counters. Counters are inclusive:
+                      an LLM call is added to every span open around it (e.g. the stage
+                      "hazards_text" and the function "extract_hazards_text").
+        steps (list): (step name, seconds) of the process_document checkpoints.
+        totals (dict): Counters of the whole document.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.steps: List[list] = []
+        self.totals = _empty_counters()
+        self._step_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def add(self, spans: Iterable[str], **counters: float) -> None:
+        """
+        Adds counters to the given spans and to the document totals.
+        """
+        with self._lock:
+            for name in spans:
+                target = self.spans.setdefault(name, _empty_counters())
+                for key, value in counters.items():
+                    target[key] += value
+            for key, value in counters.items():
+                if key not in ("calls", "wall_s"):
+                    self.totals[key] += value
+
+    def checkpoint(self, step: str) -> None:
+        """
+        Starts a new process_document step, closing the previous one.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            if self.steps and self._step_started is not None:
+                self.steps[-1][1] = round(now - self._step_started, 4)
+            self.steps.append([step, None])
+            self._step_started = now
+
+    def finish(self) -> None:
+        self.checkpoint("")
+        with self._lock:
+            self.steps.pop()
+            self.finished_at = time.time()
+            self.totals["wall_s"] = self.finished_at - self.started_at
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            prompt_tokens = self.totals["prompt_tokens"]
+            return {
+                "source": self.source,
+                "started_at": round(self.started_at, 3),
+                "finished_at": round(self.finished_at, 3) if self.finished_at else None,
+                "totals": {k: round(v, 6) if isinstance(v, float) else v for k, v in self.totals.items() if k != "calls"},
+                # Share of the prompt tokens served from the provider prompt cache (see prompt_builder.py)
+                "cached_prompt_share": round(self.totals["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0,
+                "steps": [{"step": name, "wall_s": seconds} for name, seconds in self.steps],
+                "spans": {
+                    name: {k: round(v, 6) if isinstance(v, float) else v for k, v in counters.items()}
+                    for name, counters in self.spans.items()
+                },
+            }
+
+
+def current_document() -> Optional[DocumentMetrics]:
+    return _DOCUMENT.get()
+
+
+def checkpoint(step: str) -> None:
+    """
+    Records the start of a process_document step (no-op outside `track_document`).
+    """
+    metrics = _DOCUMENT.get()
+    if metrics is not None:
+        metrics.checkpoint(step)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Measures a stage or function: wall time plus every LLM call, token and cache hit inside it.
+    No-op outside `track_document`.
+    """
+    metrics = _DOCUMENT.get()
+    if metrics is None:
+        yield
+        return
+    token = _SPANS.set(_SPANS.get() + (name,))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _SPANS.reset(token)
+        metrics.add((name,), calls=1, wall_s=time.perf_counter() - started)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator version of `span` (the span name defaults to the function name).
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _DOCUMENT.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**counters: float) -> None:
+    """
+    Adds counters (e.g. llm_cache_hits=1) to the current document and its open spans.
+    """
+    metrics = _DOCUMENT.get()
+    if metrics is not None:
+        metrics.add(_SPANS.get(), **counters)
+
+
+# ============================
+# Callback de LangChain (tokens y coste)
+# ============================
+def _usage_from_result(response) -> Optional[dict]:
+    """
+    Token usage of an LLMResult: llm_output["token_usage"] (OpenAI) or the messages' usage_metadata.
+    Returns None for results without usage or served from the LLM cache (LangChain marks cached
+    messages with usage_metadata["total_cost"] = 0).
+    """
+    llm_output = response.llm_output or {}
+    usage = llm_output.get("token_usage") or llm_output.get("usage")
+    model = llm_output.get("model_name") or llm_output.get("model")
+    if usage:
+        details = usage.get("prompt_tokens_details") or {}
+        return {
+            "model": model,
+            "prompt_tokens": usage.get("prompt_tokens", 0) or 0,
+            "completion_tokens": usage.get("completion_tokens", 0) or 0,
+            "cached_tokens": (details.get("cached_tokens") if isinstance(details, dict) else 0) or 0,
+        }
+    totals = None
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata and metadata.get("total_cost") == 0:
+                return None
+            if metadata and "input_tokens" in metadata:
+                totals = totals or {"model": model, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+                totals["prompt_tokens"] += metadata.get("input_tokens", 0)
+                totals["completion_tokens"] += metadata.get("output_tokens", 0)
+                totals["cached_tokens"] += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return totals
+
+
+def _make_callback_handler():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TelemetryCallbackHandler(BaseCallbackHandler):
+        """
+        Adds the token usage and cost of every LLM response to the current document and spans.
+        Responses served from the LLM cache carry no usage and are counted by SQLiteLLMCache instead.
+        """
+
+        def on_llm_end(self, response, **kwargs: Any) -> None:
+            usage = _usage_from_result(response)
+            if usage is None:
+                return
+            record(
+                llm_calls=1,
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                cached_tokens=usage["cached_tokens"],
+                cost_usd=estimate_cost(usage["model"], usage["prompt_tokens"], usage["completion_tokens"],
+                                       usage["cached_tokens"]),
+            )
+
+    return TelemetryCallbackHandler()
+
+
+_CALLBACK_VAR: contextvars.ContextVar = contextvars.ContextVar("sds_telemetry_callback", default=None)
+_HOOK_LOCK = threading.Lock()
+_HOOK_REGISTERED = False
+
+
+def _register_callback() -> None:
+    """
+    Registers (once) the handler as a LangChain configure hook: every LLM run started while
+    `_CALLBACK_VAR` is set reports to it, without passing callbacks to each call.
+    """
+    global _HOOK_REGISTERED
+    with _HOOK_LOCK:
+        if _HOOK_REGISTERED:
+            return
+        from langchain_core.tracers.context import register_configure_hook
+        register_configure_hook(_CALLBACK_VAR, inheritable=True)
+        _HOOK_REGISTERED = True
+
+
+# ============================
+# Seguimiento de un documento y exportación
+# ============================
+class _Registry:
+    """
+    Process-wide aggregation of every finished document, for the Prometheus export.
+    """
+
+    def __init__(self):
+        self.documents = 0
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.totals = _empty_counters()
+        self._lock = threading.Lock()
+
+    def add(self, metrics: dict) -> None:
+        with self._lock:
+            self.documents += 1
+            for key, value in metrics["totals"].items():
+                self.totals[key] += value
+            for name, counters in metrics["spans"].items():
+                target = self.spans.setdefault(name, _empty_counters())
+                for key, value in counters.items():
+                    target[key] += value
+
+
+REGISTRY = _Registry()
+
+
+@contextmanager
+def track_document(source: str, jsonl_path: Optional[str] = TELEMETRY_JSONL_PATH,
+                   prometheus_path: Optional[str] = TELEMETRY_PROMETHEUS_PATH, enabled: bool = TELEMETRY_ENABLED):
+    """
+    Collects the metrics of one document while the block runs and exports them at the end.
+    Args:
+        source (str): Document name.
+        jsonl_path (str, optional): JSON lines file where one line per document is appended.
+        prometheus_path (str, optional): Text file rewritten with the process totals in Prometheus format
+                                         (e.g. for the node_exporter textfile collector).
+        enabled (bool): If False, nothing is recorded.
+    Yields:
+        DocumentMetrics or None.
+    """
+    if not enabled:
+        yield None
+        return
+    _register_callback()
+    metrics = DocumentMetrics(source)
+    document_token = _DOCUMENT.set(metrics)
+    callback_token = _CALLBACK_VAR.set(_make_callback_handler())
+    try:
+        yield metrics
+    finally:
+        _CALLBACK_VAR.reset(callback_token)
+        _DOCUMENT.reset(document_token)
+        metrics.finish()
+        data = metrics.to_dict()
+        REGISTRY.add(data)
+        try:
+            if jsonl_path:
+                append_jsonl(data, jsonl_path)
+            if prometheus_path:
+                write_prometheus(prometheus_path)
+        except OSError as e:
+            print(f"Telemetry could not be exported: {e}")
+
+
+_WRITE_LOCK = threading.Lock()
+
+
+def append_jsonl(data: dict, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _WRITE_LOCK, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(registry: _Registry = REGISTRY) -> str:
+    """
+    Returns the process totals in the Prometheus text exposition format.
+    """
+    lines = [
+        "# HELP sds_documents_total Documents processed.",
+        "# TYPE sds_documents_total counter",
+        f"sds_documents_total {registry.documents}",
+    ]
+    metrics = [
+        ("calls", "sds_span_calls_total", "Executions of each stage/extractor."),
+        ("wall_s", "sds_span_wall_seconds_total", "Wall time of each stage/extractor (inclusive)."),
+        ("llm_calls", "sds_llm_calls_total", "LLM requests sent to the API."),
+        ("prompt_tokens", "sds_llm_prompt_tokens_total", "Prompt tokens."),
+        ("completion_tokens", "sds_llm_completion_tokens_total", "Completion tokens."),
+        ("cached_tokens", "sds_llm_cached_prompt_tokens_total", "Prompt tokens served from the provider prompt cache."),
+        ("llm_cache_hits", "sds_llm_cache_hits_total", "LLM responses served from the local cache."),
+        ("embedding_cache_hits", "sds_embedding_cache_hits_total", "Embeddings served from the local cache."),
+        ("embedding_cache_misses", "sds_embedding_cache_misses_total", "Embeddings computed by the API."),
+        ("cost_usd", "sds_llm_cost_usd_total", "Estimated LLM cost in USD."),
+        ("rate_limit_wait_s", "sds_rate_limit_wait_seconds_total", "Time spent queued by the client-side rate limiter."),
+        ("rate_limit_retries", "sds_rate_limit_retries_total", "Requests retried after a retryable OpenAI error."),
+    ]
+    with registry._lock:
+        for key, name, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for span_name in sorted(registry.spans):
+                lines.append(f'{name}{{span="{_label(span_name)}"}} {registry.spans[span_name][key]}')
+            if key != "calls":
+                lines.append(f'{name}{{span="document"}} {registry.totals[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str, registry: _Registry = REGISTRY) -> None:
+    """
+    Writes the Prometheus text atomically (a scraper never reads a half-written file).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _WRITE_LOCK:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(registry))
+        os.replace(tmp_path, path)
@@ -0,0 +1,27 @@
+# test_benchmark.py
+# The offline benchmark runs in a checkout without the project templates
+import json
+import functions
+from benchmark import OPERATIONS, TEMPLATE_CELL_MAPS, run_benchmark, write_template_fixtures
+from config import JSON_PATHS
+
+
+def test_fixtures_match_the_table_templates(tmp_path):
+    json_paths, excel_path = write_template_fixtures(str(tmp_path))
+    assert set(json_paths) == set(JSON_PATHS) == set(TEMPLATE_CELL_MAPS)
+    with open(json_paths["hazards"], encoding="utf-8") as f:
+        severity = json.load(f)["Sheet_2"]["severity"]
+    assert severity == {"content": "Severity", "position": ["U13", "U14", "U15"], "response": "", "to_excel": ""}
+    assert excel_path.endswith(".xlsx")
+
+
+def test_benchmark_runs_without_project_templates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    originals = (functions.folder_documents, functions.JSON_PATHS, functions.template_path)
+
+    report = run_benchmark(documents=2, latency_s=0, jitter_s=0, queries=3)
+
+    assert report["settings"]["fixtures"] is True
+    assert report["operations"]["process_document"]["count"] == 2
+    assert set(report["operations"]) == set(OPERATIONS)
+    assert (functions.folder_documents, functions.JSON_PATHS, functions.template_path) == originals
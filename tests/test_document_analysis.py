@@ -0,0 +1,43 @@
+# test_document_analysis.py
+# Section headings and per-section H-codes of DocumentAnalysis
+import pytest
+from document_analysis import DocumentAnalysis, heading_number
+
+SDS_WITH_CROSS_REFERENCE = "\n".join([
+    "# Safety data sheet",
+    "## SECTION 1: Identification",
+    "Product name: Acetone Cleaner",
+    "## SECTION 2: Hazards identification",
+    "H225 Highly flammable liquid and vapour.",
+    "Section 8 of this sheet lists exposure limits for the ingredients.",
+    "H319 Causes serious eye irritation.",
+    "## SECTION 3: Composition/information on ingredients",
+    "Acetone 67-64-1",
+    "## SECTION 4: First aid measures",
+    "Rinse with water.",
+    "## SECTION 8: Exposure controls/personal protection",
+    "Wear protective gloves.",
+])
+
+
+@pytest.mark.parametrize("line, number", [
+    ("## SECTION 2: Hazards identification", 2),
+    ("**Section 3 - Composition**", 3),
+    ("SECTION 8. EXPOSURE CONTROLS", 8),
+    ("SECTION 2 HAZARDS IDENTIFICATION", 2),
+    ("# 2. Hazards identification", 2),
+    ("## 13 - Disposal considerations", 13),
+    ("Section 8 of this sheet lists exposure limits", None),
+    ("See section 8 for exposure limits", None),
+    ("SECTION 17: Extra", None),
+])
+def test_heading_number(line, number):
+    assert heading_number(line) == number
+
+
+def test_cross_reference_body_line_does_not_end_the_section():
+    analysis = DocumentAnalysis(SDS_WITH_CROSS_REFERENCE)
+    assert sorted(analysis.sections) == [1, 2, 3, 4, 8]
+    assert analysis.section_h_codes[2] == ["H225", "H319"]
+    assert "Section 8 of this sheet" in analysis.sections[2]
+    assert analysis.sections[8].startswith("## SECTION 8")
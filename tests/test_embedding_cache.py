@@ -0,0 +1,41 @@
+# test_embedding_cache.py
+# CachedEmbeddings: documents are embedded verbatim, queries are normalized, repeats are served from the cache
+from langchain_core.embeddings import Embeddings
+from embedding_cache import CachedEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents, self.queries = [], []
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_documents_are_sent_verbatim(tmp_path):
+    model = RecordingEmbeddings()
+    cached = CachedEmbeddings(model, "model", db_path=str(tmp_path / "cache.sqlite"))
+    chunk = "| Component | CAS |\n|---|---|\n| Acetone | 67-64-1 |"
+
+    first = cached.embed_documents([chunk, chunk])
+    assert model.documents == [chunk]
+    assert cached.embed_documents([chunk]) == [first[0]]
+    assert model.documents == [chunk]
+
+    # Same words, different layout: a different text for the model
+    cached.embed_documents(["| Component | CAS | | Acetone | 67-64-1 |"])
+    assert len(model.documents) == 2
+
+
+def test_queries_are_normalized():
+    model = RecordingEmbeddings()
+    cached = CachedEmbeddings(model, "model", casefold_queries=True)
+    cached.embed_query("  Acetone\n cleaner ")
+    cached.embed_query("acetone cleaner")
+    assert model.queries == ["acetone cleaner"]
+    assert cached.stats()["hits"] == 1
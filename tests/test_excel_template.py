@@ -0,0 +1,77 @@
+# test_excel_template.py
+# Sheet XML patching of excel_template.py against the openpyxl path of fill_excel_with_json
+import io
+import zipfile
+import openpyxl
+import pytest
+from openpyxl.styles import Font, PatternFill
+import functions
+from excel_template import render_excel
+
+SHEET = "COSHH Assessment"
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = SHEET
+    ws["A1"] = "Title"
+    ws["A2"] = "Title"  # same shared string as A1
+    ws["B2"] = "Product"
+    ws.merge_cells("B2:C2")
+    ws["D3"] = "old"
+    ws["D3"].fill = PatternFill("solid", fgColor="FFFF00")
+    ws["D3"].font = Font(name="Calibri", size=9)
+    wb.create_sheet("Other")["A1"] = "untouched"
+    path = tmp_path / "template.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+JSONS = [
+    {"Sheet_2": {
+        "product": {"position": "B2", "to_excel": "Acetone <cleaner> & co"},
+        "notes": {"position": "D3", "to_excel": "Keep away from heat"},
+        "severity": {"position": ["E10", "F10"], "to_excel": "3"},
+        "empty": {"position": "G1", "to_excel": ""},
+    }},
+    {"Sheet_2": {"notes_override": {"position": "D3", "to_excel": "Overwritten"}}},
+]
+
+
+def test_render_excel_patches_only_the_target_cells(template_path):
+    wb = openpyxl.load_workbook(io.BytesIO(render_excel(JSONS, template_path, SHEET)))
+    ws = wb[SHEET]
+    assert ws["A1"].value == ws["A2"].value == "Title"
+    assert ws["B2"].value == "Acetone <cleaner> & co"
+    assert [str(r) for r in ws.merged_cells.ranges] == ["B2:C2"]
+    assert ws["D3"].value == "Overwritten"
+    assert ws["E10"].value == ws["F10"].value == "3"
+    assert ws["G1"].value is None
+    assert wb["Other"]["A1"].value == "untouched"
+
+    font, alignment = ws["D3"].font, ws["D3"].alignment
+    assert (font.name, font.sz, font.b) == ("Arial", 12, True)
+    assert (alignment.horizontal, alignment.vertical, alignment.wrap_text) == ("center", "center", True)
+    assert ws["D3"].fill.fgColor.rgb.endswith("FFFF00")
+
+
+def test_render_excel_matches_openpyxl(template_path, tmp_path, monkeypatch):
+    fast = openpyxl.load_workbook(io.BytesIO(render_excel(JSONS, template_path, SHEET)))[SHEET]
+    monkeypatch.setattr(functions, "EXCEL_FAST_TEMPLATE", False)
+    slow = openpyxl.load_workbook(functions.fill_excel_with_json(JSONS, template_path, str(tmp_path), "doc.md"))[SHEET]
+    cells = ("A1", "A2", "B2", "D3", "E10", "F10", "G1")
+    assert [fast[c].value for c in cells] == [slow[c].value for c in cells]
+
+
+@pytest.mark.parametrize("error", [ValueError("unsupported"), KeyError("xl/worksheets/sheet1.xml"),
+                                   zipfile.BadZipFile("corrupt")])
+def test_fill_excel_falls_back_to_openpyxl(template_path, tmp_path, monkeypatch, error):
+    def broken(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(functions, "EXCEL_FAST_TEMPLATE", True)
+    monkeypatch.setattr(functions, "render_excel", broken)
+    path = functions.fill_excel_with_json(JSONS, template_path, str(tmp_path), "doc.md")
+    assert openpyxl.load_workbook(path)[SHEET]["D3"].value == "Overwritten"
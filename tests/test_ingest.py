@@ -0,0 +1,39 @@
+# test_ingest.py
+# Incremental ingestion into a vector store: chunk ids and re-ingestion of changed documents
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from ingest import run_ingestion
+from numpy_store import NumpyVectorStore
+
+SDS = "# Safety data sheet\n## SECTION 1: Identification\nProduct name: Acetone Cleaner\n"
+
+
+def ingest(tmp_path, db):
+    return run_ingestion(db, input_dir=str(tmp_path / "docs"), manifest_path=str(tmp_path / "manifest.json"))
+
+
+def test_identical_files_keep_their_own_chunks(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "CO-000001-DS-1-A.md").write_text(SDS, encoding="utf-8")
+    (tmp_path / "docs" / "CO-000002-DS-1-B.md").write_text(SDS, encoding="utf-8")
+    db = NumpyVectorStore(str(tmp_path / "store"), DeterministicFakeEmbedding(size=16))
+
+    summary = ingest(tmp_path, db)
+
+    assert summary["chunks_added"] == 2
+    assert db.count() == 2
+    sources = sorted(metadata["source"] for metadata in db.get(include=["metadatas"])["metadatas"])
+    assert sources == ["CO-000001-DS-1-A.md", "CO-000002-DS-1-B.md"]
+
+
+def test_changed_document_replaces_its_chunks(tmp_path):
+    (tmp_path / "docs").mkdir()
+    path = tmp_path / "docs" / "CO-000001-DS-1-A.md"
+    path.write_text(SDS, encoding="utf-8")
+    db = NumpyVectorStore(str(tmp_path / "store"), DeterministicFakeEmbedding(size=16))
+    ingest(tmp_path, db)
+
+    path.write_text(SDS.replace("Acetone", "Ethanol"), encoding="utf-8")
+    summary = ingest(tmp_path, db)
+
+    assert summary["updated"] == ["CO-000001-DS-1-A.md"]
+    assert db.get(include=["documents"])["documents"] == [SDS.replace("Acetone", "Ethanol").strip()]
@@ -0,0 +1,48 @@
+# test_json_templates.py
+# Compiled table templates: independent copies and a field index that stays valid
+import json
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from json_templates import CompiledTemplates
+from functions import general_text_extraction, structured_text_extraction
+
+TEMPLATE = {
+    "Sheet_1": {"sds_reference": {"content": "SDS", "position": "B2", "response": "", "to_excel": ""}},
+    "Sheet_2": {
+        "empty_question": {"content": "", "position": "C5", "response": "", "to_excel": ""},
+        "first_aid": {"content": "What are the first aid measures?", "position": "C6", "response": "",
+                      "to_excel": ""},
+    },
+}
+
+
+@pytest.fixture
+def templates(tmp_path):
+    path = tmp_path / "table.json"
+    path.write_text(json.dumps(TEMPLATE), encoding="utf-8")
+    return CompiledTemplates({"table": str(path)})
+
+
+def test_new_document_returns_independent_copies(templates):
+    first, second = templates.new_document()["table"], templates.new_document()["table"]
+    assert first == TEMPLATE
+    first.set_field("sds_reference", "X")
+    assert second["Sheet_1"]["sds_reference"]["response"] == ""
+
+
+@pytest.mark.parametrize("extract", [general_text_extraction, structured_text_extraction])
+def test_field_index_survives_text_extraction(templates, extract):
+    table = templates.new_document()["table"]
+    model = FakeListChatModel(responses=["Rinse with water."])
+    extract("doc.md", table, model=model, content="## SECTION 4: First aid\nRinse.")
+    assert table["Sheet_2"]["empty_question"]["to_excel"] == "N/A"
+
+    assert table.set_field("empty_question", "edited") == 1
+    assert table["Sheet_2"]["empty_question"]["to_excel"] == "edited"
+
+
+def test_field_index_holds_only_field_records(templates):
+    table = templates.new_document()["table"]
+    assert sorted(table.fields) == ["empty_question", "first_aid", "sds_reference"]
+    assert table.set_field("Sheet_2", "X") == 0
+    assert table == TEMPLATE
@@ -0,0 +1,112 @@
+# test_numpy_store.py
+# NumpyVectorStore: quantized search, delete/reindex, bulk writes and concurrent generations
+import os
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from numpy_store import NumpyVectorStore, export_chroma
+
+TEXTS = [
+    "acetone highly flammable liquid and vapour",
+    "sodium hydroxide causes severe skin burns",
+    "store in a cool well ventilated place",
+    "wear protective gloves and eye protection",
+]
+
+
+def make_store(path, dtype="float16"):
+    store = NumpyVectorStore(str(path), DeterministicFakeEmbedding(size=64), dtype)
+    store.add_texts(TEXTS, [{"source": f"doc{i}.md"} for i in range(len(TEXTS))], ids=[f"id{i}" for i in range(len(TEXTS))])
+    return store
+
+
+def generations(path):
+    return sorted(name for name in os.listdir(path) if name.startswith(("vectors.", "scales.")))
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_quantized_search_finds_the_matching_chunk(tmp_path, dtype):
+    store = make_store(tmp_path, dtype)
+    for text in TEXTS:
+        doc, score = store.similarity_search_with_score(text, k=1)[0]
+        assert doc.page_content == text
+        assert score == pytest.approx(1.0, abs=0.02)
+    doc, _ = store.similarity_search_with_score(TEXTS[0], k=1, filter={"source": "doc2.md"})[0]
+    assert doc.metadata["source"] == "doc2.md"
+
+
+def test_delete_reindexes_positions(tmp_path):
+    store = make_store(tmp_path)
+    store.delete(ids=["id0", "id2"])
+    assert store.count() == 2
+    assert store.get()["ids"] == ["id1", "id3"]
+    for text in (TEXTS[1], TEXTS[3]):
+        assert store.similarity_search(text, k=1)[0].page_content == text
+    assert TEXTS[0] not in [d.page_content for d in store.similarity_search(TEXTS[0], k=4)]
+
+    store.delete(ids=["id1", "id3"])
+    assert store.count() == 0
+    assert store.similarity_search(TEXTS[1]) == []
+    assert generations(tmp_path) == []
+
+
+def test_replacing_an_id_keeps_one_row(tmp_path):
+    store = make_store(tmp_path)
+    store.add_texts(["new text about gloves"], [{"source": "doc0.md"}], ids=["id0"])
+    assert store.count() == len(TEXTS)
+    assert store.get(ids=["id0"])["documents"] == ["new text about gloves"]
+    assert store.similarity_search("new text about gloves", k=1)[0].id == "id0"
+
+
+def test_bulk_write_writes_one_generation(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), DeterministicFakeEmbedding(size=64))
+    with store.bulk_write():
+        for i, text in enumerate(TEXTS):
+            store.add_texts([text], ids=[f"id{i}"])
+        store.delete(ids=["id1"])
+        assert store.count() == 0  # reads see the store as it was before the block
+    assert store.get()["ids"] == ["id0", "id2", "id3"]
+    assert generations(tmp_path) == ["vectors.1.npy"]
+
+
+def test_bulk_write_discards_the_block_on_error(tmp_path):
+    store = make_store(tmp_path)
+    with pytest.raises(RuntimeError):
+        with store.bulk_write():
+            store.delete(ids=["id0"])
+            raise RuntimeError("interrupted")
+    assert store.count() == len(TEXTS)
+
+
+def test_reader_follows_a_generation_removed_by_another_writer(tmp_path):
+    reader = make_store(tmp_path)
+    assert reader.similarity_search(TEXTS[0], k=1)[0].id == "id0"
+    writer = NumpyVectorStore(str(tmp_path), DeterministicFakeEmbedding(size=64))
+    writer.delete(ids=["id0"])
+    writer.add_texts(["extra chunk"], ids=["extra"])
+    assert reader.similarity_search("extra chunk", k=1)[0].id == "extra"
+
+
+def test_reader_rereads_the_generation_when_its_files_are_gone(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store._loaded_generation = None
+    current = store._generation()
+    answers = iter([current + 1, current])  # a generation whose files were already removed, then the live one
+    monkeypatch.setattr(store, "_generation", lambda: next(answers))
+    vectors, _ = store._matrix()
+    assert len(vectors) == len(TEXTS)
+
+
+def test_export_chroma_copies_every_page_in_one_write(tmp_path):
+    class FakeChroma:
+        embeddings = DeterministicFakeEmbedding(size=64)
+
+        def get(self, include, limit, offset):
+            ids = [f"id{i}" for i in range(len(TEXTS))][offset:offset + limit]
+            return {"ids": ids, "documents": TEXTS[offset:offset + limit],
+                    "metadatas": [{"source": "doc.md"}] * len(ids),
+                    "embeddings": np.array(self.embeddings.embed_documents(TEXTS[offset:offset + limit]))}
+
+    store = export_chroma(FakeChroma(), str(tmp_path), dtype="int8", page_size=3)
+    assert store.get()["ids"] == [f"id{i}" for i in range(len(TEXTS))]
+    assert generations(tmp_path) == ["scales.1.npy", "vectors.1.npy"]
@@ -0,0 +1,33 @@
+# test_pictograms.py
+# Deterministic H-code -> pictogram path of the Hazards table
+from functions import hazard_codes_for_pictograms, pictograms_from_h_codes
+from utils import GHS_PICTOGRAMS
+
+VALIDATED = "\n".join([
+    "## SECTION 1: Identification",
+    "Product name: Cleaner",
+    "## SECTION 2: Hazards identification",
+    "H225 Highly flammable liquid and vapour.",
+    "## SECTION 3: Composition/information on ingredients",
+    "Ingredient X: H319",
+    "## SECTION 4: First aid measures",
+    "Rinse with water.",
+])
+
+# Only two headings: the split is not trusted, so Section 2 may be incomplete
+NOT_VALIDATED = "\n".join([
+    "## SECTION 2: Hazards identification",
+    "H225 Highly flammable liquid and vapour.",
+    "## SECTION 3: Composition/information on ingredients",
+    "H319 Causes serious eye irritation.",
+])
+
+
+def test_validated_split_uses_section_2_codes():
+    assert hazard_codes_for_pictograms(VALIDATED) == ["H225"]
+
+
+def test_failed_split_uses_every_code_of_the_document():
+    codes = hazard_codes_for_pictograms(NOT_VALIDATED)
+    assert codes == ["H225", "H319"]
+    assert pictograms_from_h_codes(codes)[GHS_PICTOGRAMS["GHS07"]] is True
@@ -0,0 +1,91 @@
+# test_rate_limiter.py
+# Shared token buckets under contention and retries with backoff
+import sqlite3
+import threading
+import time
+import httpx
+import openai
+import pytest
+from rate_limiter import TokenBucketRateLimiter, call_with_backoff
+from telemetry import track_document
+
+
+def drain(state_path, name):
+    # Start from empty buckets, so every request has to wait for the refill
+    with sqlite3.connect(state_path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("INSERT OR REPLACE INTO rate_buckets VALUES (?, 0, 0, ?)", (name, time.time()))
+
+
+def test_shared_bucket_under_contention(tmp_path):
+    state_path = str(tmp_path / "rate_limits.sqlite")
+    drain(state_path, "chat")
+    # Two limiters on the same file behave like two processes sharing the budget (20 requests/s)
+    limiters = [TokenBucketRateLimiter("chat", rpm=1200, tpm=10 ** 6, state_path=state_path) for _ in range(2)]
+    errors = []
+
+    def worker(limiter):
+        try:
+            for _ in range(5):
+                limiter.acquire(10)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(limiters[i % 2],)) for i in range(4)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    assert errors == []
+    assert sum(limiter.stats()["requests"] for limiter in limiters) == 20
+    # 20 requests at 20 per second from an empty bucket
+    assert elapsed >= 0.9
+
+
+def test_local_bucket_starts_full_and_clamps_large_requests():
+    limiter = TokenBucketRateLimiter("local", rpm=60, tpm=1000)
+    assert limiter.acquire(10 ** 6) < 0.1
+    assert limiter.stats()["throttled"] == 0
+
+
+def test_call_with_backoff_retries_retryable_errors(capsys):
+    limiter = TokenBucketRateLimiter("retry", rpm=10 ** 6, tpm=10 ** 9)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        return "ok"
+
+    with track_document("doc.md", jsonl_path=None, prometheus_path=None) as metrics:
+        assert call_with_backoff(flaky, limiter, tokens=5, max_retries=5, base_delay=0.001) == "ok"
+    assert len(attempts) == 3
+    assert limiter.stats()["retries"] == 2 and limiter.stats()["requests"] == 3
+    # Retries go to the document telemetry, not to stdout of the worker threads
+    assert metrics.totals["rate_limit_retries"] == 2
+    assert capsys.readouterr().out == ""
+
+
+def test_call_with_backoff_gives_up_and_does_not_retry_other_errors():
+    def timeout():
+        raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+
+    with pytest.raises(openai.APITimeoutError):
+        call_with_backoff(timeout, max_retries=2, base_delay=0.001)
+
+    calls = []
+
+    def bug():
+        calls.append(1)
+        raise KeyError("not retryable")
+
+    with pytest.raises(KeyError):
+        call_with_backoff(bug, max_retries=5, base_delay=0.001)
+    assert len(calls) == 1
@@ -0,0 +1,67 @@
+# test_scheduler.py
+# Stage graph: dependencies, bounded concurrency, context propagation and errors
+import contextvars
+import threading
+import time
+import pytest
+from scheduler import Stage, run_stage_graph
+
+REQUEST = contextvars.ContextVar("REQUEST", default=None)
+
+
+def test_results_flow_through_dependencies():
+    finished = []
+    stages = [
+        Stage("a", lambda deps: 1),
+        Stage("b", lambda deps: deps["a"] + 1, depends_on=["a"]),
+        Stage("c", lambda deps: deps["a"] * 10, depends_on=["a"]),
+        Stage("d", lambda deps: deps["b"] + deps["c"], depends_on=["b", "c"]),
+    ]
+    results = run_stage_graph(stages, max_workers=2, on_stage_end=finished.append)
+    assert results == {"a": 1, "b": 2, "c": 10, "d": 12}
+    assert finished[0] == "a" and finished[-1] == "d"
+
+
+def test_concurrency_is_bounded():
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def work(deps):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    run_stage_graph([Stage(f"s{i}", work) for i in range(8)], max_workers=3)
+    assert peak[0] == 3
+
+
+def test_stages_see_the_caller_context():
+    REQUEST.set("doc.md")
+    results = run_stage_graph([Stage("a", lambda deps: REQUEST.get())], max_workers=2)
+    assert results == {"a": "doc.md"}
+
+
+def test_first_error_is_raised_and_dependents_never_run():
+    ran = []
+
+    def fail(deps):
+        raise RuntimeError("stage failed")
+
+    stages = [
+        Stage("fail", fail),
+        Stage("after", lambda deps: ran.append("after"), depends_on=["fail"]),
+    ]
+    with pytest.raises(RuntimeError, match="stage failed"):
+        run_stage_graph(stages, max_workers=2)
+    assert ran == []
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="unknown stage"):
+        run_stage_graph([Stage("a", lambda deps: None, depends_on=["missing"])])
+    with pytest.raises(ValueError, match="Cyclic"):
+        run_stage_graph([Stage("a", lambda deps: None, depends_on=["b"]),
+                         Stage("b", lambda deps: None, depends_on=["a"])])
@@ -0,0 +1,31 @@
+# test_sds_sections.py
+# Split of an SDS into its sections
+from sds_sections import split_sds_sections
+
+SDS_WITH_CROSS_REFERENCE = "\n".join([
+    "# Safety data sheet",
+    "## SECTION 1: Identification",
+    "Product name: Acetone Cleaner",
+    "## SECTION 2: Hazards identification",
+    "H225 Highly flammable liquid and vapour.",
+    "Section 8 of this sheet lists exposure limits for the ingredients.",
+    "H319 Causes serious eye irritation.",
+    "## SECTION 3: Composition/information on ingredients",
+    "Acetone 67-64-1",
+    "## SECTION 4: First aid measures",
+    "Rinse with water.",
+    "## SECTION 8: Exposure controls/personal protection",
+    "Wear protective gloves.",
+])
+
+
+def test_cross_reference_body_line_does_not_end_the_section():
+    sections = split_sds_sections(SDS_WITH_CROSS_REFERENCE)
+    assert sorted(sections) == [1, 2, 3, 4, 8]
+    assert "Section 8 of this sheet" in sections[2]
+    assert "H319" in sections[2]
+    assert sections[8].startswith("## SECTION 8")
+
+
+def test_too_few_headings_is_not_split():
+    assert split_sds_sections("## SECTION 1: Identification\nProduct name: X\n") == {}
@@ -174,4 +174,166 @@ dtr_tables = [
     "Fire procedures, Fire Fighting Measures, information_and_details_about_Fire_procedures",
     "First aid procedures, First Aid Measures",
     "Storage, Safe Storage"
-]
\ No newline at end of file
+]
+
+# Required for SDS section scoping
+# Standard 16 sections of an SDS (REGULATION (EC) No 1907/2006, Annex II / GHS)
+SDS_SECTION_TITLES = {
+    1: "Identification",
+    2: "Hazards identification",
+    3: "Composition / information on ingredients",
+    4: "First aid measures",
+    5: "Firefighting measures",
+    6: "Accidental release measures",
+    7: "Handling and storage",
+    8: "Exposure controls / personal protection",
+    9: "Physical and chemical properties",
+    10: "Stability and reactivity",
+    11: "Toxicological information",
+    12: "Ecological information",
+    13: "Disposal considerations",
+    14: "Transport information",
+    15: "Regulatory information",
+    16: "Other information"
+}
+
+# Sections sent to the LLM for each table of dtr_tables (by table_index)
+TABLE_SECTIONS = {
+    0: [2, 8, 9, 11],   # Hazards
+    1: [13],            # Waste disposal measures
+    2: [6],             # Spill management
+    3: [5],             # Fire procedures
+    4: [4],             # First aid procedures
+    5: [7]              # Storage
+}
+
+# Sections sent to the LLM for a specific field (takes precedence over TABLE_SECTIONS)
+FIELD_SECTIONS = {
+    "physical_form_and_quantity": [1, 9],
+    "potential_routes_of_exposure": [2, 4, 11],
+    "workplace_exposure_limits": [8],
+    "arising_harm": [2, 11],
+    "handling_of_the_product_if_it_becomes_waste": [13],
+    "eyes": [4],
+    "skin": [4],
+    "if_ingested": [4],
+    "if_inhaled": [4],
+    "hazard_label_and_store_safely_on_shelf": [2, 7],
+    "special_storage_describe": [7]
+}
+
+# Sections sent to the LLM by the extractors that work on a whole group of fields
+EXTRACTOR_SECTIONS = {
+    "chemical_names": [1, 3],
+    "Personal Protection": [7, 8],
+    "Hazard Statements": [2],
+    "Storage": [7]
+}
+
+# Required for the deterministic hazard flags
+# GHS pictograms -> pictogram fields of the Hazards table (hazards_fields_statements)
+GHS_PICTOGRAMS = {
+    "GHS01": "explosive",
+    "GHS02": "flammable",
+    "GHS03": "oxidising",
+    "GHS04": "gas_under_pressure",
+    "GHS05": "corrosive",
+    "GHS06": "acute_toxicity",
+    "GHS07": "health_hazard",
+    "GHS08": "serious_health_hazard",
+    "GHS09": "hazardous_to_the_environment"
+}
+
+# H-statements (CLP Regulation (EC) No 1272/2008, Annex III, plus the GHS-only codes)
+# code: (statement, pictograms, hazard group)
+# - Pictograms follow CLP Annex I / Annex V; codes with no pictogram have an empty tuple.
+# - Hazard group (A = most severe ... E) is the COSHH band used for 'hazard_group'.
+#   Physical and environmental hazards are banded E, as are the codes without a band.
+H_STATEMENTS = {
+    # Physical hazards
+    "H200": ("Unstable explosive.", ("GHS01",), "E"),
+    "H201": ("Explosive; mass explosion hazard.", ("GHS01",), "E"),
+    "H202": ("Explosive; severe projection hazard.", ("GHS01",), "E"),
+    "H203": ("Explosive; fire, blast or projection hazard.", ("GHS01",), "E"),
+    "H204": ("Fire or projection hazard.", ("GHS01",), "E"),
+    "H205": ("May mass explode in fire.", ("GHS01",), "E"),
+    "H206": ("Fire, blast or projection hazard; increased risk of explosion if desensitising agent is reduced.", ("GHS02",), "E"),
+    "H207": ("Fire or projection hazard; increased risk of explosion if desensitising agent is reduced.", ("GHS02",), "E"),
+    "H208": ("Fire hazard; increased risk of explosion if desensitising agent is reduced.", ("GHS02",), "E"),
+    "H209": ("Explosive.", ("GHS01",), "E"),
+    "H210": ("Very sensitive.", ("GHS01",), "E"),
+    "H211": ("May be sensitive.", ("GHS01",), "E"),
+    "H220": ("Extremely flammable gas.", ("GHS02",), "E"),
+    "H221": ("Flammable gas.", ("GHS02",), "E"),
+    "H222": ("Extremely flammable aerosol.", ("GHS02",), "E"),
+    "H223": ("Flammable aerosol.", ("GHS02",), "E"),
+    "H224": ("Extremely flammable liquid and vapour.", ("GHS02",), "E"),
+    "H225": ("Highly flammable liquid and vapour.", ("GHS02",), "E"),
+    "H226": ("Flammable liquid and vapour.", ("GHS02",), "E"),
+    "H227": ("Combustible liquid.", (), "E"),
+    "H228": ("Flammable solid.", ("GHS02",), "E"),
+    "H229": ("Pressurised container: may burst if heated.", (), "E"),
+    "H230": ("May react explosively even in the absence of air.", (), "E"),
+    "H231": ("May react explosively even in the absence of air at elevated pressure and/or temperature.", (), "E"),
+    "H232": ("May ignite spontaneously if exposed to air.", ("GHS02",), "E"),
+    "H240": ("Heating may cause an explosion.", ("GHS01",), "E"),
+    "H241": ("Heating may cause a fire or explosion.", ("GHS01", "GHS02"), "E"),
+    "H242": ("Heating may cause a fire.", ("GHS02",), "E"),
+    "H250": ("Catches fire spontaneously if exposed to air.", ("GHS02",), "E"),
+    "H251": ("Self-heating: may catch fire.", ("GHS02",), "E"),
+    "H252": ("Self-heating in large quantities; may catch fire.", ("GHS02",), "E"),
+    "H260": ("In contact with water releases flammable gases which may ignite spontaneously.", ("GHS02",), "E"),
+    "H261": ("In contact with water releases flammable gases.", ("GHS02",), "E"),
+    "H270": ("May cause or intensify fire; oxidiser.", ("GHS03",), "E"),
+    "H271": ("May cause fire or explosion; strong oxidiser.", ("GHS03",), "E"),
+    "H272": ("May intensify fire; oxidiser.", ("GHS03",), "E"),
+    "H280": ("Contains gas under pressure; may explode if heated.", ("GHS04",), "E"),
+    "H281": ("Contains refrigerated gas; may cause cryogenic burns or injury.", ("GHS04",), "E"),
+    "H290": ("May be corrosive to metals.", ("GHS05",), "E"),
+    # Health hazards
+    "H300": ("Fatal if swallowed.", ("GHS06",), "A"),
+    "H301": ("Toxic if swallowed.", ("GHS06",), "B"),
+    "H302": ("Harmful if swallowed.", ("GHS07",), "D"),
+    "H303": ("May be harmful if swallowed.", (), "E"),
+    "H304": ("May be fatal if swallowed and enters airways.", ("GHS08",), "B"),
+    "H305": ("May be harmful if swallowed and enters airways.", (), "E"),
+    "H310": ("Fatal in contact with skin.", ("GHS06",), "A"),
+    "H311": ("Toxic in contact with skin.", ("GHS06",), "B"),
+    "H312": ("Harmful in contact with skin.", ("GHS07",), "D"),
+    "H313": ("May be harmful in contact with skin.", (), "E"),
+    "H314": ("Causes severe skin burns and eye damage.", ("GHS05",), "B"),
+    "H315": ("Causes skin irritation.", ("GHS07",), "D"),
+    "H316": ("Causes mild skin irritation.", (), "E"),
+    "H317": ("May cause an allergic skin reaction.", ("GHS07",), "C"),
+    # H318 keeps band E, as in the previous classification table (its E entry overrode B)
+    "H318": ("Causes serious eye damage.", ("GHS05",), "E"),
+    "H319": ("Causes serious eye irritation.", ("GHS07",), "D"),
+    "H320": ("Causes eye irritation.", (), "E"),
+    "H330": ("Fatal if inhaled.", ("GHS06",), "A"),
+    "H331": ("Toxic if inhaled.", ("GHS06",), "B"),
+    "H332": ("Harmful if inhaled.", ("GHS07",), "D"),
+    "H333": ("May be harmful if inhaled.", (), "E"),
+    "H334": ("May cause allergy or asthma symptoms or breathing difficulties if inhaled.", ("GHS08",), "B"),
+    "H335": ("May cause respiratory irritation.", ("GHS07",), "C"),
+    "H336": ("May cause drowsiness or dizziness.", ("GHS07",), "C"),
+    "H340": ("May cause genetic defects.", ("GHS08",), "A"),
+    "H341": ("Suspected of causing genetic defects.", ("GHS08",), "C"),
+    "H350": ("May cause cancer.", ("GHS08",), "A"),
+    "H351": ("Suspected of causing cancer.", ("GHS08",), "C"),
+    "H360": ("May damage fertility or the unborn child.", ("GHS08",), "A"),
+    "H361": ("Suspected of damaging fertility or the unborn child.", ("GHS08",), "C"),
+    "H362": ("May cause harm to breast-fed children.", (), "C"),
+    "H370": ("Causes damage to organs.", ("GHS08",), "A"),
+    "H371": ("May cause damage to organs.", ("GHS08",), "C"),
+    "H372": ("Causes damage to organs through prolonged or repeated exposure.", ("GHS08",), "A"),
+    "H373": ("May cause damage to organs through prolonged or repeated exposure.", ("GHS08",), "C"),
+    # Environmental hazards
+    "H400": ("Very toxic to aquatic life.", ("GHS09",), "E"),
+    "H401": ("Toxic to aquatic life.", (), "E"),
+    "H402": ("Harmful to aquatic life.", (), "E"),
+    "H410": ("Very toxic to aquatic life with long lasting effects.", ("GHS09",), "E"),
+    "H411": ("Toxic to aquatic life with long lasting effects.", ("GHS09",), "E"),
+    "H412": ("Harmful to aquatic life with long lasting effects.", (), "E"),
+    "H413": ("May cause long lasting harmful effects to aquatic life.", (), "E"),
+    "H420": ("Harms public health and the environment by destroying ozone in the upper atmosphere.", ("GHS07",), "E"),
+}